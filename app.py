@@ -1,9 +1,5 @@
 import streamlit as st
 from auth import check_authentication, login, logout, get_user_info
-from modules.asistencias import show_asistencias_module
-from modules.permisos import show_permisos_module
-from modules.incapacidades import show_incapacidades_module
-from modules.bonos import show_bonos_module
 
 
 # Configuración de la página
@@ -33,6 +29,9 @@ st.markdown("""
     </style>
 """, unsafe_allow_html=True)
 
+# Estado de sesión que no es de widgets y sobrevive al cambiar de módulo
+ESTADO_PERSISTENTE = {'authenticated', 'user_data', 'token_sesion', 'active_module', 'module_counter', 'bonos_memo'}
+
 def main():
     """Función principal de la aplicación"""
     
@@ -61,9 +60,13 @@ def main():
             <p><strong>Oficina:</strong> {user['oficina']}</p>
         </div>
         """, unsafe_allow_html=True)
-        
+
+        # Badge de pendientes de sincronizar (solo conteos, sin mover filas)
+        if user['rol'] in ['admin', 'supervisora']:
+            show_sync_badge()
+
         st.markdown("---")
-        
+
         # Menú de navegación
         st.subheader("📋 Menú")
         
@@ -115,29 +118,22 @@ def main():
         
         # CRÍTICO: Detectar cambio de módulo
         if menu_selection != st.session_state.active_module:
-            # LIMPIAR TODO el estado excepto auth
-            keys_to_keep = ['authenticated', 'user_data', 'active_module', 'module_counter']
-            keys_to_delete = [k for k in st.session_state.keys() if k not in keys_to_keep]
+            # Limpiar solo el estado de widgets; los cachés de datos se conservan
+            keys_to_delete = [
+                k for k in st.session_state.keys()
+                if k not in ESTADO_PERSISTENTE and not k.startswith('menu_radio_')
+            ]
             for key in keys_to_delete:
                 del st.session_state[key]
             
-            # Actualizar módulo activo
+            # Actualizar módulo activo (el nuevo módulo se dibuja en esta misma ejecución)
             st.session_state.active_module = menu_selection
             st.session_state.module_counter += 1
-            
-            # Limpiar caché
-            st.cache_data.clear()
-            
-            # Forzar rerun
-            st.rerun()
         
         st.markdown("---")
         
         # Botón de logout
         if st.button("🚪 Cerrar Sesión", use_container_width=True):
-            for key in list(st.session_state.keys()):
-                del st.session_state[key]
-            st.cache_data.clear()
             logout()
     
     # Contenido principal con aislamiento por contador
@@ -145,23 +141,30 @@ def main():
     
     # Container único para forzar re-renderizado limpio
     with st.container(key=module_key):
+        # Los módulos (y pandas/numpy) se importan al abrirlos por primera vez
         if st.session_state.active_module == "🏠 Dashboard":
             show_dashboard()
         elif st.session_state.active_module == "📋 Asistencias":
+            from modules.asistencias import show_asistencias_module
             show_asistencias_module()
         elif st.session_state.active_module == "🔖 Permisos":
+            from modules.permisos import show_permisos_module
             show_permisos_module()
         elif st.session_state.active_module == "🏥 Incapacidades":
+            from modules.incapacidades import show_incapacidades_module
             show_incapacidades_module()
         elif st.session_state.active_module == "💰 Bonos":
+            from modules.bonos import show_bonos_module
             show_bonos_module()
         elif st.session_state.active_module == "👥 Empleados":
             show_empleados_module()
         elif st.session_state.active_module == "👤 Usuarios":
             show_usuarios_module()
         elif st.session_state.active_module == "📊 Reportes":
+            from modules.reportes import show_reportes_module
             show_reportes_module()
         elif st.session_state.active_module == "📝 Auditoría":
+            from modules.auditoria import show_auditoria_module
             show_auditoria_module()
 
 def show_dashboard():
@@ -169,43 +172,33 @@ def show_dashboard():
     st.title("🏠 Dashboard General")
     
     user = get_user_info()
-    from config import get_sheets_manager
-    sheets = get_sheets_manager()
+    import pandas as pd
+    from utils.dashboard import obtener_snapshot
+    
+    # Un solo snapshot (contadores + últimos N) acotado al rol/oficina del usuario
+    try:
+        snapshot = obtener_snapshot(user)
+    except Exception as e:
+        st.error(f"❌ Error al cargar el dashboard: {e}")
+        return
+    
+    if user.get('rol') == 'registrador':
+        st.caption(f"🏢 Mostrando solo la oficina {user['oficina']}")
     
     # Métricas generales
     col1, col2, col3, col4 = st.columns(4)
     
     with col1:
-        df_empleados = sheets.get_dataframe("empleados")
-        total_empleados = 0
-        if not df_empleados.empty and 'activo' in df_empleados.columns:
-            total_empleados = len(df_empleados[df_empleados['activo'].str.upper() == 'SI'])
-        st.metric("👥 Empleados Activos", total_empleados)
+        st.metric("👥 Empleados Activos", snapshot['empleados_activos'])
     
     with col2:
-        df_asistencias = sheets.get_dataframe("asistencias")
-        import pandas as pd
-        from datetime import date
-        hoy = date.today().strftime("%Y-%m-%d")
-        
-        asistencias_hoy = 0
-        if not df_asistencias.empty and 'fecha' in df_asistencias.columns:
-            asistencias_hoy = len(df_asistencias[df_asistencias['fecha'] == hoy])
-        
-        st.metric("📋 Asistencias Hoy", asistencias_hoy)
+        st.metric("📋 Asistencias Hoy", snapshot['asistencias_hoy'])
     
     with col3:
-        df_permisos = sheets.get_dataframe("permisos")
-        permisos_pendientes = 0
-        if not df_permisos.empty and 'estado' in df_permisos.columns:
-            permisos_pendientes = len(df_permisos[df_permisos['estado'] == 'Pendiente'])
-        st.metric("🔖 Permisos Pendientes", permisos_pendientes)
+        st.metric("🔖 Permisos Pendientes", snapshot['permisos_pendientes'])
     
     with col4:
-        oficinas = []
-        if not df_empleados.empty and 'oficina' in df_empleados.columns:
-            oficinas = df_empleados['oficina'].unique().tolist()
-        st.metric("🏢 Oficinas", len(oficinas))
+        st.metric("🏢 Oficinas", snapshot['oficinas'])
     
     st.markdown("---")
     
@@ -215,118 +208,50 @@ def show_dashboard():
     tab1, tab2, tab3 = st.tabs(["Últimas Asistencias", "Permisos Recientes", "Incapacidades Activas"])
     
     with tab1:
-        if not df_asistencias.empty:
-            try:
-                df_empleados_info = sheets.get_dataframe("empleados")
-                df_display = df_asistencias.merge(
-                    df_empleados_info[['id_empleado', 'nombre_completo']],
-                    on='id_empleado',
-                    how='left'
-                )
-                
-                if 'timestamp_sistema' in df_display.columns:
-                    df_display = df_display.sort_values('timestamp_sistema', ascending=False).head(10)
-                else:
-                    df_display = df_display.tail(10)
-                
-                cols_mostrar = []
-                if 'fecha' in df_display.columns:
-                    cols_mostrar.append('fecha')
-                if 'nombre_completo' in df_display.columns:
-                    cols_mostrar.append('nombre_completo')
-                elif 'id_empleado' in df_display.columns:
-                    cols_mostrar.append('id_empleado')
-                if 'estado' in df_display.columns:
-                    cols_mostrar.append('estado')
-                if 'oficina' in df_display.columns:
-                    cols_mostrar.append('oficina')
-                
-                if cols_mostrar:
-                    st.dataframe(df_display[cols_mostrar], use_container_width=True, hide_index=True)
-                else:
-                    st.info("No hay datos para mostrar")
-            except Exception as e:
-                st.error(f"Error al cargar asistencias: {e}")
+        if snapshot['ultimas_asistencias']:
+            cols_mostrar = ['fecha', 'nombre_completo', 'estado', 'oficina']
+            df_display = pd.DataFrame(snapshot['ultimas_asistencias'])
+            st.dataframe(df_display[cols_mostrar], use_container_width=True, hide_index=True)
         else:
             st.info("No hay asistencias registradas")
     
     with tab2:
-        if not df_permisos.empty:
-            try:
-                df_empleados_info = sheets.get_dataframe("empleados")
-                df_display = df_permisos.merge(
-                    df_empleados_info[['id_empleado', 'nombre_completo']],
-                    on='id_empleado',
-                    how='left'
-                )
-                
-                if 'timestamp_creacion' in df_display.columns:
-                    df_display = df_display.sort_values('timestamp_creacion', ascending=False).head(10)
-                else:
-                    df_display = df_display.tail(10)
-                
-                cols_mostrar = []
-                if 'nombre_completo' in df_display.columns:
-                    cols_mostrar.append('nombre_completo')
-                elif 'id_empleado' in df_display.columns:
-                    cols_mostrar.append('id_empleado')
-                if 'fecha_inicio' in df_display.columns:
-                    cols_mostrar.append('fecha_inicio')
-                if 'dias_solicitados' in df_display.columns:
-                    cols_mostrar.append('dias_solicitados')
-                if 'estado' in df_display.columns:
-                    cols_mostrar.append('estado')
-                
-                if cols_mostrar:
-                    st.dataframe(df_display[cols_mostrar], use_container_width=True, hide_index=True)
-                else:
-                    st.info("No hay datos para mostrar")
-            except Exception as e:
-                st.error(f"Error al cargar permisos: {e}")
+        if snapshot['permisos_recientes']:
+            cols_mostrar = ['nombre_completo', 'fecha_inicio', 'dias_solicitados', 'estado']
+            df_display = pd.DataFrame(snapshot['permisos_recientes'])
+            st.dataframe(df_display[cols_mostrar], use_container_width=True, hide_index=True)
         else:
             st.info("No hay permisos registrados")
     
     with tab3:
-        df_incapacidades = sheets.get_dataframe("incapacidades")
-        if not df_incapacidades.empty:
-            try:
-                from datetime import datetime
-                import pandas as pd
-                hoy = datetime.now().date()
-                
-                df_incapacidades['fecha_fin_dt'] = pd.to_datetime(df_incapacidades['fecha_fin']).dt.date
-                df_activas = df_incapacidades[df_incapacidades['fecha_fin_dt'] >= hoy]
-                
-                if not df_activas.empty:
-                    df_empleados_info = sheets.get_dataframe("empleados")
-                    df_display = df_activas.merge(
-                        df_empleados_info[['id_empleado', 'nombre_completo']],
-                        on='id_empleado',
-                        how='left'
-                    )
-                    
-                    cols_mostrar = []
-                    if 'nombre_completo' in df_display.columns:
-                        cols_mostrar.append('nombre_completo')
-                    if 'tipo' in df_display.columns:
-                        cols_mostrar.append('tipo')
-                    if 'fecha_inicio' in df_display.columns:
-                        cols_mostrar.append('fecha_inicio')
-                    if 'fecha_fin' in df_display.columns:
-                        cols_mostrar.append('fecha_fin')
-                    if 'dias_totales' in df_display.columns:
-                        cols_mostrar.append('dias_totales')
-                    
-                    if cols_mostrar:
-                        st.dataframe(df_display[cols_mostrar].head(10), use_container_width=True, hide_index=True)
-                    else:
-                        st.info("No hay incapacidades activas")
-                else:
-                    st.info("No hay incapacidades activas")
-            except Exception as e:
-                st.error(f"Error al cargar incapacidades: {e}")
+        if snapshot['incapacidades_activas']:
+            cols_mostrar = ['nombre_completo', 'tipo', 'fecha_inicio', 'fecha_fin', 'dias_totales']
+            df_display = pd.DataFrame(snapshot['incapacidades_activas'])
+            st.dataframe(df_display[cols_mostrar], use_container_width=True, hide_index=True)
+            
+            if snapshot['incapacidades_activas_total'] > len(df_display):
+                st.caption(f"Mostrando {len(df_display)} de {snapshot['incapacidades_activas_total']} incapacidades activas")
+            if snapshot['permisos_activos_hoy']:
+                st.caption(f"🔖 Además, {snapshot['permisos_activos_hoy']} empleados con permiso aprobado hoy")
         else:
-            st.info("No hay incapacidades registradas")
+            st.info("No hay incapacidades activas")
+
+def show_sync_badge():
+    """Indicador de registros pendientes de sincronizar a Google Sheets"""
+    from config import get_sheets_manager
+
+    try:
+        resumen = get_sheets_manager().get_sync_status()
+    except Exception:
+        return
+
+    total = sum(v for v in resumen.values() if v)
+    if total == 0:
+        st.caption("🔄 Todo sincronizado")
+        return
+
+    detalle = " · ".join(f"{tabla.title()}: {n}" for tabla, n in resumen.items() if n)
+    st.warning(f"🔄 **{total}** pendientes de sincronizar\n\n{detalle}")
 
 def show_empleados_module():
     """Módulo de empleados (placeholder)"""
@@ -338,15 +263,5 @@ def show_usuarios_module():
     st.title("👤 Gestión de Usuarios")
     st.info("🚧 Módulo en desarrollo - Próximamente disponible")
 
-def show_reportes_module():
-    """Módulo de reportes (placeholder)"""
-    st.title("📊 Reportes y Análisis")
-    st.info("🚧 Módulo en desarrollo - Próximamente disponible")
-
-def show_auditoria_module():
-    """Módulo de auditoría (placeholder)"""
-    st.title("📝 Registro de Auditoría")
-    st.info("🚧 Módulo en desarrollo - Próximamente disponible")
-
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,10 +1,32 @@
+import os
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout
 import streamlit as st
 import bcrypt
 from config import get_sheets_manager
+from utils.limitador import LimitadorIntentos, ColaAuditoria
+from utils.tokens_sesion import emitir_token, verificar_token, DURACION_TOKEN
+
+# Columnas del perfil en memoria (nunca incluye password_hash)
+COLUMNAS_PERFIL = "email, nombre, rol, oficina_asignada, activo"
+COLUMNAS_LOGIN = COLUMNAS_PERFIL + ", password_hash"
+
+# Verificaciones bcrypt simultáneas y espera máxima por una
+HILOS_BCRYPT = min(4, os.cpu_count() or 1)
+TIMEOUT_BCRYPT = 15
+
+# Cookie donde vive el token de sesión firmado
+COOKIE_TOKEN = "rh_sesion"
+# Parámetro de URL de versiones anteriores (se migra a la cookie y se quita)
+PARAM_TOKEN = "sesion"
+# Largo mínimo de [auth] token_secret; sin un secreto válido no hay tokens de sesión
+LONGITUD_MINIMA_SECRETO = 32
 
 def check_authentication():
-    """Verifica si el usuario está autenticado"""
-    return st.session_state.get('authenticated', False)
+    """Verifica si el usuario está autenticado (o reanuda la sesión con su token firmado)"""
+    autenticado = st.session_state.get('authenticated', False) or reanudar_sesion()
+    aplicar_cookie_pendiente()
+    return autenticado
 
 def get_user_info():
     """Retorna información del usuario actual"""
@@ -24,33 +46,53 @@ def login():
             submit = st.form_submit_button("Ingresar", use_container_width=True, type="primary")
             
             if submit:
-                if validate_user(email, password):
+                resultado = validate_user(email, password)
+                if resultado:
                     st.success("✅ Acceso concedido")
                     st.rerun()
-                else:
+                elif resultado is False:
                     st.error("❌ Credenciales incorrectas")
 
 def validate_user(email, password):
-    """Validar usuario contra Supabase con bcrypt"""
+    """Validar usuario contra Supabase con bcrypt (None si el intento fue limitado)"""
     try:
         manager = get_sheets_manager()
-        df_users = manager.get_dataframe("usuarios")
+        email = email.strip()
+        cliente = obtener_cliente()
+        limitadores = get_limitadores()
         
-        # Buscar usuario por email (case insensitive)
-        user = df_users[df_users['email'].str.lower() == email.lower()]
+        # Limitar intentos antes de cualquier consulta o hash
+        espera = max(
+            limitadores['email'].espera(clave_email_cliente(email, cliente)),
+            limitadores['cuenta'].espera(email.lower()),
+            limitadores['cliente'].espera(cliente)
+        )
+        if espera:
+            auditar_login(manager, email, "login_throttled", f"Intento bloqueado - Reintentar en {espera}s", cliente)
+            st.error(f"🔒 Demasiados intentos fallidos. Intenta de nuevo en {max(1, espera // 60)} min.")
+            return None
         
-        if not user.empty:
-            user_data = user.iloc[0]
-            
+        # Índice en memoria (sin hashes); puede ir atrasado si los usuarios se
+        # editaron fuera de este proceso (generar_hashes.py, la consola de Supabase)
+        perfil = obtener_indice_usuarios(manager).get(email.lower())
+        
+        # Búsqueda de una sola fila en servidor; el hash nunca se guarda en memoria
+        user_data = manager.buscar_usuario(email, COLUMNAS_LOGIN)
+        
+        # Si el índice no coincide con el servidor (alta, reactivación, baja) se reconstruye
+        if user_data is not None and (perfil is None or str(perfil['activo']).upper() != str(user_data['activo']).upper()):
+            manager.invalidar_tabla("usuarios")
+        
+        if user_data is not None:
             # Verificar que el usuario esté activo
-            if user_data['activo'].upper() != 'SI':
+            if str(user_data['activo']).upper() != 'SI':
                 st.warning("⚠️ Usuario inactivo. Contacte al administrador.")
                 return False
             
-            # Verificar contraseña con bcrypt
+            # Verificar contraseña con bcrypt (fuera del hilo del script)
             password_hash = user_data['password_hash']
             
-            if bcrypt.checkpw(password.encode('utf-8'), password_hash.encode('utf-8')):
+            if verificar_password(password, password_hash):
                 # Login exitoso - guardar en session_state
                 st.session_state.authenticated = True
                 st.session_state.user_data = {
@@ -59,46 +101,271 @@ def validate_user(email, password):
                     'rol': user_data['rol'],
                     'oficina': user_data['oficina_asignada']
                 }
+                limitadores['email'].registrar_exito(clave_email_cliente(email, cliente))
                 
-                # Registrar login en auditoría
-                manager.log_action(
-                    usuario=user_data['email'],
-                    accion="login",
-                    modulo="autenticacion",
-                    detalles=f"Login exitoso - Rol: {user_data['rol']}, Oficina: {user_data['oficina_asignada']}"
-                )
+                # Token firmado para reanudar la sesión sin volver a autenticar
+                secreto = secreto_tokens()
+                if secreto:
+                    token = emitir_token(st.session_state.user_data, secreto)
+                    st.session_state['token_sesion'] = token
+                    st.session_state['cookie_pendiente'] = token
+                
+                # Registrar login en auditoría (junto con lo pendiente del lote)
+                get_cola_auditoria().agregar({
+                    'usuario': user_data['email'],
+                    'accion': "login",
+                    'modulo': "autenticacion",
+                    'detalles': f"Login exitoso - Rol: {user_data['rol']}, Oficina: {user_data['oficina_asignada']}",
+                    'ip': cliente
+                })
+                manager.log_actions(get_cola_auditoria().extraer(forzar=True))
                 
                 return True
             else:
                 # Contraseña incorrecta
-                manager.log_action(
-                    usuario=email,
-                    accion="login_failed",
-                    modulo="autenticacion",
-                    detalles="Intento fallido - Contraseña incorrecta"
-                )
+                registrar_fallo_login(manager, email, cliente, "Intento fallido - Contraseña incorrecta")
                 return False
         else:
             # Usuario no encontrado
-            manager.log_action(
-                usuario=email,
-                accion="login_failed",
-                modulo="autenticacion",
-                detalles="Intento fallido - Usuario no existe"
-            )
+            registrar_fallo_login(manager, email, cliente, "Intento fallido - Usuario no existe")
             return False
         
+    except TimeoutError:
+        st.error("❌ El servidor está ocupado, intenta de nuevo en unos segundos")
+        return False
     except Exception as e:
         st.error(f"❌ Error de autenticación: {e}")
         return False
 
+def registrar_fallo_login(manager, email, cliente, detalles):
+    """Contar el fallo en los limitadores y auditarlo (en lote)"""
+    limitadores = get_limitadores()
+    bloqueo = max(
+        limitadores['email'].registrar_fallo(clave_email_cliente(email, cliente)),
+        limitadores['cuenta'].registrar_fallo(email.lower()),
+        limitadores['cliente'].registrar_fallo(cliente)
+    )
+    auditar_login(manager, email, "login_failed", detalles, cliente)
+    if bloqueo:
+        auditar_login(manager, email, "login_lockout", f"Bloqueo de {bloqueo}s por intentos fallidos", cliente)
+
+def auditar_login(manager, email, accion, detalles, cliente):
+    """Encolar un evento de login y escribir el lote si ya toca"""
+    cola = get_cola_auditoria()
+    cola.agregar({
+        'usuario': email,
+        'accion': accion,
+        'modulo': "autenticacion",
+        'detalles': detalles,
+        'ip': cliente
+    })
+    manager.log_actions(cola.extraer())
+
+def obtener_cliente():
+    """Identificador del cliente (IP) para limitar intentos
+    
+    X-Forwarded-For lo escribe el cliente, así que solo se usa detrás de
+    proxies declarados en [auth] proxies_confiables (número de saltos): se toma
+    la dirección que agregó el proxy más externo, no la primera de la lista.
+    """
+    try:
+        ip = getattr(st.context, 'ip_address', None)
+        saltos = int(st.secrets.get("auth", {}).get("proxies_confiables", 0))
+        if saltos > 0:
+            reenviadas = [d.strip() for d in st.context.headers.get('X-Forwarded-For', '').split(',') if d.strip()]
+            if len(reenviadas) >= saltos:
+                ip = reenviadas[-saltos]
+        return ip or 'local'
+    except Exception:
+        return 'local'
+
+def clave_email_cliente(email, cliente):
+    """Clave del limitador principal: un email desde un cliente"""
+    return f"{email.strip().lower()}|{cliente}"
+
+@st.cache_resource
+def get_limitadores():
+    """Limitadores compartidos por todas las sesiones
+    
+    email: email+cliente, estricto (un atacante no bloquea al dueño desde otra IP).
+    cuenta: email desde cualquier cliente, holgado (ataques distribuidos a una cuenta).
+    cliente: por IP, holgado y con bloqueos cortos (una oficina detrás de un NAT
+    comparte IP durante la ola de logins de la mañana).
+    """
+    return {
+        'email': LimitadorIntentos(max_fallos=5, ventana=300, bloqueo_base=60),
+        'cuenta': LimitadorIntentos(max_fallos=25, ventana=300, bloqueo_base=60, bloqueo_max=900),
+        'cliente': LimitadorIntentos(max_fallos=100, ventana=300, bloqueo_base=60, bloqueo_max=900)
+    }
+
+@st.cache_resource
+def get_cola_auditoria():
+    """Cola compartida de eventos de login; se vacía sola cada pocos segundos"""
+    cola = ColaAuditoria(tamaño=20, intervalo=30)
+    cola.iniciar_vaciado(lambda lote: get_sheets_manager().log_actions(lote))
+    return cola
+
+def obtener_indice_usuarios(manager):
+    """Índice email (minúsculas) -> perfil de usuarios, sin password_hash"""
+    def construir():
+        response = manager.supabase.table("usuarios").select(COLUMNAS_PERFIL).execute()
+        return {fila['email'].lower(): fila for fila in response.data}
+    
+    return manager.get_derivado("indice_usuarios", ("usuarios",), construir)
+
+@st.cache_resource
+def get_pool_bcrypt():
+    """Pool acotado para bcrypt, compartido por todas las sesiones"""
+    return ThreadPoolExecutor(max_workers=HILOS_BCRYPT, thread_name_prefix="bcrypt")
+
+def verificar_password(password, password_hash):
+    """bcrypt.checkpw en el pool (bcrypt libera el GIL); TimeoutError si el pool está saturado"""
+    futuro = get_pool_bcrypt().submit(
+        bcrypt.checkpw, password.encode('utf-8'), password_hash.encode('utf-8')
+    )
+    try:
+        return futuro.result(timeout=TIMEOUT_BCRYPT)
+    except FuturesTimeout:
+        futuro.cancel()
+        raise TimeoutError("Verificación de contraseña excedió el tiempo de espera")
+
+def secreto_tokens():
+    """Clave HMAC de los tokens: [auth] token_secret, o None si falta o es corto
+
+    Sin secreto propio no se emiten ni aceptan tokens (solo login con contraseña):
+    derivarlo de otra credencial, como la key pública de Supabase, permitiría
+    falsificar sesiones.
+    """
+    secreto = str(st.secrets.get("auth", {}).get("token_secret", ""))
+    if len(secreto) < LONGITUD_MINIMA_SECRETO:
+        return None
+    return secreto.encode('utf-8')
+
+def reanudar_sesion():
+    """Restaurar user_data desde el token de la cookie sin consultar usuarios ni bcrypt"""
+    token = token_cliente()
+    secreto = secreto_tokens()
+    if not token or not secreto:
+        return False
+    
+    payload = verificar_token(token, secreto)
+    if payload is None or esta_revocado(payload):
+        st.session_state['cookie_pendiente'] = ""
+        return False
+    
+    st.session_state.authenticated = True
+    st.session_state['token_sesion'] = token
+    st.session_state.user_data = {
+        'email': payload['email'],
+        'nombre': payload['nombre'],
+        'rol': payload['rol'],
+        'oficina': payload['oficina']
+    }
+    return True
+
+@st.cache_data(ttl=60, show_spinner=False)
+def obtener_revocaciones():
+    """Lista de revocación vigente: (jtis revocados, email -> último 'revocar todo')
+
+    Retorna None si no se pudo leer; en ese caso ningún token se acepta.
+    """
+    try:
+        manager = get_sheets_manager()
+        response = manager.supabase.table("sesiones_revocadas") \
+            .select("jti, email, revocado_en") \
+            .gte('expira', datetime.now(timezone.utc).isoformat()) \
+            .execute()
+    except Exception:
+        return None
+    
+    jtis, por_email = set(), {}
+    for fila in response.data:
+        if fila['jti']:
+            jtis.add(fila['jti'])
+        else:
+            momento = datetime.fromisoformat(fila['revocado_en']).timestamp()
+            por_email[fila['email'].lower()] = max(momento, por_email.get(fila['email'].lower(), 0))
+    return jtis, por_email
+
+def esta_revocado(payload):
+    """¿El token está en la lista de revocación (por jti o por email)?"""
+    revocaciones = obtener_revocaciones()
+    if revocaciones is None:
+        return True
+    
+    jtis, por_email = revocaciones
+    return payload['jti'] in jtis or payload['iat'] <= por_email.get(payload['email'].lower(), 0)
+
+def revocar_sesiones(email, jti=None, expira=None, motivo="logout"):
+    """Revocar un token (jti) o todos los tokens vigentes de un email (jti=None)"""
+    if expira is None:
+        expira = datetime.now(timezone.utc).timestamp() + DURACION_TOKEN
+    
+    manager = get_sheets_manager()
+    manager.supabase.table("sesiones_revocadas").insert({
+        'jti': jti,
+        'email': email,
+        'revocado_en': datetime.now(timezone.utc).isoformat(),
+        'expira': datetime.fromtimestamp(expira, timezone.utc).isoformat(),
+        'motivo': motivo
+    }).execute()
+    obtener_revocaciones.clear()
+
+def token_cliente():
+    """Token de sesión del navegador: cookie, o parámetro de URL heredado
+    
+    Un token en la URL se pasa a la cookie y se quita de inmediato (historial,
+    Referer y enlaces compartidos lo exponen). Tras un logout se ignora la cookie
+    que el navegador envió al conectar, aunque siga en st.context.
+    """
+    if PARAM_TOKEN in st.query_params:
+        token = st.query_params[PARAM_TOKEN]
+        del st.query_params[PARAM_TOKEN]
+        st.session_state['cookie_pendiente'] = token
+        return token
+    
+    if st.session_state.get('sesion_cerrada'):
+        return None
+    return st.context.cookies.get(COOKIE_TOKEN)
+
+def aplicar_cookie_pendiente():
+    """Escribir (o borrar, con "") la cookie del token en el navegador
+    
+    Streamlit no puede enviar Set-Cookie desde el script, así que la escribe un
+    fragmento de JavaScript: no es HttpOnly, pero es SameSite=Strict, Secure en
+    https y nunca aparece en la URL.
+    """
+    if 'cookie_pendiente' not in st.session_state:
+        return
+    
+    token = st.session_state.pop('cookie_pendiente')
+    duracion = DURACION_TOKEN if token else 0
+    st.html(
+        "<script>document.cookie = '" + f"{COOKIE_TOKEN}={token}; Max-Age={duracion}; Path=/; SameSite=Strict"
+        + "' + (location.protocol === 'https:' ? '; Secure' : '');</script>",
+        unsafe_allow_javascript=True
+    )
+
 def logout():
-    """Cerrar sesión del usuario"""
-    if st.session_state.get('authenticated'):
+    """Cerrar sesión del usuario: revoca el token, audita y limpia todo el estado"""
+    user_data = st.session_state.get('user_data') if st.session_state.get('authenticated') else None
+    
+    # Revocar el token vigente (el emitido en esta sesión o el que envió el navegador)
+    token = st.session_state.get('token_sesion') or token_cliente()
+    secreto = secreto_tokens()
+    if token and secreto:
+        payload = verificar_token(token, secreto)
+        if payload is not None:
+            try:
+                revocar_sesiones(payload['email'], payload['jti'], payload['exp'])
+            except Exception:
+                pass  # El token expira solo; no bloqueamos el logout
+    
+    if user_data:
         try:
             manager = get_sheets_manager()
             manager.log_action(
-                usuario=st.session_state.user_data['email'],
+                usuario=user_data['email'],
                 accion="logout",
                 modulo="autenticacion",
                 detalles="Cierre de sesión"
@@ -106,6 +373,12 @@ def logout():
         except:
             pass  # Si falla el log no bloqueamos el logout
     
+    for key in list(st.session_state.keys()):
+        del st.session_state[key]
+    
+    # Borrar la cookie en la siguiente ejecución e ignorar la enviada al conectar
+    st.session_state['cookie_pendiente'] = ""
+    st.session_state['sesion_cerrada'] = True
     st.session_state.authenticated = False
     st.session_state.user_data = None
-    st.rerun()
\ No newline at end of file
+    st.rerun()
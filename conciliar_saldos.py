@@ -0,0 +1,48 @@
+"""Conciliar los saldos de permisos de todos los empleados desde la línea de comandos
+
+Pensado para ejecutarse programado (cron) al iniciar el año y periódicamente
+para corregir saldos desviados.
+
+Uso:
+    python conciliar_saldos.py [--año 2025] [--usuario admin@empresa.com] [--dry-run]
+
+Requiere .streamlit/secrets.toml con las credenciales de Supabase.
+"""
+import argparse
+from config import get_sheets_manager
+from utils.helpers import reconciliar_saldos_permisos, get_current_year
+
+def main():
+    parser = argparse.ArgumentParser(description="Conciliar saldos de permisos")
+    parser.add_argument("--año", type=int, default=None, help="Por defecto el año en curso")
+    parser.add_argument("--usuario", default="cli")
+    parser.add_argument("--dry-run", action="store_true", help="Calcular sin guardar")
+    args = parser.parse_args()
+
+    año = args.año or get_current_year()
+    manager = get_sheets_manager()
+
+    ledger, desviados = reconciliar_saldos_permisos(manager, año, guardar=not args.dry_run)
+
+    if ledger.empty:
+        print("No hay empleados registrados")
+        return
+
+    print(f"Año {año} | Empleados: {len(ledger)} | Días usados: {int(ledger['dias_usados'].sum())} | Desviados: {desviados}")
+
+    if args.dry_run:
+        for fila in ledger[ledger['diferencia'] != 0].fillna({'dias_permiso_disponibles': 0}).itertuples(index=False):
+            print(f"  {fila.id_empleado}: guardado {int(fila.dias_permiso_disponibles)} -> ledger {int(fila.dias_disponibles)}")
+        print("Dry-run: no se guardó nada")
+        return
+
+    manager.log_action(
+        usuario=args.usuario,
+        accion="conciliar_saldos_permisos",
+        modulo="permisos",
+        detalles=f"Saldos {año} conciliados: {desviados} empleados actualizados"
+    )
+    print(f"Actualizados: {desviados}")
+
+if __name__ == "__main__":
+    main()
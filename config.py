@@ -1,22 +1,59 @@
 import streamlit as st
-from supabase import create_client
-import pandas as pd
 from datetime import datetime
-import gspread
-from oauth2client.service_account import ServiceAccountCredentials
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+
+# Tablas que se respaldan en Google Sheets
+TABLAS_SINCRONIZABLES = ["asistencias", "permisos", "incapacidades"]
+
+# Códigos de PostgREST/Postgres cuando una función RPC no existe
+RPC_NO_ENCONTRADA = ("PGRST202", "42883")
+
+# Lecturas simultáneas máximas de get_many (compartidas por todas las sesiones)
+MAX_LECTURAS_PARALELAS = 8
 
 class DualManager:
-    """Gestor que usa Supabase como principal y Sheets como backup"""
+    """Gestor que usa Supabase como principal y Sheets como backup
+    
+    Las conexiones se abren en el primer uso (propiedades supabase y sheets):
+    construir el gestor no espera a la red ni importa los clientes.
+    """
     
     def __init__(self):
-        self.supabase = self._init_supabase()
-        self.sheets = self._init_sheets()
+        self._sheets = None
+        self._sheets_iniciado = False
         self._cache_version = 0  # Control de versión de caché
+        self._version_global = 0  # Versión de datos para estructuras derivadas
+        self._versiones = {}  # Versión de datos por tabla
+        self._derivados = {}  # Índices/resúmenes construidos a partir de tablas
+        self._locks_derivados = {}  # Un lock por derivado: su construcción no bloquea al manager
+        self._sin_actualizado_en = set()  # Tablas sin la columna de sql/012
+        self._lock = threading.RLock()
+        self._pool_lecturas = ThreadPoolExecutor(max_workers=MAX_LECTURAS_PARALELAS, thread_name_prefix="lecturas")
+    
+    @property
+    def supabase(self):
+        """Cliente de Supabase (compartido por proceso, creado en el primer uso)"""
+        return self._init_supabase()
+    
+    @property
+    def sheets(self):
+        """Spreadsheet de respaldo; solo lo usan las pestañas de sincronización"""
+        if not self._sheets_iniciado:
+            with self._lock:
+                if not self._sheets_iniciado:
+                    self._sheets = self._init_sheets()
+                    self._sheets_iniciado = True
+        return self._sheets
     
     @staticmethod
-    @st.cache_resource
+    @st.cache_resource(show_spinner=False)
     def _init_supabase():
         """Conectar a Supabase"""
+        from supabase import create_client
+        
         return create_client(
             st.secrets["supabase"]["url"],
             st.secrets["supabase"]["key"]
@@ -25,6 +62,9 @@ class DualManager:
     def _init_sheets(self):
         """Conectar a Google Sheets (para sync)"""
         try:
+            import gspread
+            from oauth2client.service_account import ServiceAccountCredentials
+            
             scope = [
                 'https://spreadsheets.google.com/feeds',
                 'https://www.googleapis.com/auth/drive'
@@ -47,36 +87,211 @@ class DualManager:
     
     @staticmethod
     @st.cache_data(ttl=60, show_spinner=False)
-    def _get_dataframe_cached(table_name, _cache_version):
+    def _get_dataframe_cached(table_name, cache_version):
         """Función interna cacheada con control de versión"""
+        import pandas as pd
+        
         try:
-            # Obtener instancia de supabase directamente
-            supabase = create_client(
-                st.secrets["supabase"]["url"],
-                st.secrets["supabase"]["key"]
-            )
-            response = supabase.table(table_name).select("*").execute()
+            response = DualManager._init_supabase().table(table_name).select("*").execute()
             return pd.DataFrame(response.data)
         except Exception as e:
             st.error(f"Error al leer {table_name}: {e}")
             return pd.DataFrame()
     
+    def get_many(self, consultas):
+        """Varias lecturas en paralelo: la latencia es la de la más lenta, no la suma
+        
+        consultas: lista de tablas, o dict alias -> tabla o (tabla, columnas, filtros)
+        con filtros {columna: valor} de igualdad. Cada lectura pasa por el mismo
+        caché que get_dataframe, y st.cache_data calcula cada clave una sola vez
+        aunque la pidan varias sesiones a la vez (single-flight).
+        Retorna dict alias -> DataFrame en el mismo orden.
+        """
+        if not isinstance(consultas, dict):
+            consultas = {tabla: tabla for tabla in consultas}
+        
+        if len(consultas) <= 1:
+            return {alias: self._leer(consulta) for alias, consulta in consultas.items()}
+        
+        # Los hilos del pool heredan el contexto de la sesión (caché, st.error)
+        ctx = get_script_run_ctx()
+        
+        def tarea(consulta):
+            add_script_run_ctx(threading.current_thread(), ctx)
+            return self._leer(consulta)
+        
+        futuros = {alias: self._pool_lecturas.submit(tarea, consulta) for alias, consulta in consultas.items()}
+        return {alias: futuro.result() for alias, futuro in futuros.items()}
+    
+    def _leer(self, consulta):
+        """Una lectura de get_many: tabla completa o consulta angosta"""
+        if isinstance(consulta, str):
+            return self.get_dataframe(consulta)
+        
+        tabla, columnas, filtros = consulta
+        return self._get_consulta_cached(tabla, columnas, tuple(sorted((filtros or {}).items())), self._cache_version)
+    
+    @staticmethod
+    @st.cache_data(ttl=60, show_spinner=False)
+    def _get_consulta_cached(table_name, columnas, filtros, cache_version):
+        """Consulta de pocas columnas con filtros de igualdad (cacheada como las tablas)"""
+        import pandas as pd
+        
+        try:
+            query = DualManager._init_supabase().table(table_name).select(columnas)
+            for columna, valor in filtros:
+                query = query.eq(columna, valor)
+            return pd.DataFrame(query.execute().data)
+        except Exception as e:
+            st.error(f"Error al leer {table_name}: {e}")
+            return pd.DataFrame()
+    
     def invalidate_cache(self):
         """Invalidar caché incrementando la versión"""
+        # cache_version es parte de la clave de las lecturas cacheadas: las
+        # entradas viejas quedan sin uso y expiran por su ttl
+        self._cache_version += 1
+        # Las estructuras derivadas se reconstruyen en el siguiente acceso
+        with self._lock:
+            self._version_global += 1
+    
+    def invalidar_tabla(self, table_name):
+        """Reconstruir en el siguiente acceso los derivados de una tabla modificada fuera de la app"""
+        with self._lock:
+            self._versiones[table_name] = self._versiones.get(table_name, 0) + 1
+    
+    def registrar_insercion(self, table_name, registro):
+        """Notificar un INSERT: invalida dataframes y actualiza derivados en sitio"""
         self._cache_version += 1
-        # También limpiar el caché general
-        st.cache_data.clear()
+        
+        with self._lock:
+            # Solo se actualizan en sitio los derivados vigentes que lo soportan
+            vigentes = [
+                entrada for entrada in self._derivados.values()
+                if table_name in entrada['tablas']
+                and entrada['clave'] == self._clave_version(entrada['tablas'])
+                and hasattr(entrada['valor'], 'agregar_registro')
+            ]
+
+            self._versiones[table_name] = self._versiones.get(table_name, 0) + 1
+
+            for entrada in vigentes:
+                entrada['valor'].agregar_registro(table_name, registro)
+                entrada['clave'] = self._clave_version(entrada['tablas'])
+    
+    # ==================== DERIVADOS (en memoria) ====================
     
+    def _clave_version(self, tablas):
+        """Clave de versión de datos para un conjunto de tablas"""
+        return (self._version_global,) + tuple(self._versiones.get(t, 0) for t in tablas)
+    
+    def version_datos(self, tablas):
+        """Versión de las escrituras locales en esas tablas (para claves de caché externas)"""
+        with self._lock:
+            return self._clave_version(tablas)
+    
+    def get_derivado(self, nombre, tablas, constructor, ttl=300):
+        """Obtener una estructura derivada (índice, resumen) construida desde tablas
+        
+        Se reconstruye si cambió la versión de alguna tabla o si superó el ttl;
+        las inserciones notificadas con registrar_insercion la actualizan en sitio.
+        El constructor corre sin el lock del manager, solo con el de su nombre.
+        """
+        with self._lock:
+            lock_nombre = self._locks_derivados.setdefault(nombre, threading.Lock())
+        
+        with lock_nombre:
+            with self._lock:
+                clave = self._clave_version(tablas)
+                entrada = self._derivados.get(nombre)
+                if entrada is not None and entrada['clave'] == clave and time.time() - entrada['creado'] <= ttl:
+                    return entrada['valor']
+            
+            # Si llega una escritura durante la construcción, la clave queda vieja
+            # y el siguiente acceso reconstruye
+            entrada = {
+                'tablas': tuple(tablas),
+                'clave': clave,
+                'creado': time.time(),
+                'valor': constructor()
+            }
+            
+            with self._lock:
+                self._derivados[nombre] = entrada
+            
+            return entrada['valor']
+
+    # ==================== CONTEOS (Supabase) ====================
+
+    def count_rows(self, table_name, filtros=None):
+        """Contar registros sin descargar filas (count='exact', solo encabezados)"""
+        query = self.supabase.table(table_name).select("id", count="exact", head=True)
+        for columna, valor in (filtros or {}).items():
+            query = query.eq(columna, valor)
+        response = query.execute()
+        return response.count or 0
+
+    def marca_agua(self, table_name, columna_fecha=None, desde=None, hasta=None):
+        """(registros, última modificación) de un rango de fechas en una sola consulta ligera
+
+        Cambia cuando se insertan, editan o borran registros del rango (también
+        fuera de la app: actualizado_en lo mantiene un trigger, sql/012); sirve
+        como huella barata para saber si hay que recalcular algo derivado.
+        Sin columna_fecha cubre toda la tabla. Si la tabla aún no tiene
+        actualizado_en se usa el id máximo, que solo detecta altas y bajas.
+        """
+        def consultar(columna):
+            query = self.supabase.table(table_name).select(columna, count="exact")
+            if columna_fecha:
+                query = query.gte(columna_fecha, str(desde)).lte(columna_fecha, str(hasta))
+            response = query.order(columna, desc=True).limit(1).execute()
+            return (response.count or 0, response.data[0][columna] if response.data else None)
+        
+        if table_name not in self._sin_actualizado_en:
+            try:
+                return consultar('actualizado_en')
+            except Exception:
+                self._sin_actualizado_en.add(table_name)
+        return consultar('id')
+
+    def buscar_usuario(self, email, columnas="*"):
+        """Un solo usuario por email (sin distinguir mayúsculas) o None"""
+        # ilike usa patrones LIKE: escapar comodines para que sea comparación exacta
+        patron = email.strip().replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        response = self.supabase.table("usuarios").select(columnas) \
+            .ilike('email', patron) \
+            .limit(1) \
+            .execute()
+        return response.data[0] if response.data else None
+
+    def get_sync_status(self):
+        """Resumen cacheado de registros pendientes de sincronizar por tabla"""
+        return self._get_sync_status_cached(self._cache_version)
+
+    @staticmethod
+    @st.cache_data(ttl=60, show_spinner=False)
+    def _get_sync_status_cached(cache_version):
+        """Función interna cacheada: un conteo head-only por tabla sincronizable"""
+        supabase = DualManager._init_supabase()
+        resumen = {}
+        for tabla in TABLAS_SINCRONIZABLES:
+            try:
+                response = supabase.table(tabla).select("id", count="exact", head=True).eq('sincronizado', False).execute()
+                resumen[tabla] = response.count or 0
+            except Exception:
+                resumen[tabla] = None  # Tabla no disponible
+        return resumen
+
     # ==================== ESCRITURA (Supabase) ====================
     
     def append_row(self, table_name, data_dict):
         """Guardar en Supabase (marca como no sincronizado)"""
         try:
             data_dict['sincronizado'] = False
-            self.supabase.table(table_name).insert(data_dict).execute()
+            response = self.supabase.table(table_name).insert(data_dict).execute()
             
             # CRÍTICO: Invalidar caché después de insertar
-            self.invalidate_cache()
+            self.registrar_insercion(table_name, response.data[0] if response.data else data_dict)
             return True
         except Exception as e:
             st.error(f"Error al guardar en {table_name}: {e}")
@@ -106,10 +321,164 @@ class DualManager:
             st.error(f"Error al eliminar en {table_name}: {e}")
             return False
     
+    def upsert_rows(self, table_name, registros, on_conflict, chunk_size=500):
+        """Upsert masivo en bloques de chunk_size (una petición por bloque)"""
+        for i in range(0, len(registros), chunk_size):
+            self.supabase.table(table_name).upsert(
+                registros[i:i + chunk_size],
+                on_conflict=on_conflict,
+                returning="minimal"
+            ).execute()
+    
     def get_next_id(self, table_name):
         """Siguiente ID (Supabase lo hace automático)"""
         return None  # Supabase usa SERIAL
     
+    # ==================== OPERACIONES ATÓMICAS (RPC) ====================
+    
+    def _rpc(self, nombre, params):
+        """Ejecutar función SQL; retorna (True, data) o (False, None) si no está instalada"""
+        from postgrest.exceptions import APIError
+        
+        try:
+            return True, self.supabase.rpc(nombre, params).execute().data
+        except APIError as e:
+            if e.code in RPC_NO_ENCONTRADA:
+                return False, None
+            raise
+    
+    def procesar_permisos_lote(self, ids_permisos, aprobar, aprobado_por, comentario=None):
+        """Aprobar/rechazar varios permisos en una transacción (sql/003_procesar_permisos_lote.sql)
+        
+        Retorna una lista de dicts con id, ok y nuevo_saldo o error por permiso.
+        """
+        ids = [int(i) for i in ids_permisos]
+        disponible, resultados = self._rpc('procesar_permisos_lote', {
+            'p_ids': ids,
+            'p_aprobar': bool(aprobar),
+            'p_aprobado_por': aprobado_por,
+            'p_comentario': comentario
+        })
+        
+        if not disponible:
+            # Emulación: mismas reglas por permiso, sin transacción común
+            resultados = []
+            for id_permiso in ids:
+                try:
+                    resultado = self._aprobar_permiso_local(id_permiso, aprobar, aprobado_por, comentario)
+                    resultados.append({**resultado, 'id': id_permiso, 'ok': True})
+                except Exception as e:
+                    resultados.append({'id': id_permiso, 'ok': False, 'error': str(e)})
+        
+        self.invalidate_cache()
+        return resultados
+    
+    def actualizar_saldos_permisos(self, saldos):
+        """Guardar saldos de permisos {id_empleado: dias} en una operación masiva
+        
+        Usa la función SQL actualizar_saldos_permisos (un solo UPDATE); sin ella,
+        agrupa por valor de saldo: a lo más un UPDATE ... IN (...) por cada valor.
+        """
+        if not saldos:
+            return 0
+        
+        disponible, actualizados = self._rpc('actualizar_saldos_permisos', {
+            'p_saldos': [{'id_empleado': str(k), 'dias': int(v)} for k, v in saldos.items()]
+        })
+        
+        if not disponible:
+            por_saldo = {}
+            for id_empleado, dias in saldos.items():
+                por_saldo.setdefault(int(dias), []).append(id_empleado)
+            
+            actualizados = 0
+            for dias, ids in por_saldo.items():
+                response = self.supabase.table("empleados").update({
+                    'dias_permiso_disponibles': dias
+                }).in_('id_empleado', ids).execute()
+                actualizados += len(response.data or [])
+        
+        self.invalidate_cache()
+        return actualizados
+    
+    def guardar_bonos_lote(self, registros, chunk_size=500):
+        """Upsert de bonos por (id_empleado, año, mes) con una sola invalidación de caché
+        
+        Usa la función SQL guardar_bonos_lote (sql/005_guardar_bonos_lote.sql), que
+        guarda todo en una transacción. Sin ella, hace upsert en bloques de chunk_size.
+        Retorna {'insertados': n, 'actualizados': m}.
+        """
+        if not registros:
+            return {'insertados': 0, 'actualizados': 0}
+        
+        disponible, resultado = self._rpc('guardar_bonos_lote', {'p_bonos': registros})
+        
+        if not disponible:
+            # Claves existentes de los periodos involucrados (solo columnas clave)
+            existentes = set()
+            for año, mes in {(r['año'], r['mes']) for r in registros}:
+                response = self.supabase.table("bonos").select("id_empleado") \
+                    .eq('año', año).eq('mes', mes).execute()
+                existentes.update((str(f['id_empleado']), año, mes) for f in response.data)
+            
+            actualizados = sum((str(r['id_empleado']), r['año'], r['mes']) in existentes for r in registros)
+            self.upsert_rows("bonos", registros, on_conflict="id_empleado,año,mes", chunk_size=chunk_size)
+            resultado = {'insertados': len(registros) - actualizados, 'actualizados': actualizados}
+        
+        self.invalidate_cache()
+        return resultado
+    
+    def _aprobar_permiso_local(self, id_permiso, aprobar, aprobado_por, comentario, intentos=5):
+        """Emulación por permiso de procesar_permisos_lote (sin sql/002 y 003)
+        
+        Cambia el estado solo si sigue Pendiente y descuenta el saldo con
+        compare-and-swap; si no alcanza, revierte el estado.
+        """
+        nuevo_estado = "Aprobado" if aprobar else "Rechazado"
+        
+        # Cambiar estado solo si sigue Pendiente (evita doble aprobación)
+        response = self.supabase.table("permisos").update({
+            'estado': nuevo_estado,
+            'aprobado_por': aprobado_por,
+            'fecha_aprobacion': datetime.now().isoformat(),
+            'comentario_aprobacion': comentario
+        }).eq('id', id_permiso).eq('estado', 'Pendiente').execute()
+        
+        if not response.data:
+            raise ValueError(f"El permiso {id_permiso} ya fue procesado o no existe")
+        
+        permiso = response.data[0]
+        id_empleado = permiso['id_empleado']
+        dias = permiso['dias_solicitados']
+        
+        for _ in range(intentos):
+            empleado = self.supabase.table("empleados").select("dias_permiso_disponibles") \
+                .eq('id_empleado', id_empleado).limit(1).execute().data
+            saldo = empleado[0]['dias_permiso_disponibles'] if empleado else 0
+            
+            if not aprobar:
+                return {'estado': nuevo_estado, 'id_empleado': id_empleado, 'dias_solicitados': dias, 'nuevo_saldo': saldo}
+            
+            if saldo < dias:
+                break
+            
+            # Solo escribe si nadie cambió el saldo desde la lectura
+            actualizado = self.supabase.table("empleados").update({
+                'dias_permiso_disponibles': saldo - dias
+            }).eq('id_empleado', id_empleado).eq('dias_permiso_disponibles', saldo).execute()
+            
+            if actualizado.data:
+                return {'estado': nuevo_estado, 'id_empleado': id_empleado, 'dias_solicitados': dias, 'nuevo_saldo': saldo - dias}
+        
+        # Revertir el estado: no se pudo descontar
+        self.supabase.table("permisos").update({
+            'estado': 'Pendiente',
+            'aprobado_por': None,
+            'fecha_aprobacion': None,
+            'comentario_aprobacion': None
+        }).eq('id', id_permiso).execute()
+        raise ValueError(f"Días insuficientes o saldo en conflicto para el empleado {id_empleado}")
+    
     # ==================== SINCRONIZACIÓN ====================
     
     def sincronizar_a_sheets(self):
@@ -211,6 +580,26 @@ class DualManager:
         except Exception as e:
             return {"success": False, "mensaje": f"Error: {e}", "sincronizados": 0}
     
+    def log_actions(self, registros):
+        """Log de auditoría en lote (un solo insert)"""
+        if not registros:
+            return
+        try:
+            timestamp = datetime.now().isoformat()
+            self.supabase.table('auditoria').insert([
+                {
+                    'timestamp': r.get('timestamp', timestamp),
+                    'usuario': r['usuario'],
+                    'accion': r['accion'],
+                    'modulo': r['modulo'],
+                    'detalles': r['detalles'],
+                    'ip': r.get('ip', 'local')
+                }
+                for r in registros
+            ]).execute()
+        except:
+            pass
+    
     def log_action(self, usuario, accion, modulo, detalles, id_registro=None):
         """Log de auditoría"""
         try:
@@ -1,19 +1,181 @@
+"""Alta masiva de usuarios desde CSV
+
+Uso:
+    python generar_hashes.py usuarios.csv [--rounds 12] [--workers 4] [--lote 200] [--dry-run | --sql]
+
+El CSV debe tener las columnas: email, password, nombre, rol, oficina_asignada
+(opcional: activo, por defecto SI). Las contraseñas se hashean con bcrypt en
+paralelo y los usuarios se guardan con upsert por email (requiere
+sql/008_usuarios_email_unico.sql y .streamlit/secrets.toml).
+
+--dry-run valida y hashea sin escribir; --sql imprime INSERTs en lugar de guardar.
+"""
+import argparse
+import csv
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
 import bcrypt
 
-usuarios = [
-    ("admin@empresa.com", "Admin2025!"),
-    ("supervisora@empresa.com", "Super2025!"),
-    ("reg.norte@empresa.com", "Norte2025!"),
-    ("reg.sur@empresa.com", "Sur2025!"),
-    # ... agrega todos
-]
-
-print("-- SQL con hashes generados:")
-print()
-
-for email, password in usuarios:
-    hash_bytes = bcrypt.hashpw(password.encode(), bcrypt.gensalt())
-    hash_str = hash_bytes.decode()
-    print(f"-- Password: {password}")
-    print(f"'{hash_str}',")
-    print()
\ No newline at end of file
+COLUMNAS_REQUERIDAS = ['email', 'password', 'nombre', 'rol', 'oficina_asignada']
+ROLES_VALIDOS = {'admin', 'supervisora', 'registrador'}
+MAX_BYTES_PASSWORD = 72
+PATRON_EMAIL = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+
+def _hashear(args):
+    """Hash bcrypt de una contraseña (se ejecuta en un proceso del pool)"""
+    password, rounds = args
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=rounds)).decode('utf-8')
+
+def leer_usuarios(ruta):
+    """Filas del CSV normalizadas (email en minúsculas, activo SI/NO)
+
+    Retorna (usuarios, incompletas); incompletas: línea -> columnas requeridas
+    que faltan en una fila más corta que el encabezado.
+    """
+    with open(ruta, newline='', encoding='utf-8-sig') as archivo:
+        lector = csv.DictReader(archivo)
+        faltantes = set(COLUMNAS_REQUERIDAS) - set(lector.fieldnames or [])
+        if faltantes:
+            raise ValueError(f"Faltan columnas en el CSV: {', '.join(sorted(faltantes))}")
+
+        usuarios, incompletas = [], {}
+        for linea, fila in enumerate(lector, start=2):
+            # DictReader deja None en las columnas que no trae una fila corta
+            vacias = [c for c in COLUMNAS_REQUERIDAS if fila.get(c) is None]
+            if vacias:
+                incompletas[linea] = vacias
+            usuarios.append({
+                'email': (fila.get('email') or '').strip().lower(),
+                'password': fila.get('password') or '',
+                'nombre': (fila.get('nombre') or '').strip(),
+                'rol': (fila.get('rol') or '').strip().lower(),
+                'oficina_asignada': (fila.get('oficina_asignada') or '').strip(),
+                'activo': (fila.get('activo') or 'SI').strip().upper()
+            })
+
+        return usuarios, incompletas
+
+def validar_usuarios(usuarios, incompletas=None):
+    """Lista de errores (línea, mensaje); línea 2 = primera fila de datos"""
+    errores = []
+    vistos = {}
+    incompletas = incompletas or {}
+
+    for linea, usuario in enumerate(usuarios, start=2):
+        if linea in incompletas:
+            errores.append((linea, f"fila incompleta, faltan: {', '.join(incompletas[linea])}"))
+            continue
+
+        if not PATRON_EMAIL.match(usuario['email']):
+            errores.append((linea, f"email inválido: {usuario['email']!r}"))
+        elif usuario['email'] in vistos:
+            errores.append((linea, f"email duplicado (ya en línea {vistos[usuario['email']]}): {usuario['email']}"))
+        else:
+            vistos[usuario['email']] = linea
+
+        if usuario['rol'] not in ROLES_VALIDOS:
+            errores.append((linea, f"rol inválido: {usuario['rol']!r}"))
+        if len(usuario['password']) < 8:
+            errores.append((linea, "la contraseña debe tener al menos 8 caracteres"))
+        elif len(usuario['password'].encode('utf-8')) > MAX_BYTES_PASSWORD:
+            # bcrypt solo usa los primeros 72 bytes (y bcrypt >= 4.1 rechaza más)
+            errores.append((linea, f"la contraseña excede {MAX_BYTES_PASSWORD} bytes en UTF-8"))
+        if not usuario['nombre'] or not usuario['oficina_asignada']:
+            errores.append((linea, "nombre y oficina_asignada son obligatorios"))
+        if usuario['activo'] not in ('SI', 'NO'):
+            errores.append((linea, f"activo debe ser SI o NO: {usuario['activo']!r}"))
+
+    return errores
+
+def hashear_passwords(passwords, rounds, workers):
+    """Hashes bcrypt en un pool de procesos (mismo orden que passwords)"""
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(_hashear, [(p, rounds) for p in passwords], chunksize=4))
+
+def emails_existentes(manager, emails, lote):
+    """Emails que ya existen en usuarios (consulta solo la columna email, por lotes)"""
+    existentes = set()
+    for i in range(0, len(emails), lote):
+        response = manager.supabase.table("usuarios").select("email").in_('email', emails[i:i + lote]).execute()
+        existentes.update(f['email'].lower() for f in response.data)
+    return existentes
+
+def imprimir_sql(registros):
+    """INSERTs listos para pegar en el editor SQL de Supabase"""
+    print("-- SQL con hashes generados:")
+    for r in registros:
+        valores = ", ".join("'" + str(r[c]).replace("'", "''") + "'" for c in
+                            ['email', 'password_hash', 'nombre', 'rol', 'oficina_asignada', 'activo'])
+        print(f"INSERT INTO usuarios (email, password_hash, nombre, rol, oficina_asignada, activo) VALUES ({valores})"
+              f" ON CONFLICT (email) DO UPDATE SET password_hash = EXCLUDED.password_hash, nombre = EXCLUDED.nombre,"
+              f" rol = EXCLUDED.rol, oficina_asignada = EXCLUDED.oficina_asignada, activo = EXCLUDED.activo;")
+
+def main():
+    parser = argparse.ArgumentParser(description="Alta masiva de usuarios desde CSV")
+    parser.add_argument("csv", help="Archivo CSV con los usuarios")
+    parser.add_argument("--rounds", type=int, default=12, help="Costo bcrypt (4-31, por defecto 12)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--lote", type=int, default=200, help="Usuarios por petición de upsert")
+    grupo = parser.add_mutually_exclusive_group()
+    grupo.add_argument("--dry-run", action="store_true", help="Validar y hashear sin guardar")
+    grupo.add_argument("--sql", action="store_true", help="Imprimir SQL en lugar de guardar")
+    args = parser.parse_args()
+
+    if not 4 <= args.rounds <= 31:
+        parser.error("--rounds debe estar entre 4 y 31")
+
+    tiempos = {}
+    inicio = time.perf_counter()
+
+    usuarios, incompletas = leer_usuarios(args.csv)
+    errores = validar_usuarios(usuarios, incompletas)
+    tiempos['validación'] = time.perf_counter() - inicio
+
+    if errores:
+        for linea, mensaje in errores:
+            print(f"Línea {linea}: {mensaje}", file=sys.stderr)
+        print(f"{len(errores)} errores; no se guardó nada", file=sys.stderr)
+        return 1
+
+    if not usuarios:
+        print("El CSV no tiene usuarios")
+        return 0
+
+    marca = time.perf_counter()
+    hashes = hashear_passwords([u['password'] for u in usuarios], args.rounds, args.workers)
+    tiempos['hashing'] = time.perf_counter() - marca
+
+    registros = [
+        {**{k: v for k, v in u.items() if k != 'password'}, 'password_hash': h}
+        for u, h in zip(usuarios, hashes)
+    ]
+
+    if args.sql:
+        imprimir_sql(registros)
+    else:
+        from config import get_sheets_manager
+
+        manager = get_sheets_manager()
+        marca = time.perf_counter()
+        existentes = emails_existentes(manager, [r['email'] for r in registros], args.lote)
+        nuevos = sum(r['email'] not in existentes for r in registros)
+
+        if args.dry_run:
+            print(f"Dry-run: {nuevos} usuarios nuevos y {len(registros) - nuevos} se actualizarían")
+        else:
+            manager.upsert_rows("usuarios", registros, on_conflict="email", chunk_size=args.lote)
+            manager.invalidate_cache()
+            print(f"Guardados: {nuevos} nuevos, {len(registros) - nuevos} actualizados")
+        tiempos['base de datos'] = time.perf_counter() - marca
+
+    print(f"\nUsuarios: {len(registros)} | bcrypt rounds={args.rounds} | workers={args.workers}", file=sys.stderr)
+    for etapa, segundos in tiempos.items():
+        print(f"  {etapa:<14} {segundos:8.2f}s", file=sys.stderr)
+    print(f"  {'hashes/s':<14} {len(registros) / max(tiempos['hashing'], 1e-9):8.1f}", file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,117 @@
+"""Benchmark de arranque: tiempos de importación y de conexión
+
+Uso:
+    python medir_arranque.py [--repeticiones 5] [--conectar] [--salida arranque.jsonl]
+
+Cada importación se mide en un intérprete nuevo (arranque en frío) y se
+reporta la mediana. "login" es lo que necesita la pantalla de acceso (auth);
+los módulos y los clientes de backend se cargan después, al usarlos.
+
+--conectar mide además la creación del gestor, la conexión a Supabase (con una
+consulta head-only) y la apertura del spreadsheet; requiere ejecutarse desde la
+raíz del proyecto con .streamlit/secrets.toml.
+--salida agrega el resultado como una línea JSON para comparar corridas.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+# Fase -> importaciones a medir en frío
+FASES_IMPORTACION = {
+    'streamlit': "import streamlit",
+    'login (auth)': "import auth",
+    'módulo asistencias': "import modules.asistencias",
+    'módulo permisos': "import modules.permisos",
+    'módulo incapacidades': "import modules.incapacidades",
+    'módulo bonos': "import modules.bonos",
+    'cliente supabase': "import supabase",
+    'cliente sheets': "import gspread, oauth2client.service_account",
+}
+
+PLANTILLA_MEDICION = (
+    "import time\n"
+    "inicio = time.perf_counter()\n"
+    "{codigo}\n"
+    "print(time.perf_counter() - inicio)\n"
+)
+
+def medir_importacion(codigo, repeticiones):
+    """Mediana de segundos de una importación en intérpretes nuevos"""
+    tiempos = []
+    for _ in range(repeticiones):
+        salida = subprocess.run(
+            [sys.executable, "-c", PLANTILLA_MEDICION.format(codigo=codigo)],
+            capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))
+        )
+        if salida.returncode != 0:
+            raise RuntimeError(salida.stderr.strip().splitlines()[-1])
+        tiempos.append(float(salida.stdout.strip().splitlines()[-1]))
+    return statistics.median(tiempos)
+
+def medir_conexiones():
+    """Segundos de cada fase de conexión (en este proceso, en orden de uso)"""
+    tiempos = {}
+
+    marca = time.perf_counter()
+    from config import DualManager
+    manager = DualManager()
+    tiempos['gestor'] = time.perf_counter() - marca
+
+    marca = time.perf_counter()
+    manager.count_rows("empleados")
+    tiempos['supabase (1ª consulta)'] = time.perf_counter() - marca
+
+    marca = time.perf_counter()
+    conectado = manager.sheets is not None
+    tiempos['sheets' if conectado else 'sheets (no configurado)'] = time.perf_counter() - marca
+
+    return tiempos
+
+def main():
+    parser = argparse.ArgumentParser(description="Tiempos de arranque de la app")
+    parser.add_argument("--repeticiones", type=int, default=5, help="Intérpretes por importación (mediana)")
+    parser.add_argument("--conectar", action="store_true", help="Medir también las conexiones a Supabase y Sheets")
+    parser.add_argument("--salida", help="Archivo JSONL donde agregar el resultado")
+    args = parser.parse_args()
+
+    if args.repeticiones < 1:
+        parser.error("--repeticiones debe ser al menos 1")
+
+    resultado = {
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'importacion': {},
+        'conexion': {}
+    }
+
+    for fase, codigo in FASES_IMPORTACION.items():
+        try:
+            resultado['importacion'][fase] = medir_importacion(codigo, args.repeticiones)
+        except RuntimeError as e:
+            print(f"{fase}: error ({e})", file=sys.stderr)
+
+    if args.conectar:
+        try:
+            resultado['conexion'] = medir_conexiones()
+        except Exception as e:
+            print(f"Conexión: error ({e})", file=sys.stderr)
+
+    print(f"Arranque (mediana de {args.repeticiones}, en frío)")
+    for grupo in ('importacion', 'conexion'):
+        for fase, segundos in resultado[grupo].items():
+            print(f"  {fase:<26} {segundos * 1000:8.0f} ms")
+
+    if args.salida:
+        with open(args.salida, "a", encoding="utf-8") as archivo:
+            archivo.write(json.dumps(resultado, ensure_ascii=False) + "\n")
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,11 @@
 import streamlit as st
 from datetime import datetime, date, timedelta
 import pandas as pd
+from modules.conflictos import mostrar_conflictos, mostrar_aviso_conflictos, revisar_conflictos
+from utils.intervalos import obtener_indice_ausencias_activas
+from utils.helpers import recargar_seccion
+
+ESTADOS_ASISTENCIA = ["Presente", "Ausente", "Retardo", "Permiso", "Incapacidad"]
 
 def show_asistencias_module():
     """Módulo de asistencias con Supabase + Sync a Sheets"""
@@ -13,10 +18,11 @@ def show_asistencias_module():
     manager = get_sheets_manager()
     
     # Tabs principales
-    tab1, tab2, tab3, tab4 = st.tabs([
+    tab1, tab2, tab3, tab4, tab5 = st.tabs([
         "✏️ Registrar",
         "📊 Ver Asistencias", 
         "📈 Estadísticas",
+        "⚠️ Conflictos",
         "🔄 Sincronizar"
     ])
     
@@ -30,12 +36,18 @@ def show_asistencias_module():
         mostrar_estadisticas(user, manager)
     
     with tab4:
+        mostrar_conflictos(user, manager)
+    
+    with tab5:
         sincronizar_sheets(user, manager)
 
+@st.fragment
 def registrar_asistencia(user, manager):
     """Formulario de registro"""
     st.subheader("Registro Diario")
     
+    mostrar_aviso_conflictos()
+    
     # Determinar oficina
     if user['rol'] == 'registrador':
         oficina = user['oficina']
@@ -77,6 +89,12 @@ def registrar_asistencia(user, manager):
     if ya_registrados:
         st.error(f"⚠️ {len(ya_registrados)} empleados ya registrados hoy")
     
+    # Ausencias conocidas (incapacidades y permisos aprobados) para preseleccionar estado
+    indice_activas = obtener_indice_ausencias_activas(manager)
+    ausentes = indice_activas.en_fecha(fecha, oficina) if indice_activas.cubre(fecha) else {}
+    if ausentes:
+        st.info(f"🏥 {len(ausentes)} empleados con incapacidad o permiso en esta fecha (preseleccionados)")
+    
     # Formulario
     with st.form("form_asistencias"):
         registros = []
@@ -86,16 +104,22 @@ def registrar_asistencia(user, manager):
             
             col1, col2, col3, col4 = st.columns([3, 2, 2, 3])
             
+            ausencia = ausentes.get(str(emp['id_empleado']))
+            
             with col1:
                 st.write(f"**{emp['nombre_completo']}**")
                 if ya_tiene:
                     st.caption("✅ Ya registrado")
+                elif ausencia:
+                    st.caption(f"🏥 {ausencia['tipo']} ({ausencia['fecha_inicio']} a {ausencia['fecha_fin']})")
             
             with col2:
+                # La fecha va en la clave: al cambiarla se vuelve a aplicar la preselección
                 estado = st.selectbox(
                     "Estado",
-                    ["Presente", "Ausente", "Retardo", "Permiso", "Incapacidad"],
-                    key=f"estado_{emp['id_empleado']}",
+                    ESTADOS_ASISTENCIA,
+                    index=ESTADOS_ASISTENCIA.index(ausencia['ausencia']) if ausencia else 0,
+                    key=f"estado_{emp['id_empleado']}_{fecha_str}",
                     disabled=ya_tiene,
                     label_visibility="collapsed"
                 )
@@ -140,7 +164,7 @@ def guardar_asistencias(registros, fecha, oficina, es_sabado, user, manager):
     """Guardar en Supabase"""
     try:
         timestamp = datetime.now().isoformat()
-        guardados = 0
+        guardados = []
         
         progress = st.progress(0)
         for i, reg in enumerate(registros):
@@ -158,17 +182,18 @@ def guardar_asistencias(registros, fecha, oficina, es_sabado, user, manager):
             }
             
             if manager.append_row('asistencias', datos):
-                guardados += 1
+                guardados.append(datos)
             
             progress.progress((i + 1) / len(registros))
         
         progress.empty()
         
-        if guardados > 0:
-            st.success(f"✅ {guardados} asistencias guardadas en Supabase")
+        if guardados:
+            revisar_conflictos(manager, "asistencias", guardados)
+            st.success(f"✅ {len(guardados)} asistencias guardadas en Supabase")
             st.info("💡 Sincroniza con Sheets al final del día")
             st.balloons()
-            st.rerun()
+            recargar_seccion()
         
     except Exception as e:
         st.error(f"Error: {e}")
@@ -208,6 +233,7 @@ def mostrar_estadisticas(user, manager):
     st.subheader("📈 Estadísticas")
     st.info("🚧 En desarrollo")
 
+@st.fragment
 def sincronizar_sheets(user, manager):
     """Sincronizar con Google Sheets"""
     st.subheader("🔄 Sincronización con Google Sheets")
@@ -223,9 +249,8 @@ def sincronizar_sheets(user, manager):
     - Sincroniza UNA vez al final del día
     """)
     
-    # Ver pendientes
-    df_pendientes = manager.supabase.table('asistencias').select("*").eq('sincronizado', False).execute()
-    total_pendientes = len(df_pendientes.data)
+    # Ver pendientes (solo conteo, sin descargar filas)
+    total_pendientes = manager.get_sync_status().get('asistencias') or 0
     
     st.metric("Registros sin sincronizar", total_pendientes)
     
@@ -248,6 +273,6 @@ def sincronizar_sheets(user, manager):
                     detalles=mensaje
                 )
                 st.balloons()
-                st.rerun()
+                recargar_seccion()
             else:
                 st.error(f"❌ {mensaje}")
\ No newline at end of file
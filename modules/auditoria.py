@@ -0,0 +1,105 @@
+import streamlit as st
+import pandas as pd
+from datetime import date, timedelta
+from config import get_sheets_manager
+from utils.helpers import recargar_seccion
+from utils.auditoria import (MODULOS_AUDITORIA, LONGITUD_MINIMA_BUSQUEDA, TAMAÑO_PAGINA_AUDITORIA,
+                             consultar_auditoria)
+
+def show_auditoria_module():
+    """Módulo de auditoría (solo admin)"""
+    user_data = st.session_state.get('user_data', {})
+
+    st.title("📝 Registro de Auditoría")
+    st.caption("Consulta por periodo, usuario, módulo, acción y texto de los detalles")
+
+    if user_data.get('rol') != 'admin':
+        st.error("❌ No tienes permisos para acceder a este módulo")
+        return
+
+    visor_auditoria()
+
+@st.fragment
+def visor_auditoria():
+    """Filtros y páginas del log (una consulta por página, nunca la tabla completa)"""
+    manager = get_sheets_manager()
+
+    col1, col2, col3 = st.columns(3)
+
+    with col1:
+        hoy = date.today()
+        desde = st.date_input("Desde", value=hoy - timedelta(days=7), key="auditoria_desde")
+        hasta = st.date_input("Hasta", value=hoy, key="auditoria_hasta")
+
+    with col2:
+        usuario = st.text_input("Usuario (email)", key="auditoria_usuario").strip().lower()
+        modulo = st.selectbox("Módulo", ["Todos"] + MODULOS_AUDITORIA, key="auditoria_modulo")
+
+    with col3:
+        accion = st.text_input("Acción", placeholder="ej. aprobar_permiso", key="auditoria_accion").strip()
+        texto = st.text_input("Buscar en detalles", key="auditoria_texto").strip()
+
+    if desde > hasta:
+        st.error("⚠️ La fecha inicial debe ser anterior a la final")
+        return
+
+    if texto and len(texto) < LONGITUD_MINIMA_BUSQUEDA:
+        st.warning(f"⚠️ La búsqueda necesita al menos {LONGITUD_MINIMA_BUSQUEDA} caracteres")
+        return
+
+    filtros = {
+        'desde': desde,
+        'hasta': hasta,
+        'usuario': usuario or None,
+        'modulo': None if modulo == "Todos" else modulo,
+        'accion': accion or None,
+        'texto': texto or None
+    }
+
+    # Pila de cursores: cursores[i] abre la página i; se reinicia al cambiar filtros
+    if st.session_state.get('auditoria_filtros') != filtros:
+        st.session_state['auditoria_filtros'] = filtros
+        st.session_state['auditoria_cursores'] = [None]
+
+    cursores = st.session_state['auditoria_cursores']
+
+    try:
+        filas, siguiente = consultar_auditoria(manager, cursor=cursores[-1], **filtros)
+    except Exception as e:
+        st.error(f"❌ Error al consultar auditoría: {e}")
+        return
+
+    pagina = len(cursores)
+
+    if not filas:
+        st.info("No hay registros con esos filtros")
+    else:
+        inicio = (pagina - 1) * TAMAÑO_PAGINA_AUDITORIA + 1
+        st.caption(f"Registros {inicio:,} a {inicio + len(filas) - 1:,} · página {pagina}")
+
+        df = pd.DataFrame(filas).reindex(columns=['timestamp', 'usuario', 'modulo', 'accion', 'detalles', 'ip'])
+        df['timestamp'] = df['timestamp'].astype(str).str[:19].str.replace('T', ' ')
+        st.dataframe(
+            df.rename(columns={
+                'timestamp': 'Fecha y hora',
+                'usuario': 'Usuario',
+                'modulo': 'Módulo',
+                'accion': 'Acción',
+                'detalles': 'Detalles',
+                'ip': 'IP'
+            }),
+            use_container_width=True,
+            hide_index=True
+        )
+
+    col_anterior, col_siguiente = st.columns(2)
+
+    with col_anterior:
+        if st.button("⬅️ Más recientes", disabled=pagina == 1, use_container_width=True, key="auditoria_anterior"):
+            cursores.pop()
+            recargar_seccion()
+
+    with col_siguiente:
+        if st.button("Más antiguos ➡️", disabled=siguiente is None, use_container_width=True, key="auditoria_siguiente"):
+            cursores.append(siguiente)
+            recargar_seccion()
@@ -1,8 +1,22 @@
 import streamlit as st
 import pandas as pd
-from datetime import datetime, timedelta
-from config import get_sheets_manager
+import numpy as np
 import calendar
+import hashlib
+import json
+from collections import OrderedDict
+from datetime import datetime
+from config import get_sheets_manager
+from utils.dias_habiles import dias_habiles_periodo, obtener_calendario
+from utils.motor_bonos import calcular_bonos as calcular_bonos_motor, preparar_registros_bonos
+from utils.reglas_bonos import compilar_reglas, obtener_reglas, obtener_versiones_reglas, guardar_version_reglas
+from utils.recalculo_bonos import recalcular_y_guardar
+from utils.simulador_bonos import generar_grid, simular_bonos
+from utils.helpers import recargar_seccion
+
+# Resultados de cálculo memorizados por sesión (los más recientes)
+MAX_RESULTADOS_MEMO = 12
+MAX_COMBINACIONES = 1_000_000
 
 def show_bonos_module():
     """Módulo de cálculo de bonos"""
@@ -18,7 +32,7 @@ def show_bonos_module():
         return
     
     # Tabs del módulo
-    tabs = st.tabs(["📊 Calcular Bonos", "📋 Historial", "⚙️ Configuración"])
+    tabs = st.tabs(["📊 Calcular Bonos", "📋 Historial", "⚙️ Configuración", "🧪 Simulador", "🔁 Recalcular"])
     
     with tabs[0]:
         calcular_bonos(user_data)
@@ -28,8 +42,15 @@ def show_bonos_module():
     
     with tabs[2]:
         configurar_bonos(user_data)
+    
+    with tabs[3]:
+        simular_presupuesto(user_data)
+    
+    with tabs[4]:
+        recalcular_periodos(user_data)
 
 
+@st.fragment
 def calcular_bonos(user_data):
     """Calcular bonos del mes"""
     st.subheader("Calcular Bonos Mensuales")
@@ -58,19 +79,58 @@ def calcular_bonos(user_data):
         oficinas_list = ["Todas", "Norte", "Sur", "Este", "Oeste", "Centro"] + [f"Zona {i}" for i in range(1, 11)]
         oficina_filtro = st.selectbox("Oficina", oficinas_list, key="bonos_oficina")
     
+    # Resultados memorizados por huella de entradas: persisten entre reruns
+    # (p. ej. al presionar "Guardar") y se invalidan solos si algo cambia
+    try:
+        version_reglas, reglas = obtener_reglas(manager)
+        huella = huella_bonos(manager, año, mes, oficina_filtro, version_reglas, reglas)
+    except Exception as e:
+        st.error(f"❌ Error al leer reglas o asistencias: {e}")
+        return
+    
+    memo = st.session_state.setdefault('bonos_memo', OrderedDict())
+    
     if st.button("🔍 Calcular Bonos del Periodo", type="primary", use_container_width=True):
-        with st.spinner("Calculando bonos..."):
-            calcular_bonos_periodo(manager, año, mes, oficina_filtro, user_data)
+        if huella in memo:
+            memo.move_to_end(huella)
+            st.toast("⚡ Sin cambios desde el último cálculo: resultado reutilizado")
+        else:
+            with st.spinner("Calculando bonos..."):
+                df_resultados = calcular_bonos_periodo(manager, año, mes, oficina_filtro, version_reglas, reglas)
+            if df_resultados is not None:
+                memo[huella] = df_resultados
+                while len(memo) > MAX_RESULTADOS_MEMO:
+                    memo.popitem(last=False)
+    
+    if huella in memo:
+        mostrar_bonos_periodo(manager, memo[huella], año, mes, version_reglas, user_data)
 
 
-def calcular_bonos_periodo(manager, año, mes, oficina_filtro, user_data):
-    """Calcular bonos de un periodo específico"""
+def huella_bonos(manager, año, mes, oficina_filtro, version_reglas, reglas):
+    """Huella de las entradas de un cálculo: periodo, oficina, reglas y datos
+    
+    Las marcas de agua de asistencias del mes y de empleados cambian con altas,
+    bajas y ediciones (también externas, vía actualizado_en); la versión local
+    de escrituras cubre lo que la app acaba de guardar.
+    """
+    fecha_inicio = f"{año}-{mes:02d}-01"
+    fecha_fin = f"{año}-{mes:02d}-{calendar.monthrange(año, mes)[1]}"
+    marcas = [
+        manager.marca_agua("asistencias", "fecha", fecha_inicio, fecha_fin),
+        manager.marca_agua("empleados"),
+        manager.version_datos(["asistencias", "empleados"])
+    ]
+    
+    contenido = json.dumps([año, mes, oficina_filtro, version_reglas, reglas, marcas], sort_keys=True, default=str)
+    return hashlib.sha1(contenido.encode('utf-8')).hexdigest()
+
+
+def calcular_bonos_periodo(manager, año, mes, oficina_filtro, version_reglas, reglas):
+    """Calcular bonos de un periodo específico (None si no hay nada que calcular)"""
     try:
-        # Obtener configuración de bonos
-        config = obtener_configuracion_bonos(manager)
-        
-        # Obtener empleados
-        df_empleados = manager.get_dataframe("empleados")
+        # Obtener empleados y asistencias en paralelo
+        datos = manager.get_many(["empleados", "asistencias"])
+        df_empleados = datos["empleados"]
         df_empleados = df_empleados[df_empleados['activo'].str.upper() == 'SI']
         
         if oficina_filtro != "Todas":
@@ -78,60 +138,26 @@ def calcular_bonos_periodo(manager, año, mes, oficina_filtro, user_data):
         
         if df_empleados.empty:
             st.warning("⚠️ No hay empleados activos en la oficina seleccionada")
-            return
-        
-        # Obtener asistencias del mes
-        df_asistencias = manager.get_dataframe("asistencias")
-        
-        # Filtrar asistencias del periodo
-        fecha_inicio = f"{año}-{mes:02d}-01"
-        ultimo_dia = calendar.monthrange(año, mes)[1]
-        fecha_fin = f"{año}-{mes:02d}-{ultimo_dia}"
-        
-        df_asistencias = df_asistencias[
-            (df_asistencias['fecha'] >= fecha_inicio) &
-            (df_asistencias['fecha'] <= fecha_fin)
-        ]
-        
-        # Calcular bonos por empleado
-        resultados = []
-        
-        for _, empleado in df_empleados.iterrows():
-            id_empleado = empleado['id_empleado']
-            
-            # Asistencias del empleado
-            asistencias_emp = df_asistencias[df_asistencias['id_empleado'] == id_empleado]
-            
-            # Contar por estado
-            total_dias = len(asistencias_emp)
-            presentes = len(asistencias_emp[asistencias_emp['estado'] == 'Presente'])
-            retardos = len(asistencias_emp[asistencias_emp['estado'] == 'Retardo'])
-            ausentes = len(asistencias_emp[asistencias_emp['estado'] == 'Ausente'])
-            
-            # Calcular bono
-            bono = calcular_monto_bono(
-                presentes, retardos, ausentes, config
-            )
-            
-            resultados.append({
-                'id_empleado': id_empleado,
-                'nombre_completo': empleado['nombre_completo'],
-                'oficina': empleado['oficina'],
-                'dias_trabajados': total_dias,
-                'presentes': presentes,
-                'retardos': retardos,
-                'ausentes': ausentes,
-                'monto_bono': bono,
-                'periodo': f"{año}-{mes:02d}",
-                'año': año,
-                'mes': mes
-            })
-        
-        df_resultados = pd.DataFrame(resultados)
+            return None
         
+        # Calcular bonos de todos los empleados a la vez
+        df_asistencias = datos["asistencias"]
+        return calcular_bonos_motor(df_empleados, df_asistencias, reglas, año, mes, version_reglas)
+    
+    except Exception as e:
+        st.error(f"❌ Error al calcular bonos: {e}")
+        return None
+
+
+def mostrar_bonos_periodo(manager, df_resultados, año, mes, version_reglas, user_data):
+    """Mostrar resultados de un periodo con opciones de guardar y exportar"""
+    try:
         # Mostrar resultados
         st.success(f"✅ Bonos calculados para {len(df_resultados)} empleados")
         
+        dias_esperados = dias_habiles_periodo(año, mes, obtener_calendario(manager))
+        st.caption(f"📅 Días hábiles del periodo (sin festivos): {dias_esperados} · 📐 Reglas v{version_reglas}")
+        
         # Métricas generales
         col1, col2, col3, col4 = st.columns(4)
         
@@ -190,11 +216,15 @@ def calcular_bonos_periodo(manager, año, mes, oficina_filtro, user_data):
             )
     
     except Exception as e:
-        st.error(f"❌ Error al calcular bonos: {e}")
+        st.error(f"❌ Error al mostrar bonos: {e}")
 
 
 def calcular_monto_bono(presentes, retardos, ausentes, config):
-    """Calcular monto de bono según configuración"""
+    """Calcular monto de bono según configuración (fórmula escalar de referencia)
+    
+    Se conserva como oráculo de tests/test_motor_bonos.py: el motor vectorizado
+    con reglas_desde_config debe dar el mismo monto para cada empleado.
+    """
     # Obtener valores de configuración
     bono_base = config.get('bono_base', 1000)
     penalizacion_retardo = config.get('penalizacion_retardo', 50)
@@ -215,63 +245,217 @@ def calcular_monto_bono(presentes, retardos, ausentes, config):
 
 
 def guardar_bonos_calculados(manager, df_bonos, user_data):
-    """Guardar bonos calculados en Supabase"""
+    """Guardar bonos calculados en Supabase (upsert masivo por empleado y periodo)"""
     try:
-        guardados = 0
-        
-        for _, bono in df_bonos.iterrows():
-            # Verificar si ya existe
-            año = bono['año']
-            mes = bono['mes']
-            id_empleado = bono['id_empleado']
-            
-            # Buscar si ya existe
-            df_existentes = manager.get_dataframe("bonos")
-            existe = df_existentes[
-                (df_existentes['id_empleado'] == id_empleado) &
-                (df_existentes['año'] == año) &
-                (df_existentes['mes'] == mes)
-            ]
-            
-            if not existe.empty:
-                # Actualizar
-                manager.supabase.table("bonos").update({
-                    'dias_trabajados': int(bono['dias_trabajados']),
-                    'presentes': int(bono['presentes']),
-                    'retardos': int(bono['retardos']),
-                    'ausentes': int(bono['ausentes']),
-                    'monto_bono': float(bono['monto_bono']),
-                    'calculado_por': user_data['email'],
-                    'fecha_calculo': datetime.now().isoformat()
-                }).eq('id', existe.iloc[0]['id']).execute()
-            else:
-                # Insertar nuevo
-                bono_data = {
-                    'id_empleado': id_empleado,
-                    'periodo': bono['periodo'],
-                    'año': int(año),
-                    'mes': int(mes),
-                    'dias_trabajados': int(bono['dias_trabajados']),
-                    'presentes': int(bono['presentes']),
-                    'retardos': int(bono['retardos']),
-                    'ausentes': int(bono['ausentes']),
-                    'monto_bono': float(bono['monto_bono']),
-                    'oficina': bono['oficina'],
-                    'calculado_por': user_data['email'],
-                    'fecha_calculo': datetime.now().isoformat()
-                }
-                
-                manager.supabase.table("bonos").insert(bono_data).execute()
-            
-            guardados += 1
+        registros = preparar_registros_bonos(df_bonos, user_data['email'])
+        resultado = manager.guardar_bonos_lote(registros)
         
-        st.success(f"✅ {guardados} bonos guardados correctamente")
-        st.rerun()
+        st.success(
+            f"✅ {len(registros)} bonos guardados correctamente "
+            f"({resultado['insertados']} nuevos, {resultado['actualizados']} actualizados)"
+        )
+        recargar_seccion()
         
     except Exception as e:
         st.error(f"❌ Error al guardar bonos: {e}")
 
 
+@st.fragment
+def simular_presupuesto(user_data):
+    """Simular el impacto en nómina de distintos parámetros de bono"""
+    st.subheader("Simulador de Presupuesto")
+    st.caption("Evalúa todas las combinaciones de parámetros contra la asistencia real de un mes")
+    
+    manager = get_sheets_manager()
+    
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        año = st.selectbox(
+            "Año",
+            range(datetime.now().year, datetime.now().year - 3, -1),
+            key="sim_año"
+        )
+    
+    with col2:
+        meses = [
+            "Enero", "Febrero", "Marzo", "Abril", "Mayo", "Junio",
+            "Julio", "Agosto", "Septiembre", "Octubre", "Noviembre", "Diciembre"
+        ]
+        mes = meses.index(st.selectbox("Mes de referencia", meses, key="sim_mes")) + 1
+    
+    version_reglas, reglas = obtener_reglas(manager)
+    
+    # Rango (mínimo, máximo, paso) por parámetro, centrado en las reglas vigentes
+    parametros = {
+        'bono_base': ("Bono Base ($)", reglas['bono_base'], 100),
+        'penalizacion_retardo': ("Penalización por Retardo ($)", reglas['penalizaciones'].get('retardos', 0), 10),
+        'penalizacion_ausencia': ("Penalización por Ausencia ($)", reglas['penalizaciones'].get('ausentes', 0), 25),
+        'asistencias_minimas': ("Asistencias Mínimas", reglas['asistencias_minimas'], 1)
+    }
+    
+    rangos = {}
+    for nombre, (etiqueta, actual, paso) in parametros.items():
+        col_min, col_max, col_paso = st.columns(3)
+        with col_min:
+            minimo = st.number_input(f"{etiqueta} mín.", min_value=0, value=int(max(0, actual - 5 * paso)), key=f"sim_{nombre}_min")
+        with col_max:
+            maximo = st.number_input(f"{etiqueta} máx.", min_value=0, value=int(actual + 5 * paso), key=f"sim_{nombre}_max")
+        with col_paso:
+            paso_sel = st.number_input(f"{etiqueta} paso", min_value=1, value=int(paso), key=f"sim_{nombre}_paso")
+        rangos[nombre] = (minimo, maximo, paso_sel)
+    
+    # Contar antes de armar la malla: sin tope, unos rangos amplios agotan la memoria
+    n_combinaciones = 1
+    for minimo, maximo, paso_sel in rangos.values():
+        n_combinaciones *= max(0, (maximo - minimo) // paso_sel + 1)
+    st.caption(f"🔢 {n_combinaciones:,} combinaciones · 📐 Resto de reglas de la versión v{version_reglas}")
+    
+    if n_combinaciones == 0:
+        st.warning("⚠️ Revisa los rangos: algún mínimo es mayor que su máximo")
+        return
+    
+    if n_combinaciones > MAX_COMBINACIONES:
+        st.error(f"❌ Demasiadas combinaciones (máximo {MAX_COMBINACIONES:,}): reduce los rangos o aumenta los pasos")
+        return
+    
+    rangos = {nombre: np.arange(minimo, maximo + 1, paso_sel) for nombre, (minimo, maximo, paso_sel) in rangos.items()}
+    
+    try:
+        datos = manager.get_many(["empleados", "asistencias"])
+        df_empleados = datos["empleados"]
+        df_empleados = df_empleados[df_empleados['activo'].str.upper() == 'SI']
+        df_conteos = calcular_bonos_motor(df_empleados, datos["asistencias"], reglas, año, mes, version_reglas)
+        
+        if df_conteos.empty:
+            st.info("🔭 No hay empleados activos para simular")
+            return
+        
+        df_sim = simular_cacheado(df_conteos, reglas, rangos)
+        
+        col_m1, col_m2, col_m3 = st.columns(3)
+        with col_m1:
+            st.metric("Nómina Actual", f"${df_conteos['monto_bono'].sum():,.2f}")
+        with col_m2:
+            st.metric("Mínimo Simulado", f"${df_sim['total_bonos'].min():,.2f}")
+        with col_m3:
+            st.metric("Máximo Simulado", f"${df_sim['total_bonos'].max():,.2f}")
+        
+        presupuesto = st.number_input(
+            "Presupuesto máximo ($)",
+            min_value=0.0,
+            value=float(df_conteos['monto_bono'].sum()),
+            step=1000.0,
+            key="sim_presupuesto"
+        )
+        
+        df_dentro = df_sim[df_sim['total_bonos'] <= presupuesto].sort_values(
+            ['empleados_con_bono', 'total_bonos'], ascending=[False, False]
+        )
+        st.write(f"**{len(df_dentro):,}** combinaciones dentro del presupuesto (mostrando las 500 que más empleados premian)")
+        st.dataframe(df_dentro.head(500), use_container_width=True, height=400, hide_index=True)
+        
+        csv = df_sim.to_csv(index=False).encode('utf-8')
+        st.download_button(
+            "📥 Exportar Simulación a CSV",
+            csv,
+            f"simulacion_bonos_{año}_{mes:02d}.csv",
+            "text/csv",
+            use_container_width=True
+        )
+    
+    except Exception as e:
+        st.error(f"❌ Error en la simulación: {e}")
+
+
+@st.cache_data(ttl=300, show_spinner="Simulando combinaciones...")
+def simular_cacheado(df_conteos, reglas, rangos):
+    """Simulación cacheada para que cambiar el presupuesto no recalcule el grid"""
+    return simular_bonos(df_conteos, reglas, generar_grid(**rangos))
+
+
+@st.fragment
+def recalcular_periodos(user_data):
+    """Recalcular y guardar bonos de varios meses/oficinas"""
+    st.subheader("Recalcular Varios Periodos")
+    
+    if user_data['rol'] != 'admin':
+        st.warning("⚠️ Solo el administrador puede recalcular periodos")
+        return
+    
+    manager = get_sheets_manager()
+    
+    st.info("💡 Útil tras cambiar la configuración o corregir asistencias. "
+            "Cada (año, mes, oficina) se calcula por separado y todo se guarda en un solo upsert.")
+    
+    meses = [
+        "Enero", "Febrero", "Marzo", "Abril", "Mayo", "Junio",
+        "Julio", "Agosto", "Septiembre", "Octubre", "Noviembre", "Diciembre"
+    ]
+    oficinas_list = ["Norte", "Sur", "Este", "Oeste", "Centro"] + [f"Zona {i}" for i in range(1, 11)]
+    
+    col1, col2, col3 = st.columns(3)
+    
+    with col1:
+        años = st.multiselect(
+            "Años",
+            list(range(datetime.now().year, datetime.now().year - 3, -1)),
+            default=[datetime.now().year],
+            key="recalc_años"
+        )
+    
+    with col2:
+        meses_sel = st.multiselect("Meses", meses, default=meses[:datetime.now().month], key="recalc_meses")
+    
+    with col3:
+        oficinas = st.multiselect("Oficinas (vacío = todas)", oficinas_list, key="recalc_oficinas")
+    
+    df_versiones = obtener_versiones_reglas(manager)
+    versiones = ["Vigente"] + (df_versiones['version'].astype(int).tolist() if not df_versiones.empty else [])
+    if 0 not in versiones:
+        versiones.append(0)
+    version_sel = st.selectbox(
+        "Versión de reglas",
+        versiones,
+        format_func=lambda v: v if v == "Vigente" else f"v{v}" + (" (config_bonos)" if v == 0 else ""),
+        help="Una versión anterior reproduce exactamente los bonos calculados con ella",
+        key="recalc_version"
+    )
+    
+    if not años or not meses_sel:
+        st.warning("⚠️ Selecciona al menos un año y un mes")
+        return
+    
+    if st.button("🔁 Recalcular y Guardar", type="primary", use_container_width=True):
+        barra = st.progress(0.0, text="Preparando...")
+        
+        def al_avanzar(completadas, total):
+            barra.progress(completadas / total, text=f"{completadas}/{total} periodos calculados")
+        
+        try:
+            resumen = recalcular_y_guardar(
+                manager,
+                años,
+                [meses.index(m) + 1 for m in meses_sel],
+                oficinas=oficinas or None,
+                version_reglas=None if version_sel == "Vigente" else version_sel,
+                calculado_por=user_data['email'],
+                al_avanzar=al_avanzar
+            )
+            
+            st.success(
+                f"✅ {resumen['registros']} bonos recalculados en {resumen['tareas']} periodos con reglas v{resumen['version_reglas']} "
+                f"({resumen['guardado']['insertados']} nuevos, {resumen['guardado']['actualizados']} actualizados)"
+            )
+            st.caption(
+                f"⏱️ Carga {resumen['segundos_carga']:.1f}s · Cálculo {resumen['segundos_calculo']:.1f}s · "
+                f"Guardado {resumen['segundos_guardado']:.1f}s"
+            )
+            
+        except Exception as e:
+            st.error(f"❌ Error al recalcular: {e}")
+
+
 def ver_historial_bonos(user_data):
     """Ver historial de bonos calculados"""
     st.subheader("Historial de Bonos")
@@ -279,14 +463,15 @@ def ver_historial_bonos(user_data):
     manager = get_sheets_manager()
     
     try:
-        df_bonos = manager.get_dataframe("bonos")
+        datos = manager.get_many(["bonos", "empleados"])
+        df_bonos = datos["bonos"]
         
         if df_bonos.empty:
             st.info("🔭 No hay bonos registrados")
             return
         
         # Obtener nombres de empleados
-        df_empleados = manager.get_dataframe("empleados")
+        df_empleados = datos["empleados"]
         df_bonos = df_bonos.merge(
             df_empleados[['id_empleado', 'nombre_completo']],
             on='id_empleado',
@@ -364,6 +549,8 @@ def ver_historial_bonos(user_data):
                 'ausentes': 'Ausentes',
                 'monto_bono': 'Bono'
             }
+            if 'version_reglas' in df_mostrar.columns:
+                columnas_mostrar['version_reglas'] = 'Reglas'
             
             df_tabla = df_mostrar[list(columnas_mostrar.keys())].rename(columns=columnas_mostrar)
             
@@ -384,8 +571,9 @@ def ver_historial_bonos(user_data):
         st.error(f"❌ Error: {e}")
 
 
+@st.fragment
 def configurar_bonos(user_data):
-    """Configurar parámetros de bonos"""
+    """Configurar reglas de bonos (cada cambio crea una versión nueva)"""
     st.subheader("Configuración de Bonos")
     
     if user_data['rol'] != 'admin':
@@ -394,10 +582,11 @@ def configurar_bonos(user_data):
     
     manager = get_sheets_manager()
     
-    # Obtener configuración actual
-    config = obtener_configuracion_bonos(manager)
+    # Obtener reglas vigentes
+    version_actual, reglas = obtener_reglas(manager)
     
-    st.info("💡 Define los parámetros para el cálculo de bonos mensuales")
+    st.info(f"💡 Reglas vigentes: v{version_actual}. Al guardar se crea una versión nueva; "
+            "los bonos ya calculados conservan la versión con la que se generaron.")
     
     with st.form("config_bonos"):
         col1, col2 = st.columns(2)
@@ -406,24 +595,38 @@ def configurar_bonos(user_data):
             bono_base = st.number_input(
                 "Bono Base ($)",
                 min_value=0,
-                value=int(config.get('bono_base', 1000)),
+                value=int(reglas['bono_base']),
                 step=100,
                 help="Monto base del bono mensual"
             )
             
             asistencias_minimas = st.number_input(
                 "Asistencias Mínimas",
-                min_value=1,
-                value=int(config.get('asistencias_minimas', 20)),
+                min_value=0,
+                value=int(reglas['asistencias_minimas']),
                 step=1,
                 help="Días mínimos de asistencia para obtener bono"
             )
+            
+            bono_sabado = st.number_input(
+                "Bono por Sábado Trabajado ($)",
+                min_value=0,
+                value=int(reglas['bono_sabado']),
+                step=10,
+                help="Extra por cada sábado con asistencia o retardo"
+            )
+            
+            incapacidad_cuenta = st.checkbox(
+                "Los días de incapacidad cuentan como asistencia",
+                value=reglas['incapacidad_cuenta_asistencia'],
+                help="Exenta a las incapacidades del mínimo de asistencias y de los niveles"
+            )
         
         with col2:
             penalizacion_retardo = st.number_input(
                 "Penalización por Retardo ($)",
                 min_value=0,
-                value=int(config.get('penalizacion_retardo', 50)),
+                value=int(reglas['penalizaciones'].get('retardos', 0)),
                 step=10,
                 help="Descuento por cada retardo"
             )
@@ -431,85 +634,77 @@ def configurar_bonos(user_data):
             penalizacion_ausencia = st.number_input(
                 "Penalización por Ausencia ($)",
                 min_value=0,
-                value=int(config.get('penalizacion_ausencia', 200)),
+                value=int(reglas['penalizaciones'].get('ausentes', 0)),
                 step=50,
                 help="Descuento por cada ausencia"
             )
+            
+            tope = st.number_input(
+                "Tope del Bono ($)",
+                min_value=0,
+                value=int(reglas['tope'] or 0),
+                step=100,
+                help="Monto máximo por empleado (0 = sin tope)"
+            )
         
-        st.markdown("---")
-        st.markdown("### 📋 Ejemplo de Cálculo")
-        
-        col_ej1, col_ej2 = st.columns(2)
-        
-        with col_ej1:
-            st.write("**Escenario 1: Asistencia perfecta**")
-            st.write(f"- 22 días presentes")
-            st.write(f"- 0 retardos")
-            st.write(f"- 0 ausencias")
-            ejemplo_1 = bono_base
-            st.success(f"**Bono: ${ejemplo_1:,.2f}**")
-        
-        with col_ej2:
-            st.write("**Escenario 2: Con penalizaciones**")
-            st.write(f"- 20 días presentes")
-            st.write(f"- 2 retardos")
-            st.write(f"- 1 ausencia")
-            ejemplo_2 = bono_base - (2 * penalizacion_retardo) - (1 * penalizacion_ausencia)
-            if ejemplo_2 < 0:
-                ejemplo_2 = 0
-            st.warning(f"**Bono: ${ejemplo_2:,.2f}**")
-        
-        submit = st.form_submit_button("💾 Guardar Configuración", type="primary", use_container_width=True)
+        st.markdown("**Niveles por asistencia** (se aplica el mayor alcanzado)")
+        df_niveles = st.data_editor(
+            pd.DataFrame(reglas['niveles'], columns=['desde', 'extra']),
+            num_rows="dynamic",
+            column_config={
+                'desde': st.column_config.NumberColumn("Desde (días)", min_value=0, step=1),
+                'extra': st.column_config.NumberColumn("Extra ($)", min_value=0, step=50)
+            },
+            use_container_width=True,
+            key="config_bonos_niveles"
+        )
+        
+        descripcion = st.text_input("Descripción del cambio", placeholder="Ej: Nivel extra a partir de 22 días")
+        
+        submit = st.form_submit_button("💾 Guardar Nueva Versión", type="primary", use_container_width=True)
         
         if submit:
             try:
-                config_data = {
+                nuevas_reglas = {
                     'bono_base': bono_base,
-                    'penalizacion_retardo': penalizacion_retardo,
-                    'penalizacion_ausencia': penalizacion_ausencia,
                     'asistencias_minimas': asistencias_minimas,
-                    'modificado_por': user_data['email'],
-                    'fecha_modificacion': datetime.now().isoformat()
+                    'penalizaciones': {'retardos': penalizacion_retardo, 'ausentes': penalizacion_ausencia},
+                    'niveles': df_niveles.dropna().to_dict('records'),
+                    'bono_sabado': bono_sabado,
+                    'incapacidad_cuenta_asistencia': incapacidad_cuenta,
+                    'tope': tope or None
                 }
                 
-                # Verificar si existe configuración
-                df_config = manager.get_dataframe("config_bonos")
+                version = guardar_version_reglas(manager, nuevas_reglas, user_data['email'], descripcion)
                 
-                if df_config.empty:
-                    # Crear nueva
-                    manager.supabase.table("config_bonos").insert(config_data).execute()
-                else:
-                    # Actualizar existente
-                    manager.supabase.table("config_bonos").update(config_data).eq('id', df_config.iloc[0]['id']).execute()
-                
-                st.success("✅ Configuración guardada correctamente")
+                st.success(f"✅ Reglas guardadas como versión {version}")
+                # Las demás pestañas listan las versiones: recargar todo el módulo
                 st.rerun()
                 
+            except ValueError as e:
+                st.error(f"❌ Reglas inválidas: {e}")
             except Exception as e:
                 st.error(f"❌ Error al guardar: {e}")
-
-
-def obtener_configuracion_bonos(manager):
-    """Obtener configuración de bonos desde Supabase"""
-    try:
-        df_config = manager.get_dataframe("config_bonos")
-        
-        if df_config.empty:
-            # Valores por defecto
-            return {
-                'bono_base': 1000,
-                'penalizacion_retardo': 50,
-                'penalizacion_ausencia': 200,
-                'asistencias_minimas': 20
-            }
-        
-        return df_config.iloc[0].to_dict()
-        
-    except:
-        # Si hay error, retornar valores por defecto
-        return {
-            'bono_base': 1000,
-            'penalizacion_retardo': 50,
-            'penalizacion_ausencia': 200,
-            'asistencias_minimas': 20
-        }
\ No newline at end of file
+    
+    st.markdown("---")
+    st.markdown("### 📋 Ejemplo de Cálculo (reglas vigentes)")
+    
+    escenarios = pd.DataFrame({
+        'Escenario': ["Asistencia perfecta", "Con penalizaciones", "Con incapacidad"],
+        'presentes': [22, 20, 16],
+        'retardos': [0, 2, 0],
+        'ausentes': [0, 1, 0],
+        'permisos': [0, 0, 0],
+        'incapacidades': [0, 0, 5],
+        'sabados': [2, 0, 0]
+    })
+    escenarios['Bono'] = compilar_reglas(reglas)(escenarios)
+    escenarios['Bono'] = escenarios['Bono'].apply(lambda x: f"${x:,.2f}")
+    st.dataframe(escenarios.set_index('Escenario'), use_container_width=True)
+    
+    # Historial de versiones
+    df_versiones = obtener_versiones_reglas(manager)
+    if not df_versiones.empty:
+        with st.expander(f"🗂️ Versiones de reglas ({len(df_versiones)})"):
+            columnas = [c for c in ['version', 'descripcion', 'creado_por', 'fecha_creacion'] if c in df_versiones.columns]
+            st.dataframe(df_versiones[columnas], use_container_width=True, hide_index=True)
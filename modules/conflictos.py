@@ -0,0 +1,85 @@
+import streamlit as st
+import pandas as pd
+from utils.conflictos import (COLUMNAS_VENTANA, cargar_ventana, conflictos_nuevos, obtener_conflictos,
+                              resumen_por_oficina)
+
+def mostrar_conflictos(user, manager):
+    """Listado de conflictos de ausencias por oficina (bajo demanda)"""
+    st.subheader("⚠️ Conflictos de Ausencias")
+    st.caption("Permisos que se cruzan con incapacidades y asistencias registradas en días de permiso o incapacidad")
+
+    # Las pestañas se dibujan en cada render: la detección sobre todo el historial solo corre si se pide
+    if not st.toggle("Revisar conflictos de todo el historial", key="conflictos_revisar"):
+        return
+
+    try:
+        df_conflictos = obtener_conflictos(manager)
+
+        if user['rol'] == 'registrador':
+            df_conflictos = df_conflictos[df_conflictos['oficina'] == user['oficina']]
+        elif not df_conflictos.empty:
+            oficinas = ["Todas"] + sorted(df_conflictos['oficina'].dropna().unique().tolist())
+            oficina_filtro = st.selectbox("Oficina", oficinas, key="conflictos_filtro_oficina")
+            if oficina_filtro != "Todas":
+                df_conflictos = df_conflictos[df_conflictos['oficina'] == oficina_filtro]
+
+        if df_conflictos.empty:
+            st.success("✅ No hay conflictos")
+            return
+
+        st.metric("Conflictos", len(df_conflictos))
+        st.dataframe(resumen_por_oficina(df_conflictos), use_container_width=True)
+
+        columnas_mostrar = {
+            'oficina': 'Oficina',
+            'tipo_conflicto': 'Tipo',
+            'id_empleado': 'ID',
+            'fecha_inicio': 'Desde',
+            'fecha_fin': 'Hasta',
+            'dias': 'Días',
+            'detalle': 'Detalle'
+        }
+        st.dataframe(
+            df_conflictos[list(columnas_mostrar.keys())].rename(columns=columnas_mostrar),
+            use_container_width=True,
+            hide_index=True,
+            height=400
+        )
+
+    except Exception as e:
+        st.error(f"❌ Error al detectar conflictos: {e}")
+
+def revisar_conflictos(manager, tabla, registros, anteriores=None):
+    """Revisar los conflictos que introducen registros recién escritos (se avisa tras el rerun)
+
+    Solo se leen los registros de esos empleados dentro del rango de fechas
+    escrito (ver utils.conflictos.conflictos_nuevos). registros: filas
+    insertadas o actualizadas de tabla, con id (asistencias: id_empleado y
+    fecha) y sus fechas; anteriores: esas filas antes de una actualización.
+    """
+    try:
+        df_escritos = pd.DataFrame(registros)
+        _, col_inicio, col_fin = COLUMNAS_VENTANA[tabla]
+        datos = cargar_ventana(
+            manager,
+            df_escritos['id_empleado'].astype(str).unique().tolist(),
+            df_escritos[col_inicio].astype(str).min(),
+            df_escritos[col_fin].astype(str).max()
+        )
+        df_conflictos = conflictos_nuevos(
+            datos, tabla, df_escritos,
+            pd.DataFrame(anteriores) if anteriores is not None else None
+        )
+    except Exception:
+        return  # La revisión no debe bloquear el guardado
+
+    if not df_conflictos.empty:
+        st.session_state['aviso_conflictos'] = df_conflictos['detalle'].head(5).tolist() + (
+            [f"... y {len(df_conflictos) - 5} más"] if len(df_conflictos) > 5 else []
+        )
+
+def mostrar_aviso_conflictos():
+    """Mostrar (una vez) el aviso de conflictos generado por la última escritura"""
+    aviso = st.session_state.pop('aviso_conflictos', None)
+    if aviso:
+        st.warning("⚠️ El último registro generó conflictos:\n\n- " + "\n- ".join(aviso))
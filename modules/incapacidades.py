@@ -2,6 +2,9 @@ import streamlit as st
 import pandas as pd
 from datetime import datetime, timedelta
 from config import get_sheets_manager
+from modules.conflictos import mostrar_aviso_conflictos, revisar_conflictos
+from utils.rollups_incapacidades import obtener_rollup_incapacidades
+from utils.helpers import recargar_seccion
 
 def show_incapacidades_module():
     """Módulo de gestión de incapacidades"""
@@ -37,10 +40,13 @@ def show_incapacidades_module():
             ver_historial_incapacidades(user_data, todos=False)
 
 
+@st.fragment
 def registrar_incapacidad(user_data):
     """Registrar incapacidad para empleado"""
     st.subheader("Registrar Incapacidad")
     
+    mostrar_aviso_conflictos()
+    
     manager = get_sheets_manager()
     
     try:
@@ -155,7 +161,10 @@ def registrar_incapacidad(user_data):
                         'sincronizado': False
                     }
                     
-                    manager.supabase.table("incapacidades").insert(incapacidad_data).execute()
+                    response = manager.supabase.table("incapacidades").insert(incapacidad_data).execute()
+                    registro = response.data[0] if response.data else incapacidad_data
+                    manager.registrar_insercion("incapacidades", registro)
+                    revisar_conflictos(manager, "incapacidades", [registro])
                     
                     # Log auditoría
                     manager.log_action(
@@ -167,7 +176,7 @@ def registrar_incapacidad(user_data):
                     
                     st.success(f"✅ Incapacidad registrada correctamente: {dias_totales} días")
                     st.balloons()
-                    st.rerun()
+                    recargar_seccion()
                     
                 except Exception as e:
                     st.error(f"❌ Error al registrar incapacidad: {e}")
@@ -183,7 +192,8 @@ def ver_historial_incapacidades(user_data, todos=True):
     manager = get_sheets_manager()
     
     try:
-        df_incapacidades = manager.get_dataframe("incapacidades")
+        datos = manager.get_many(["incapacidades", "empleados"])
+        df_incapacidades = datos["incapacidades"]
         
         if df_incapacidades.empty:
             st.info("🔭 No hay incapacidades registradas")
@@ -193,31 +203,26 @@ def ver_historial_incapacidades(user_data, todos=True):
         if not todos and user_data['rol'] == 'registrador':
             df_incapacidades = df_incapacidades[df_incapacidades['oficina'] == user_data['oficina']]
         
-        # Obtener nombres de empleados
-        df_empleados = manager.get_dataframe("empleados")
-        df_incapacidades = df_incapacidades.merge(
-            df_empleados[['id_empleado', 'nombre_completo']],
-            on='id_empleado',
-            how='left'
-        )
+        # Acumulados precalculados (opciones de filtros y métricas)
+        rollup = obtener_rollup_incapacidades(manager)
         
         # Filtros
         col1, col2, col3 = st.columns(3)
         
         with col1:
-            tipos = ["Todos"] + sorted(df_incapacidades['tipo'].unique().tolist())
+            tipos = ["Todos"] + rollup.valores('tipo')
             tipo_filtro = st.selectbox("Tipo", tipos, key="incapacidades_filtro_tipo")
         
         with col2:
             if todos:
-                oficinas = ["Todas"] + sorted(df_incapacidades['oficina'].unique().tolist())
+                oficinas = ["Todas"] + rollup.valores('oficina')
                 oficina_filtro = st.selectbox("Oficina", oficinas, key="incapacidades_filtro_oficina")
             else:
                 oficina_filtro = user_data['oficina']
                 st.text_input("Oficina", value=oficina_filtro, disabled=True, key="incapacidades_oficina_display")
         
         with col3:
-            años = ["Todos"] + sorted(df_incapacidades['fecha_inicio'].str[:4].unique().tolist(), reverse=True)
+            años = ["Todos"] + sorted(rollup.valores('año'), reverse=True)
             año_filtro = st.selectbox("Año", años, key="incapacidades_filtro_año")
         
         # Aplicar filtros
@@ -234,31 +239,39 @@ def ver_historial_incapacidades(user_data, todos=True):
         if año_filtro != "Todos":
             df_filtrado = df_filtrado[df_filtrado['fecha_inicio'].str.startswith(año_filtro)]
         
-        # Estadísticas
+        # Estadísticas (desde los acumulados)
+        resumen = rollup.resumen(
+            tipo=None if tipo_filtro == "Todos" else tipo_filtro,
+            oficina=None if oficina_filtro == "Todas" else oficina_filtro,
+            año=None if año_filtro == "Todos" else año_filtro
+        )
+        
         col_stats1, col_stats2, col_stats3, col_stats4 = st.columns(4)
         
         with col_stats1:
-            st.metric("Total Registros", len(df_filtrado))
+            st.metric("Total Registros", resumen['casos'])
         
         with col_stats2:
-            total_dias = df_filtrado['dias_totales'].sum()
-            st.metric("Total Días", int(total_dias))
+            st.metric("Total Días", resumen['dias'])
         
         with col_stats3:
-            if not df_filtrado.empty:
-                promedio_dias = df_filtrado['dias_totales'].mean()
-                st.metric("Promedio Días", f"{promedio_dias:.1f}")
-            else:
-                st.metric("Promedio Días", 0)
+            st.metric("Promedio Días", f"{resumen['promedio']:.1f}")
         
         with col_stats4:
-            empleados_unicos = df_filtrado['id_empleado'].nunique()
-            st.metric("Empleados", empleados_unicos)
+            st.metric("Empleados", resumen['empleados'])
         
         # Mostrar tabla
         if df_filtrado.empty:
             st.info("🔭 No hay incapacidades con los filtros seleccionados")
         else:
+            # Nombres solo para las filas filtradas
+            df_empleados = datos["empleados"]
+            df_filtrado = df_filtrado.merge(
+                df_empleados[['id_empleado', 'nombre_completo']],
+                on='id_empleado',
+                how='left'
+            )
+            
             # Ordenar por fecha de creación descendente
             df_mostrar = df_filtrado.sort_values('timestamp_creacion', ascending=False)
             
@@ -327,51 +340,35 @@ def ver_estadisticas_incapacidades():
     manager = get_sheets_manager()
     
     try:
-        df_incapacidades = manager.get_dataframe("incapacidades")
+        # Acumulados mantenidos en memoria (sin merge ni groupby por interacción)
+        rollup = obtener_rollup_incapacidades(manager)
         
-        if df_incapacidades.empty:
+        if rollup.resumen()['casos'] == 0:
             st.info("🔭 No hay datos para mostrar estadísticas")
             return
         
-        # Obtener nombres
-        df_empleados = manager.get_dataframe("empleados")
-        df_incapacidades = df_incapacidades.merge(
-            df_empleados[['id_empleado', 'nombre_completo', 'oficina']],
-            on='id_empleado',
-            how='left',
-            suffixes=('', '_emp')
-        )
-        
-        col1, col2 = st.columns(2)
+        col1, col2, col3 = st.columns(3)
         
         with col1:
             st.subheader("📊 Por Tipo")
-            tipo_stats = df_incapacidades.groupby('tipo').agg({
-                'id': 'count',
-                'dias_totales': 'sum'
-            }).rename(columns={'id': 'Casos', 'dias_totales': 'Días Totales'})
-            st.dataframe(tipo_stats, use_container_width=True)
+            st.dataframe(rollup.por_dimension('tipo'), use_container_width=True)
         
         with col2:
             st.subheader("🏢 Por Oficina")
-            oficina_col = 'oficina' if 'oficina' in df_incapacidades.columns else 'oficina_emp'
-            oficina_stats = df_incapacidades.groupby(oficina_col).agg({
-                'id': 'count',
-                'dias_totales': 'sum'
-            }).rename(columns={'id': 'Casos', 'dias_totales': 'Días Totales'})
-            st.dataframe(oficina_stats, use_container_width=True)
+            st.dataframe(rollup.por_dimension('oficina'), use_container_width=True)
+        
+        with col3:
+            st.subheader("📅 Por Año")
+            st.dataframe(rollup.por_dimension('año'), use_container_width=True)
         
         st.subheader("👥 Top 10 Empleados con más Incapacidades")
-        empleado_stats = df_incapacidades.groupby(['id_empleado', 'nombre_completo']).agg({
-            'id': 'count',
-            'dias_totales': 'sum'
-        }).rename(columns={'id': 'Casos', 'dias_totales': 'Días Totales'}).sort_values('Casos', ascending=False).head(10)
-        st.dataframe(empleado_stats, use_container_width=True)
+        st.dataframe(rollup.top_empleados(), use_container_width=True)
         
     except Exception as e:
         st.error(f"❌ Error: {e}")
 
 
+@st.fragment
 def sincronizar_incapacidades():
     """Sincronizar incapacidades a Google Sheets"""
     st.subheader("Sincronizar Incapacidades a Google Sheets")
@@ -379,8 +376,8 @@ def sincronizar_incapacidades():
     manager = get_sheets_manager()
     
     try:
-        df_incapacidades = manager.get_dataframe("incapacidades")
-        pendientes = len(df_incapacidades[df_incapacidades['sincronizado'] == False])
+        # Contar pendientes de sincronizar (solo conteo, sin descargar filas)
+        pendientes = manager.get_sync_status().get('incapacidades') or 0
         
         st.info(f"📊 Incapacidades pendientes de sincronizar: **{pendientes}**")
         
@@ -394,7 +391,7 @@ def sincronizar_incapacidades():
                     result = manager.sync_to_sheets(tabla="incapacidades")
                     
                     st.success(f"✅ Sincronización completada: {result['sincronizados']} incapacidades")
-                    st.rerun()
+                    recargar_seccion()
                     
                 except Exception as e:
                     st.error(f"❌ Error en sincronización: {e}")
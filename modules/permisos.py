@@ -1,7 +1,11 @@
 import streamlit as st
 import pandas as pd
-from datetime import datetime, timedelta
+from datetime import datetime
 from config import get_sheets_manager
+from utils.dias_habiles import contar_dias_habiles, obtener_calendario, festivos_del_año
+from utils.intervalos import obtener_indice_ausencias
+from utils.helpers import calcular_ledger_permisos, reconciliar_saldos_permisos, recargar_seccion
+from modules.conflictos import mostrar_aviso_conflictos, revisar_conflictos
 
 def show_permisos_module():
     """Módulo de gestión de permisos (9 días/año)"""
@@ -26,6 +30,13 @@ def show_permisos_module():
         
         with tabs[3]:
             sincronizar_permisos()
+        
+        if rol == 'admin':
+            with st.expander("🧮 Saldos de permisos"):
+                conciliar_saldos(user_data)
+            
+            with st.expander("🗓️ Días festivos"):
+                gestionar_dias_festivos(user_data)
     
     else:  # registrador
         tabs = st.tabs(["📝 Solicitar", "📊 Mi Historial"])
@@ -37,10 +48,13 @@ def show_permisos_module():
             ver_historial_permisos(user_data, todos=False)
 
 
+@st.fragment
 def solicitar_permiso(user_data):
     """Solicitar permiso para empleado"""
     st.subheader("Solicitar Permiso")
     
+    mostrar_aviso_conflictos()
+    
     manager = get_sheets_manager()
     
     try:
@@ -57,6 +71,8 @@ def solicitar_permiso(user_data):
             st.warning("⚠️ No hay empleados disponibles")
             return
         
+        calendario = obtener_calendario(manager)
+        
         with st.form("form_permiso_solicitud", clear_on_submit=True):
             col1, col2 = st.columns(2)
             
@@ -97,8 +113,8 @@ def solicitar_permiso(user_data):
                 )
             
             with col5:
-                # Calcular días hábiles (lunes a viernes)
-                dias_solicitados = calcular_dias_habiles(fecha_inicio, fecha_fin)
+                # Calcular días hábiles (lunes a viernes sin festivos)
+                dias_solicitados = calcular_dias_habiles(fecha_inicio, fecha_fin, calendario)
                 st.metric("Días hábiles", dias_solicitados)
             
             submit = st.form_submit_button("✅ Solicitar Permiso", type="primary", use_container_width=True)
@@ -121,9 +137,10 @@ def solicitar_permiso(user_data):
                     st.error(f"❌ Días insuficientes. Disponibles: {dias_disponibles}, Solicitados: {dias_solicitados}")
                     st.stop()
                 
-                # Verificar solapamiento de permisos
-                if verificar_solapamiento(manager, id_empleado, fecha_inicio, fecha_fin):
-                    st.error("❌ Ya existe un permiso para este empleado en ese período")
+                # Verificar solapamiento con permisos e incapacidades
+                conflicto = verificar_solapamiento(manager, id_empleado, fecha_inicio, fecha_fin)
+                if conflicto:
+                    st.error(f"❌ El empleado ya tiene una ausencia en ese período: {conflicto}")
                     st.stop()
                 
                 # Guardar permiso
@@ -141,7 +158,10 @@ def solicitar_permiso(user_data):
                         'sincronizado': False
                     }
                     
-                    manager.supabase.table("permisos").insert(permiso_data).execute()
+                    response = manager.supabase.table("permisos").insert(permiso_data).execute()
+                    registro = response.data[0] if response.data else permiso_data
+                    manager.registrar_insercion("permisos", registro)
+                    revisar_conflictos(manager, "permisos", [registro])
                     
                     # Log auditoría
                     manager.log_action(
@@ -153,7 +173,7 @@ def solicitar_permiso(user_data):
                     
                     st.success(f"✅ Permiso solicitado correctamente: {dias_solicitados} días")
                     st.balloons()
-                    st.rerun()
+                    recargar_seccion()
                     
                 except Exception as e:
                     st.error(f"❌ Error al solicitar permiso: {e}")
@@ -162,129 +182,152 @@ def solicitar_permiso(user_data):
         st.error(f"❌ Error: {e}")
 
 
+@st.fragment
 def aprobar_rechazar_permisos(user_data):
-    """Aprobar o rechazar permisos pendientes"""
+    """Cola de aprobación de permisos pendientes (paginada, selección múltiple)"""
     st.subheader("Aprobar Permisos")
-    
+    mostrar_aviso_conflictos()
+
     manager = get_sheets_manager()
-    
+
     try:
-        # Obtener permisos pendientes
-        df_permisos = manager.get_dataframe("permisos")
-        df_permisos_pendientes = df_permisos[df_permisos['estado'] == 'Pendiente'].copy()
-        
-        if df_permisos_pendientes.empty:
+        # Obtener permisos pendientes (y empleados en paralelo)
+        datos = manager.get_many(["permisos", "empleados"])
+        df_permisos = datos["permisos"]
+        df_pendientes = df_permisos[df_permisos['estado'] == 'Pendiente'] if not df_permisos.empty else df_permisos
+
+        if df_pendientes.empty:
             st.info("✅ No hay permisos pendientes de aprobación")
             return
-        
-        # Obtener info de empleados
-        df_empleados = manager.get_dataframe("empleados")
-        
-        # Merge para mostrar nombres
-        df_permisos_pendientes = df_permisos_pendientes.merge(
-            df_empleados[['id_empleado', 'nombre_completo', 'oficina']],
+
+        # Un solo merge con nombre y saldo de cada empleado
+        df_empleados = datos["empleados"]
+        df_cola = df_pendientes.merge(
+            df_empleados[['id_empleado', 'nombre_completo', 'dias_permiso_disponibles']],
             on='id_empleado',
-            how='left',
-            suffixes=('', '_emp')
+            how='left'
+        ).sort_values('timestamp_creacion')
+        df_cola['suficiente'] = df_cola['dias_solicitados'] <= df_cola['dias_permiso_disponibles'].fillna(0)
+
+        col1, col2, col3 = st.columns(3)
+
+        with col1:
+            oficinas = ["Todas"] + sorted(df_cola['oficina'].dropna().unique().tolist())
+            oficina_filtro = st.selectbox("Oficina", oficinas, key="permisos_cola_oficina")
+
+        if oficina_filtro != "Todas":
+            df_cola = df_cola[df_cola['oficina'] == oficina_filtro]
+
+        with col2:
+            por_pagina = st.selectbox("Por página", [25, 50, 100], key="permisos_cola_por_pagina")
+
+        total_paginas = max(1, -(-len(df_cola) // por_pagina))
+
+        with col3:
+            pagina = st.number_input("Página", min_value=1, max_value=total_paginas, value=1, key="permisos_cola_pagina")
+
+        insuficientes = int((~df_cola['suficiente']).sum())
+        st.info(f"📋 {len(df_cola)} permisos pendientes" + (f" · ⚠️ {insuficientes} sin días suficientes" if insuficientes else ""))
+
+        df_pagina = df_cola.iloc[(pagina - 1) * por_pagina:pagina * por_pagina]
+
+        columnas_mostrar = {
+            'nombre_completo': 'Empleado',
+            'oficina': 'Oficina',
+            'fecha_inicio': 'Inicio',
+            'fecha_fin': 'Fin',
+            'dias_solicitados': 'Días',
+            'dias_permiso_disponibles': 'Disponibles',
+            'motivo': 'Motivo',
+            'solicitado_por': 'Solicitado por'
+        }
+
+        df_tabla = df_pagina[list(columnas_mostrar.keys())].rename(columns=columnas_mostrar)
+        df_tabla.insert(0, 'Seleccionar', st.checkbox("Seleccionar toda la página", key=f"permisos_cola_todos_{pagina}"))
+        df_tabla.index = df_pagina['id']
+
+        df_editado = st.data_editor(
+            df_tabla,
+            use_container_width=True,
+            hide_index=True,
+            disabled=list(columnas_mostrar.values()),
+            column_config={'Seleccionar': st.column_config.CheckboxColumn("✔", width="small")},
+            key=f"permisos_cola_editor_{pagina}"
         )
-        
-        st.info(f"📋 {len(df_permisos_pendientes)} permisos pendientes")
-        
-        # Mostrar cada permiso
-        for idx, permiso in df_permisos_pendientes.iterrows():
-            with st.expander(f"📄 {permiso['nombre_completo']} - {permiso['dias_solicitados']} días"):
-                col1, col2 = st.columns(2)
-                
-                with col1:
-                    st.write(f"**Empleado:** {permiso['nombre_completo']}")
-                    st.write(f"**ID:** {permiso['id_empleado']}")
-                    st.write(f"**Oficina:** {permiso['oficina_emp']}")
-                    st.write(f"**Solicitado por:** {permiso['solicitado_por']}")
-                
-                with col2:
-                    st.write(f"**Fecha inicio:** {permiso['fecha_inicio']}")
-                    st.write(f"**Fecha fin:** {permiso['fecha_fin']}")
-                    st.write(f"**Días solicitados:** {permiso['dias_solicitados']}")
-                    st.write(f"**Fecha solicitud:** {permiso['timestamp_creacion']}")
-                
-                st.write(f"**Motivo:** {permiso['motivo']}")
-                
-                # Obtener días disponibles
-                empleado_info = df_empleados[df_empleados['id_empleado'] == permiso['id_empleado']].iloc[0]
-                dias_disponibles = empleado_info['dias_permiso_disponibles']
-                
-                if permiso['dias_solicitados'] > dias_disponibles:
-                    st.warning(f"⚠️ Días insuficientes. Disponibles: {dias_disponibles}")
+
+        ids_seleccionados = df_editado.index[df_editado['Seleccionar']].tolist()
+
+        comentario = st.text_input(
+            "Comentario (obligatorio para rechazar)",
+            key="permisos_cola_comentario"
+        )
+
+        col_aprobar, col_rechazar = st.columns(2)
+
+        with col_aprobar:
+            if st.button(f"✅ Aprobar ({len(ids_seleccionados)})", key="permisos_cola_aprobar", type="primary",
+                         use_container_width=True, disabled=not ids_seleccionados):
+                procesar_lote(manager, df_cola, ids_seleccionados, user_data, True, comentario)
+
+        with col_rechazar:
+            if st.button(f"❌ Rechazar ({len(ids_seleccionados)})", key="permisos_cola_rechazar",
+                         use_container_width=True, disabled=not ids_seleccionados):
+                if not comentario.strip():
+                    st.error("⚠️ Debe indicar el motivo del rechazo")
                 else:
-                    st.success(f"✅ Días disponibles: {dias_disponibles}")
-                
-                col_aprobar, col_rechazar = st.columns(2)
-                
-                with col_aprobar:
-                    comentario_aprobar = st.text_input(
-                        "Comentario (opcional)",
-                        key=f"permisos_comentario_aprobar_{permiso['id']}"
-                    )
-                    
-                    if st.button("✅ Aprobar", key=f"permisos_aprobar_{permiso['id']}", type="primary", use_container_width=True):
-                        procesar_aprobacion(manager, permiso, user_data, True, comentario_aprobar)
-                
-                with col_rechazar:
-                    comentario_rechazar = st.text_input(
-                        "Motivo rechazo",
-                        key=f"permisos_comentario_rechazar_{permiso['id']}"
-                    )
-                    
-                    if st.button("❌ Rechazar", key=f"permisos_rechazar_{permiso['id']}", use_container_width=True):
-                        if not comentario_rechazar.strip():
-                            st.error("⚠️ Debe indicar el motivo del rechazo")
-                        else:
-                            procesar_aprobacion(manager, permiso, user_data, False, comentario_rechazar)
-    
+                    procesar_lote(manager, df_cola, ids_seleccionados, user_data, False, comentario)
+
     except Exception as e:
         st.error(f"❌ Error: {e}")
 
 
-def procesar_aprobacion(manager, permiso, user_data, aprobar, comentario):
-    """Procesar aprobación o rechazo de permiso"""
+def procesar_lote(manager, df_cola, ids_permisos, user_data, aprobar, comentario):
+    """Aplicar una decisión a varios permisos en una transacción y auditar en lote"""
     try:
-        nuevo_estado = "Aprobado" if aprobar else "Rechazado"
-        
-        # Actualizar estado del permiso
-        manager.supabase.table("permisos").update({
-            'estado': nuevo_estado,
-            'aprobado_por': user_data['email'],
-            'fecha_aprobacion': datetime.now().isoformat(),
-            'comentario_aprobacion': comentario.strip() if comentario else None
-        }).eq('id', permiso['id']).execute()
-        
-        # Si se aprueba, descontar días del empleado
-        if aprobar:
-            df_empleados = manager.get_dataframe("empleados")
-            empleado = df_empleados[df_empleados['id_empleado'] == permiso['id_empleado']].iloc[0]
-            dias_actuales = empleado['dias_permiso_disponibles']
-            nuevos_dias = dias_actuales - permiso['dias_solicitados']
-            
-            manager.supabase.table("empleados").update({
-                'dias_permiso_disponibles': nuevos_dias
-            }).eq('id_empleado', permiso['id_empleado']).execute()
-        
-        # Log auditoría
+        comentario = comentario.strip() if comentario else None
+        resultados = manager.procesar_permisos_lote(ids_permisos, aprobar, user_data['email'], comentario)
+
+        permisos = df_cola.set_index('id')
         accion = "aprobar_permiso" if aprobar else "rechazar_permiso"
-        detalles = f"Permiso {nuevo_estado.lower()} para {permiso['id_empleado']}: {permiso['dias_solicitados']} días"
-        if comentario:
-            detalles += f". Comentario: {comentario}"
-        
-        manager.log_action(
-            usuario=user_data['email'],
-            accion=accion,
-            modulo="permisos",
-            detalles=detalles
-        )
-        
-        st.success(f"✅ Permiso {nuevo_estado.lower()} correctamente")
-        st.rerun()
-        
+        estado = "aprobado" if aprobar else "rechazado"
+
+        registros_log = []
+        errores = []
+        for r in resultados:
+            permiso = permisos.loc[r['id']]
+            if not r['ok']:
+                errores.append(f"{permiso['nombre_completo']}: {r['error']}")
+                continue
+
+            detalles = f"Permiso {estado} para {permiso['id_empleado']}: {permiso['dias_solicitados']} días"
+            if aprobar:
+                detalles += f". Saldo restante: {r['nuevo_saldo']}"
+            if comentario:
+                detalles += f". Comentario: {comentario}"
+            registros_log.append({
+                'usuario': user_data['email'],
+                'accion': accion,
+                'modulo': "permisos",
+                'detalles': detalles
+            })
+
+        manager.log_actions(registros_log)
+
+        if aprobar:
+            # Al aprobar, las asistencias de esos días pasan a ser conflicto; los
+            # cruces que ya tenía el permiso pendiente no se reportan de nuevo
+            aprobados = [r['id'] for r in resultados if r['ok']]
+            if aprobados:
+                pendientes = permisos.loc[aprobados].reset_index().to_dict('records')
+                revisar_conflictos(manager, "permisos", pendientes, anteriores=pendientes)
+
+        if errores:
+            st.warning("⚠️ No se procesaron:\n\n" + "\n\n".join(errores))
+
+        if registros_log:
+            st.success(f"✅ {len(registros_log)} permisos {estado}s correctamente")
+            recargar_seccion()
+
     except Exception as e:
         st.error(f"❌ Error al procesar: {e}")
 
@@ -296,7 +339,8 @@ def ver_historial_permisos(user_data, todos=True):
     manager = get_sheets_manager()
     
     try:
-        df_permisos = manager.get_dataframe("permisos")
+        datos = manager.get_many(["permisos", "empleados"])
+        df_permisos = datos["permisos"]
         
         if df_permisos.empty:
             st.info("🔭 No hay permisos registrados")
@@ -307,7 +351,7 @@ def ver_historial_permisos(user_data, todos=True):
             df_permisos = df_permisos[df_permisos['oficina'] == user_data['oficina']]
         
         # Obtener nombres de empleados
-        df_empleados = manager.get_dataframe("empleados")
+        df_empleados = datos["empleados"]
         df_permisos = df_permisos.merge(
             df_empleados[['id_empleado', 'nombre_completo']],
             on='id_empleado',
@@ -425,6 +469,7 @@ def ver_historial_permisos(user_data, todos=True):
         st.error(f"❌ Error: {e}")
 
 
+@st.fragment
 def sincronizar_permisos():
     """Sincronizar permisos a Google Sheets"""
     st.subheader("Sincronizar Permisos a Google Sheets")
@@ -432,9 +477,8 @@ def sincronizar_permisos():
     manager = get_sheets_manager()
     
     try:
-        # Contar pendientes de sincronizar
-        df_permisos = manager.get_dataframe("permisos")
-        pendientes = len(df_permisos[df_permisos['sincronizado'] == False])
+        # Contar pendientes de sincronizar (solo conteo, sin descargar filas)
+        pendientes = manager.get_sync_status().get('permisos') or 0
         
         st.info(f"📊 Permisos pendientes de sincronizar: **{pendientes}**")
         
@@ -449,7 +493,7 @@ def sincronizar_permisos():
                     result = manager.sync_to_sheets(tabla="permisos")
                     
                     st.success(f"✅ Sincronización completada: {result['sincronizados']} permisos")
-                    st.rerun()
+                    recargar_seccion()
                     
                 except Exception as e:
                     st.error(f"❌ Error en sincronización: {e}")
@@ -458,45 +502,121 @@ def sincronizar_permisos():
         st.error(f"❌ Error: {e}")
 
 
-def calcular_dias_habiles(fecha_inicio, fecha_fin):
-    """Calcular días hábiles entre dos fechas (lunes a viernes)"""
-    dias = 0
-    fecha_actual = fecha_inicio
-    
-    while fecha_actual <= fecha_fin:
-        # 0=lunes, 6=domingo
-        if fecha_actual.weekday() < 5:  # Lunes a viernes
-            dias += 1
-        fecha_actual += timedelta(days=1)
+@st.fragment
+def conciliar_saldos(user_data):
+    """Ledger anual de permisos y conciliación de saldos guardados"""
+    manager = get_sheets_manager()
     
-    return dias
-
-
-def verificar_solapamiento(manager, id_empleado, fecha_inicio, fecha_fin):
-    """Verificar si hay permisos que se solapan"""
     try:
-        df_permisos = manager.get_dataframe("permisos")
+        año = datetime.now().year
         
-        # Filtrar permisos del empleado que no estén rechazados
-        permisos_empleado = df_permisos[
-            (df_permisos['id_empleado'] == id_empleado) &
-            (df_permisos['estado'] != 'Rechazado')
-        ]
+        datos = manager.get_many(["permisos", "empleados"])
+        ledger = calcular_ledger_permisos(datos["permisos"], datos["empleados"], años=[año])
         
-        if permisos_empleado.empty:
-            return False
+        if ledger.empty:
+            st.info("🔭 No hay empleados registrados")
+            return
         
-        # Convertir fechas
-        fecha_inicio_str = fecha_inicio.strftime('%Y-%m-%d')
-        fecha_fin_str = fecha_fin.strftime('%Y-%m-%d')
+        desviados = ledger[ledger['diferencia'] != 0]
         
-        for _, permiso in permisos_empleado.iterrows():
-            # Verificar solapamiento
-            if (fecha_inicio_str <= permiso['fecha_fin'] and 
-                fecha_fin_str >= permiso['fecha_inicio']):
-                return True
+        col1, col2 = st.columns(2)
+        with col1:
+            st.metric(f"Días usados {año}", int(ledger['dias_usados'].sum()))
+        with col2:
+            st.metric("Saldos desviados", len(desviados))
+        
+        if not desviados.empty:
+            st.dataframe(
+                desviados.rename(columns={
+                    'id_empleado': 'ID',
+                    'dias_usados': 'Usados',
+                    'dias_disponibles': 'Disponibles (ledger)',
+                    'dias_permiso_disponibles': 'Disponibles (guardado)',
+                    'diferencia': 'Diferencia'
+                }),
+                use_container_width=True,
+                hide_index=True
+            )
         
-        return False
+        st.caption("Al iniciar el año, la conciliación reinicia los saldos a 9 días (menos permisos ya aprobados del año).")
         
-    except:
-        return False
\ No newline at end of file
+        if st.button("🔄 Conciliar saldos", key="permisos_conciliar", use_container_width=True):
+            _, actualizados = reconciliar_saldos_permisos(manager, año)
+            
+            manager.log_action(
+                usuario=user_data['email'],
+                accion="conciliar_saldos_permisos",
+                modulo="permisos",
+                detalles=f"Saldos {año} conciliados: {actualizados} empleados actualizados"
+            )
+            
+            st.success(f"✅ {actualizados} saldos actualizados")
+            recargar_seccion()
+    
+    except Exception as e:
+        st.error(f"❌ Error: {e}")
+
+
+@st.fragment
+def gestionar_dias_festivos(user_data):
+    """Consultar festivos federales y registrar días de descanso de la empresa"""
+    manager = get_sheets_manager()
+    
+    try:
+        año = st.selectbox(
+            "Año",
+            range(datetime.now().year + 1, datetime.now().year - 3, -1),
+            index=1,
+            key="permisos_festivos_año"
+        )
+        
+        st.dataframe(festivos_del_año(año, manager), use_container_width=True, hide_index=True)
+        
+        with st.form("form_dia_festivo", clear_on_submit=True):
+            col1, col2 = st.columns([1, 2])
+            
+            with col1:
+                fecha = st.date_input("Fecha")
+            
+            with col2:
+                descripcion = st.text_input("Descripción", placeholder="Día de descanso de la empresa")
+            
+            if st.form_submit_button("➕ Agregar día festivo", use_container_width=True):
+                if not descripcion.strip():
+                    st.error("❌ La descripción es obligatoria")
+                    st.stop()
+                
+                manager.supabase.table("dias_festivos").insert({
+                    'fecha': fecha.strftime('%Y-%m-%d'),
+                    'descripcion': descripcion.strip(),
+                    'creado_por': user_data['email']
+                }).execute()
+                manager.invalidate_cache()
+                
+                manager.log_action(
+                    usuario=user_data['email'],
+                    accion="agregar_dia_festivo",
+                    modulo="permisos",
+                    detalles=f"Día festivo {fecha}: {descripcion.strip()}"
+                )
+                
+                st.success("✅ Día festivo agregado")
+                recargar_seccion()
+    
+    except Exception as e:
+        st.error(f"❌ Error: {e}")
+
+
+def calcular_dias_habiles(fecha_inicio, fecha_fin, calendario=None):
+    """Calcular días hábiles entre dos fechas (lunes a viernes sin festivos)"""
+    return int(contar_dias_habiles(fecha_inicio, fecha_fin, calendario))
+
+
+def verificar_solapamiento(manager, id_empleado, fecha_inicio, fecha_fin):
+    """Verificar si hay permisos o incapacidades que se solapan
+    
+    Retorna la descripción del registro que se cruza o None. Responde solo el
+    índice en memoria, sin consultas al servidor: se reconstruye con cada cambio
+    de versión de permisos/incapacidades y las inserciones lo actualizan en sitio.
+    """
+    return obtener_indice_ausencias(manager).buscar_solapamiento(id_empleado, fecha_inicio, fecha_fin)
@@ -0,0 +1,129 @@
+import streamlit as st
+from datetime import date
+from config import get_sheets_manager
+from utils.dias_habiles import obtener_calendario
+from utils.reportes import (REPORTES, FORMATOS, CacheArtefactos, clave_reporte, columnas_reporte, exportar,
+                            formatos_disponibles, paginas_reporte)
+
+@st.cache_resource
+def get_cache_reportes():
+    """Artefactos generados, compartidos por todas las sesiones"""
+    return CacheArtefactos()
+
+def show_reportes_module():
+    """Módulo de reportes exportables"""
+    user_data = st.session_state.get('user_data', {})
+
+    st.title("📊 Reportes y Análisis")
+    st.caption("Reportes por periodo en CSV, Excel o Parquet, generados por páginas")
+
+    if user_data.get('rol') not in ['admin', 'supervisora']:
+        st.error("❌ No tienes permisos para acceder a este módulo")
+        return
+
+    generar_reporte(user_data)
+
+@st.fragment
+def generar_reporte(user_data):
+    """Formulario de parámetros, generación y descarga"""
+    manager = get_sheets_manager()
+
+    try:
+        df_oficinas = manager.get_many({'oficinas': ("empleados", "oficina", None)})['oficinas']
+        oficinas = ["Todas"] + (sorted(df_oficinas['oficina'].dropna().unique().tolist()) if not df_oficinas.empty else [])
+    except Exception as e:
+        st.error(f"❌ Error al cargar oficinas: {e}")
+        return
+
+    col1, col2 = st.columns(2)
+
+    with col1:
+        reporte = st.selectbox(
+            "Reporte",
+            list(REPORTES),
+            format_func=lambda r: REPORTES[r]['titulo'],
+            key="reportes_tipo"
+        )
+        oficina = st.selectbox("Oficina", oficinas, key="reportes_oficina")
+
+    with col2:
+        hoy = date.today()
+        desde = st.date_input("Desde", value=hoy.replace(day=1), key="reportes_desde")
+        hasta = st.date_input("Hasta", value=hoy, key="reportes_hasta")
+
+    formatos = formatos_disponibles()
+    formato = st.radio("Formato", formatos, horizontal=True, key="reportes_formato")
+
+    faltantes = [modulo for nombre, (_, _, modulo) in FORMATOS.items() if nombre not in formatos]
+    if faltantes:
+        st.caption(f"💡 Instala {', '.join(faltantes)} para habilitar más formatos")
+
+    if reporte == 'nomina':
+        st.caption("Una fila por empleado y mes: asistencias, días de permiso (hábiles), días de incapacidad y bono")
+
+    if desde > hasta:
+        st.error("⚠️ La fecha inicial debe ser anterior a la final")
+        return
+
+    extension, mime, _ = FORMATOS[formato]
+    oficina_filtro = None if oficina == "Todas" else oficina
+    nombre_archivo = f"{reporte}_{desde}_{hasta}{'_' + oficina_filtro if oficina_filtro else ''}.{extension}"
+
+    def generar(ruta, al_avanzar=None):
+        calendario = obtener_calendario(manager) if reporte == 'nomina' else None
+        paginas = paginas_reporte(manager, reporte, desde, hasta, oficina_filtro, calendario)
+        return exportar(paginas, ruta, extension, columnas_reporte(reporte), al_avanzar)
+
+    if st.button("⚙️ Generar reporte", type="primary", use_container_width=True, key="reportes_generar"):
+        try:
+            clave = clave_reporte(manager, reporte, desde, hasta, oficina_filtro, extension)
+            avance = st.empty()
+
+            with st.spinner("Generando reporte..."):
+                ruta, filas, generado = get_cache_reportes().obtener(
+                    clave, extension,
+                    lambda ruta: generar(ruta, lambda n: avance.caption(f"⏳ {n:,} filas escritas"))
+                )
+            avance.empty()
+
+            st.session_state['reporte_generado'] = {
+                'clave': clave,
+                'extension': extension,
+                'mime': mime,
+                'nombre': nombre_archivo,
+                'filas': filas,
+                'generado': generado
+            }
+
+            if generado:
+                manager.log_action(
+                    usuario=user_data['email'],
+                    accion="exportar_reporte",
+                    modulo="reportes",
+                    detalles=f"Reporte {reporte} {desde} a {hasta} ({oficina}, {formato}): {filas} filas"
+                )
+        except Exception as e:
+            st.error(f"❌ Error al generar el reporte: {e}")
+
+    artefacto = st.session_state.get('reporte_generado')
+    if not artefacto or artefacto['nombre'] != nombre_archivo:
+        return
+
+    origen = "generado" if artefacto['generado'] else "reutilizado del caché"
+    st.success(f"✅ {artefacto['filas']:,} filas ({origen})")
+
+    def descargar():
+        # Se ejecuta al hacer clic; si el archivo salió del caché se vuelve a generar
+        ruta, _, _ = get_cache_reportes().obtener(artefacto['clave'], artefacto['extension'], generar)
+        with open(ruta, 'rb') as archivo:
+            return archivo.read()
+
+    st.download_button(
+        f"📥 Descargar {artefacto['nombre']}",
+        data=descargar,
+        file_name=artefacto['nombre'],
+        mime=artefacto['mime'],
+        on_click="ignore",
+        use_container_width=True,
+        key="reportes_descargar"
+    )
@@ -0,0 +1,52 @@
+"""Recalcular bonos de varios periodos y oficinas desde la línea de comandos
+
+Uso:
+    python recalcular_bonos.py --años 2025 [--meses 1 2 3] [--oficinas Norte Sur]
+                               [--version-reglas 3] [--workers 4] [--usuario admin@empresa.com] [--dry-run]
+
+Requiere .streamlit/secrets.toml con las credenciales de Supabase.
+"""
+import argparse
+from config import get_sheets_manager
+from utils.recalculo_bonos import recalcular_y_guardar
+
+def main():
+    parser = argparse.ArgumentParser(description="Recalcular bonos en lote")
+    parser.add_argument("--años", nargs="+", type=int, required=True)
+    parser.add_argument("--meses", nargs="+", type=int, default=list(range(1, 13)))
+    parser.add_argument("--oficinas", nargs="+", default=None, help="Por defecto todas")
+    parser.add_argument("--version-reglas", type=int, default=None, help="Por defecto la vigente")
+    parser.add_argument("--workers", type=int, default=None, help="Procesos de cálculo (por defecto uno por CPU)")
+    parser.add_argument("--usuario", default="cli")
+    parser.add_argument("--dry-run", action="store_true", help="Calcular sin guardar")
+    args = parser.parse_args()
+
+    manager = get_sheets_manager()
+
+    def al_avanzar(completadas, total):
+        print(f"\r  {completadas}/{total} tareas", end="", flush=True)
+
+    resumen = recalcular_y_guardar(
+        manager,
+        args.años,
+        args.meses,
+        oficinas=args.oficinas,
+        version_reglas=args.version_reglas,
+        calculado_por=args.usuario,
+        max_workers=args.workers,
+        al_avanzar=al_avanzar,
+        guardar=not args.dry_run,
+        procesos=True
+    )
+    print()
+
+    print(f"Reglas v{resumen['version_reglas']} | Tareas: {resumen['tareas']} | Registros: {resumen['registros']} | Total: ${resumen['total_bonos']:,.2f}")
+    print(f"Carga: {resumen['segundos_carga']:.2f}s | Cálculo: {resumen['segundos_calculo']:.2f}s | "
+          f"Guardado: {resumen['segundos_guardado']:.2f}s")
+    if args.dry_run:
+        print("Dry-run: no se guardó nada")
+    else:
+        print(f"Nuevos: {resumen['guardado']['insertados']} | Actualizados: {resumen['guardado']['actualizados']}")
+
+if __name__ == "__main__":
+    main()
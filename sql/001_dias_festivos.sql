@@ -0,0 +1,8 @@
+-- Días de descanso propios de la empresa (los festivos federales se calculan en utils/dias_habiles.py)
+CREATE TABLE IF NOT EXISTS dias_festivos (
+    id SERIAL PRIMARY KEY,
+    fecha DATE NOT NULL UNIQUE,
+    descripcion TEXT NOT NULL,
+    creado_por TEXT,
+    timestamp_creacion TIMESTAMPTZ DEFAULT now()
+);
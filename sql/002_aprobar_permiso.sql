@@ -0,0 +1,53 @@
+-- Aprobación/rechazo atómico de permisos con descuento de días en la misma transacción
+-- Se usa desde procesar_permisos_lote (sql/003); la app aprueba siempre por lote
+CREATE OR REPLACE FUNCTION aprobar_permiso(
+    p_id_permiso BIGINT,
+    p_aprobar BOOLEAN,
+    p_aprobado_por TEXT,
+    p_comentario TEXT DEFAULT NULL
+)
+RETURNS JSONB
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_permiso permisos%ROWTYPE;
+    v_saldo INTEGER;
+BEGIN
+    -- Solo permisos pendientes: una segunda aprobación concurrente no encuentra la fila
+    UPDATE permisos
+       SET estado = CASE WHEN p_aprobar THEN 'Aprobado' ELSE 'Rechazado' END,
+           aprobado_por = p_aprobado_por,
+           fecha_aprobacion = now(),
+           comentario_aprobacion = p_comentario
+     WHERE id = p_id_permiso
+       AND estado = 'Pendiente'
+    RETURNING * INTO v_permiso;
+
+    IF NOT FOUND THEN
+        RAISE EXCEPTION 'El permiso % ya fue procesado o no existe', p_id_permiso;
+    END IF;
+
+    IF p_aprobar THEN
+        UPDATE empleados
+           SET dias_permiso_disponibles = dias_permiso_disponibles - v_permiso.dias_solicitados
+         WHERE id_empleado = v_permiso.id_empleado
+           AND dias_permiso_disponibles >= v_permiso.dias_solicitados
+        RETURNING dias_permiso_disponibles INTO v_saldo;
+
+        IF NOT FOUND THEN
+            RAISE EXCEPTION 'Días insuficientes para el empleado %', v_permiso.id_empleado;
+        END IF;
+    ELSE
+        SELECT dias_permiso_disponibles INTO v_saldo
+          FROM empleados
+         WHERE id_empleado = v_permiso.id_empleado;
+    END IF;
+
+    RETURN jsonb_build_object(
+        'estado', v_permiso.estado,
+        'id_empleado', v_permiso.id_empleado,
+        'dias_solicitados', v_permiso.dias_solicitados,
+        'nuevo_saldo', v_saldo
+    );
+END;
+$$;
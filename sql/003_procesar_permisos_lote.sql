@@ -0,0 +1,33 @@
+-- Aprobación/rechazo de varios permisos en una sola transacción.
+-- Cada permiso se procesa en su propio bloque: un error (p. ej. días insuficientes)
+-- se reporta en el resultado sin descartar los demás.
+CREATE OR REPLACE FUNCTION procesar_permisos_lote(
+    p_ids BIGINT[],
+    p_aprobar BOOLEAN,
+    p_aprobado_por TEXT,
+    p_comentario TEXT DEFAULT NULL
+)
+RETURNS JSONB
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_id BIGINT;
+    v_resultado JSONB;
+    v_resultados JSONB := '[]'::JSONB;
+BEGIN
+    FOREACH v_id IN ARRAY p_ids LOOP
+        BEGIN
+            v_resultado := aprobar_permiso(v_id, p_aprobar, p_aprobado_por, p_comentario);
+            v_resultados := v_resultados || jsonb_build_array(
+                v_resultado || jsonb_build_object('id', v_id, 'ok', true)
+            );
+        EXCEPTION WHEN OTHERS THEN
+            v_resultados := v_resultados || jsonb_build_array(
+                jsonb_build_object('id', v_id, 'ok', false, 'error', SQLERRM)
+            );
+        END;
+    END LOOP;
+
+    RETURN v_resultados;
+END;
+$$;
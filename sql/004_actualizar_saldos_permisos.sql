@@ -0,0 +1,19 @@
+-- Actualización masiva de saldos de permisos en un solo UPDATE
+-- p_saldos: [{"id_empleado": "...", "dias": 9}, ...]
+CREATE OR REPLACE FUNCTION actualizar_saldos_permisos(p_saldos JSONB)
+RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_actualizados INTEGER;
+BEGIN
+    UPDATE empleados e
+       SET dias_permiso_disponibles = s.dias
+      FROM jsonb_to_recordset(p_saldos) AS s(id_empleado TEXT, dias INTEGER)
+     WHERE e.id_empleado::TEXT = s.id_empleado
+       AND e.dias_permiso_disponibles IS DISTINCT FROM s.dias;
+
+    GET DIAGNOSTICS v_actualizados = ROW_COUNT;
+    RETURN v_actualizados;
+END;
+$$;
@@ -0,0 +1,61 @@
+-- Un bono por empleado y periodo: antes de la restricción se conserva solo el
+-- cálculo más reciente de cada (id_empleado, año, mes)
+DELETE FROM bonos
+ WHERE id IN (
+    SELECT id
+      FROM (
+        SELECT id,
+               row_number() OVER (
+                   PARTITION BY id_empleado, "año", mes
+                   ORDER BY fecha_calculo DESC NULLS LAST, id DESC
+               ) AS orden
+          FROM bonos
+      ) duplicados
+     WHERE orden > 1
+ );
+
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'bonos_empleado_periodo_key') THEN
+        ALTER TABLE bonos ADD CONSTRAINT bonos_empleado_periodo_key UNIQUE (id_empleado, "año", mes);
+    END IF;
+END;
+$$;
+
+-- Upsert masivo de bonos en una sola transacción.
+-- Retorna cuántas filas se insertaron y cuántas se actualizaron.
+CREATE OR REPLACE FUNCTION guardar_bonos_lote(p_bonos JSONB)
+RETURNS JSONB
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_resultado JSONB;
+BEGIN
+    WITH filas AS (
+        INSERT INTO bonos (
+            id_empleado, periodo, "año", mes, dias_trabajados, presentes, retardos,
+            ausentes, monto_bono, oficina, calculado_por, fecha_calculo
+        )
+        SELECT id_empleado, periodo, "año", mes, dias_trabajados, presentes, retardos,
+               ausentes, monto_bono, oficina, calculado_por, fecha_calculo
+          FROM jsonb_populate_recordset(NULL::bonos, p_bonos)
+        ON CONFLICT (id_empleado, "año", mes) DO UPDATE
+           SET dias_trabajados = EXCLUDED.dias_trabajados,
+               presentes = EXCLUDED.presentes,
+               retardos = EXCLUDED.retardos,
+               ausentes = EXCLUDED.ausentes,
+               monto_bono = EXCLUDED.monto_bono,
+               calculado_por = EXCLUDED.calculado_por,
+               fecha_calculo = EXCLUDED.fecha_calculo
+        RETURNING (xmax = 0) AS insertado
+    )
+    SELECT jsonb_build_object(
+               'insertados', count(*) FILTER (WHERE insertado),
+               'actualizados', count(*) FILTER (WHERE NOT insertado)
+           )
+      INTO v_resultado
+      FROM filas;
+
+    RETURN v_resultado;
+END;
+$$;
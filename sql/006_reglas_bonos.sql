@@ -0,0 +1,50 @@
+-- Conjuntos de reglas de bonos versionados (nunca se sobrescriben; cada cambio es una versión nueva)
+CREATE TABLE IF NOT EXISTS reglas_bonos (
+    version INTEGER PRIMARY KEY,
+    reglas JSONB NOT NULL,
+    descripcion TEXT,
+    creado_por TEXT,
+    fecha_creacion TIMESTAMPTZ DEFAULT now()
+);
+
+-- Versión de reglas con la que se calculó cada bono (0 = configuración anterior a las reglas)
+ALTER TABLE bonos
+    ADD COLUMN IF NOT EXISTS version_reglas INTEGER NOT NULL DEFAULT 0;
+
+-- guardar_bonos_lote ahora también guarda version_reglas
+CREATE OR REPLACE FUNCTION guardar_bonos_lote(p_bonos JSONB)
+RETURNS JSONB
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_resultado JSONB;
+BEGIN
+    WITH filas AS (
+        INSERT INTO bonos (
+            id_empleado, periodo, "año", mes, dias_trabajados, presentes, retardos,
+            ausentes, monto_bono, oficina, calculado_por, fecha_calculo, version_reglas
+        )
+        SELECT id_empleado, periodo, "año", mes, dias_trabajados, presentes, retardos,
+               ausentes, monto_bono, oficina, calculado_por, fecha_calculo, version_reglas
+          FROM jsonb_populate_recordset(NULL::bonos, p_bonos)
+        ON CONFLICT (id_empleado, "año", mes) DO UPDATE
+           SET dias_trabajados = EXCLUDED.dias_trabajados,
+               presentes = EXCLUDED.presentes,
+               retardos = EXCLUDED.retardos,
+               ausentes = EXCLUDED.ausentes,
+               monto_bono = EXCLUDED.monto_bono,
+               calculado_por = EXCLUDED.calculado_por,
+               fecha_calculo = EXCLUDED.fecha_calculo,
+               version_reglas = EXCLUDED.version_reglas
+        RETURNING (xmax = 0) AS insertado
+    )
+    SELECT jsonb_build_object(
+               'insertados', count(*) FILTER (WHERE insertado),
+               'actualizados', count(*) FILTER (WHERE NOT insertado)
+           )
+      INTO v_resultado
+      FROM filas;
+
+    RETURN v_resultado;
+END;
+$$;
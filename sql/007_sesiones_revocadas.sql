@@ -0,0 +1,12 @@
+-- Lista de revocación de tokens de sesión (ver auth.py)
+-- jti revoca un token; jti NULL revoca todos los tokens del email emitidos antes de revocado_en
+CREATE TABLE IF NOT EXISTS sesiones_revocadas (
+    id SERIAL PRIMARY KEY,
+    jti TEXT,
+    email TEXT NOT NULL,
+    revocado_en TIMESTAMPTZ NOT NULL DEFAULT now(),
+    expira TIMESTAMPTZ NOT NULL,
+    motivo TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_sesiones_revocadas_expira ON sesiones_revocadas (expira);
@@ -0,0 +1,10 @@
+-- Emails únicos en usuarios (alta masiva con upsert por email, ver generar_hashes.py)
+UPDATE usuarios SET email = lower(trim(email)) WHERE email <> lower(trim(email));
+
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'usuarios_email_key') THEN
+        ALTER TABLE usuarios ADD CONSTRAINT usuarios_email_key UNIQUE (email);
+    END IF;
+END;
+$$;
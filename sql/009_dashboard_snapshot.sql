@@ -0,0 +1,81 @@
+-- Resumen del dashboard en una sola llamada (ver utils/dashboard.py)
+-- p_oficina NULL = todas las oficinas
+-- p_hoy se convierte una vez al tipo de cada columna (texto ISO o DATE) para
+-- comparar la columna sin casts y poder usar sus índices
+CREATE OR REPLACE FUNCTION dashboard_snapshot(p_oficina TEXT, p_hoy DATE, p_limite INTEGER DEFAULT 10)
+RETURNS JSONB
+LANGUAGE plpgsql
+STABLE
+AS $$
+DECLARE
+    v_hoy_asistencia asistencias.fecha%TYPE := p_hoy;
+    v_hoy_permiso_inicio permisos.fecha_inicio%TYPE := p_hoy;
+    v_hoy_permiso_fin permisos.fecha_fin%TYPE := p_hoy;
+    v_hoy_incapacidad_inicio incapacidades.fecha_inicio%TYPE := p_hoy;
+    v_hoy_incapacidad_fin incapacidades.fecha_fin%TYPE := p_hoy;
+BEGIN
+    RETURN jsonb_build_object(
+        'empleados_activos', (
+            SELECT count(*) FROM empleados
+             WHERE upper(activo) = 'SI' AND (p_oficina IS NULL OR oficina = p_oficina)
+        ),
+        'oficinas', (
+            SELECT count(DISTINCT oficina) FROM empleados
+             WHERE p_oficina IS NULL OR oficina = p_oficina
+        ),
+        'asistencias_hoy', (
+            SELECT count(*) FROM asistencias
+             WHERE fecha = v_hoy_asistencia AND (p_oficina IS NULL OR oficina = p_oficina)
+        ),
+        'permisos_pendientes', (
+            SELECT count(*) FROM permisos
+             WHERE estado = 'Pendiente' AND (p_oficina IS NULL OR oficina = p_oficina)
+        ),
+        'permisos_activos_hoy', (
+            SELECT count(DISTINCT id_empleado) FROM permisos
+             WHERE estado = 'Aprobado' AND fecha_inicio <= v_hoy_permiso_inicio AND fecha_fin >= v_hoy_permiso_fin
+               AND (p_oficina IS NULL OR oficina = p_oficina)
+        ),
+        'incapacidades_activas_total', (
+            SELECT count(*) FROM incapacidades
+             WHERE fecha_inicio <= v_hoy_incapacidad_inicio AND fecha_fin >= v_hoy_incapacidad_fin
+               AND (p_oficina IS NULL OR oficina = p_oficina)
+        ),
+        'ultimas_asistencias', COALESCE((
+            SELECT jsonb_agg(to_jsonb(t)) FROM (
+                SELECT a.fecha, e.nombre_completo, a.estado, a.oficina
+                  FROM asistencias a LEFT JOIN empleados e ON e.id_empleado = a.id_empleado
+                 WHERE p_oficina IS NULL OR a.oficina = p_oficina
+                 ORDER BY a.timestamp_sistema DESC
+                 LIMIT p_limite
+            ) t
+        ), '[]'::jsonb),
+        'permisos_recientes', COALESCE((
+            SELECT jsonb_agg(to_jsonb(t)) FROM (
+                SELECT e.nombre_completo, p.fecha_inicio, p.dias_solicitados, p.estado
+                  FROM permisos p LEFT JOIN empleados e ON e.id_empleado = p.id_empleado
+                 WHERE p_oficina IS NULL OR p.oficina = p_oficina
+                 ORDER BY p.timestamp_creacion DESC
+                 LIMIT p_limite
+            ) t
+        ), '[]'::jsonb),
+        'incapacidades_activas', COALESCE((
+            SELECT jsonb_agg(to_jsonb(t)) FROM (
+                SELECT e.nombre_completo, i.tipo, i.fecha_inicio, i.fecha_fin, i.dias_totales
+                  FROM incapacidades i LEFT JOIN empleados e ON e.id_empleado = i.id_empleado
+                 WHERE i.fecha_inicio <= v_hoy_incapacidad_inicio AND i.fecha_fin >= v_hoy_incapacidad_fin
+                   AND (p_oficina IS NULL OR i.oficina = p_oficina)
+                 ORDER BY i.fecha_inicio DESC
+                 LIMIT p_limite
+            ) t
+        ), '[]'::jsonb)
+    );
+END;
+$$;
+
+-- Índices para que los conteos del día y los "últimos N" no recorran el historial
+CREATE INDEX IF NOT EXISTS idx_asistencias_fecha_oficina ON asistencias (fecha, oficina);
+CREATE INDEX IF NOT EXISTS idx_incapacidades_vigencia ON incapacidades (fecha_inicio, fecha_fin);
+CREATE INDEX IF NOT EXISTS idx_asistencias_timestamp ON asistencias (timestamp_sistema DESC);
+CREATE INDEX IF NOT EXISTS idx_permisos_estado ON permisos (estado);
+CREATE INDEX IF NOT EXISTS idx_permisos_timestamp ON permisos (timestamp_creacion DESC);
@@ -0,0 +1,39 @@
+-- Visor de auditoría (ver utils/auditoria.py): paginación keyset sobre (timestamp, id)
+-- y búsqueda de texto en detalles con índice de trigramas (ILIKE '%texto%')
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS idx_auditoria_timestamp_id ON auditoria ("timestamp" DESC, id DESC);
+-- El filtro de usuario no distingue mayúsculas: índice sobre lower(usuario)
+DROP INDEX IF EXISTS idx_auditoria_usuario;
+CREATE INDEX IF NOT EXISTS idx_auditoria_usuario_lower ON auditoria (lower(usuario), "timestamp" DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_auditoria_modulo_accion ON auditoria (modulo, accion, "timestamp" DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_auditoria_detalles_trgm ON auditoria USING gin (detalles gin_trgm_ops);
+
+-- Una página del log, de más reciente a más antiguo, después del cursor (timestamp, id)
+-- Los parámetros de fecha toman el tipo de la columna (texto ISO o timestamp)
+-- p_texto llega con los comodines de LIKE ya escapados
+CREATE OR REPLACE FUNCTION auditoria_pagina(
+    p_desde auditoria."timestamp"%TYPE,
+    p_hasta auditoria."timestamp"%TYPE,
+    p_usuario TEXT DEFAULT NULL,
+    p_modulo TEXT DEFAULT NULL,
+    p_accion TEXT DEFAULT NULL,
+    p_texto TEXT DEFAULT NULL,
+    p_cursor_ts auditoria."timestamp"%TYPE DEFAULT NULL,
+    p_cursor_id auditoria.id%TYPE DEFAULT NULL,
+    p_limite INTEGER DEFAULT 50
+)
+RETURNS SETOF auditoria
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT * FROM auditoria a
+     WHERE a."timestamp" >= p_desde AND a."timestamp" < p_hasta
+       AND (p_usuario IS NULL OR lower(a.usuario) = lower(p_usuario))
+       AND (p_modulo IS NULL OR a.modulo = p_modulo)
+       AND (p_accion IS NULL OR a.accion = p_accion)
+       AND (p_texto IS NULL OR a.detalles ILIKE '%' || p_texto || '%')
+       AND (p_cursor_ts IS NULL OR (a."timestamp", a.id) < (p_cursor_ts, p_cursor_id))
+     ORDER BY a."timestamp" DESC, a.id DESC
+     LIMIT p_limite;
+$$;
@@ -0,0 +1,26 @@
+-- Revocar todos los tokens de sesión de un usuario (ver auth.py) cuando se desactiva,
+-- se borra o cambian su rol, oficina o contraseña: el token guarda rol y oficina y no
+-- vuelve a consultar usuarios hasta expirar.
+-- La revocación dura lo mismo que un token (DURACION_TOKEN en utils/tokens_sesion.py).
+CREATE OR REPLACE FUNCTION revocar_sesiones_usuario()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    IF TG_OP = 'DELETE'
+       OR NEW.activo IS DISTINCT FROM OLD.activo
+       OR NEW.rol IS DISTINCT FROM OLD.rol
+       OR NEW.oficina_asignada IS DISTINCT FROM OLD.oficina_asignada
+       OR NEW.password_hash IS DISTINCT FROM OLD.password_hash
+       OR lower(NEW.email) IS DISTINCT FROM lower(OLD.email) THEN
+        INSERT INTO sesiones_revocadas (jti, email, revocado_en, expira, motivo)
+        VALUES (NULL, lower(OLD.email), now(), now() + interval '8 hours', 'cambio de usuario');
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_usuarios_revocar_sesiones ON usuarios;
+CREATE TRIGGER trg_usuarios_revocar_sesiones
+    AFTER UPDATE OR DELETE ON usuarios
+    FOR EACH ROW EXECUTE FUNCTION revocar_sesiones_usuario();
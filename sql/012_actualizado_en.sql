@@ -0,0 +1,25 @@
+-- Marca de última modificación por registro: la mantiene un trigger, así que
+-- también cuenta las ediciones hechas fuera de la app (consola, scripts, API).
+-- DualManager.marca_agua la usa como huella de los datos (caché de reportes, bonos).
+CREATE OR REPLACE FUNCTION marcar_actualizado_en()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    NEW.actualizado_en := now();
+    RETURN NEW;
+END;
+$$;
+
+DO $$
+DECLARE
+    v_tabla TEXT;
+BEGIN
+    FOREACH v_tabla IN ARRAY ARRAY['empleados', 'asistencias', 'permisos', 'incapacidades', 'bonos'] LOOP
+        EXECUTE format('ALTER TABLE %I ADD COLUMN IF NOT EXISTS actualizado_en TIMESTAMPTZ NOT NULL DEFAULT now()', v_tabla);
+        EXECUTE format('DROP TRIGGER IF EXISTS trg_%s_actualizado_en ON %I', v_tabla, v_tabla);
+        EXECUTE format('CREATE TRIGGER trg_%s_actualizado_en BEFORE UPDATE ON %I '
+                       'FOR EACH ROW EXECUTE FUNCTION marcar_actualizado_en()', v_tabla, v_tabla);
+    END LOOP;
+END;
+$$;
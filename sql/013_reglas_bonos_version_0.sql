@@ -0,0 +1,23 @@
+-- Congelar la configuración anterior a las reglas versionadas como versión 0 real.
+-- Los bonos existentes tienen version_reglas = 0 (ver 006); sin esta fila la versión 0
+-- se derivaba de config_bonos, que puede cambiar y alterar bonos ya reproducibles.
+-- Los valores por defecto son los de CONFIG_BONOS_DEFECTO (utils/reglas_bonos.py).
+INSERT INTO reglas_bonos (version, reglas, descripcion, creado_por)
+SELECT 0,
+       jsonb_build_object(
+           'bono_base', COALESCE(c.bono_base::text::numeric, 1000),
+           'asistencias_minimas', COALESCE(c.asistencias_minimas::text::numeric::integer, 20),
+           'penalizaciones', jsonb_build_object(
+               'retardos', COALESCE(c.penalizacion_retardo::text::numeric, 50),
+               'ausentes', COALESCE(c.penalizacion_ausencia::text::numeric, 200)
+           ),
+           'niveles', '[]'::jsonb,
+           'bono_sabado', 0,
+           'incapacidad_cuenta_asistencia', false,
+           'tope', NULL
+       ),
+       'Configuración de config_bonos al versionar las reglas',
+       'migracion'
+  FROM (SELECT 1) AS base
+  LEFT JOIN LATERAL (SELECT * FROM config_bonos LIMIT 1) AS c ON true
+ON CONFLICT (version) DO NOTHING;
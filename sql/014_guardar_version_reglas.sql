@@ -0,0 +1,24 @@
+-- Versión nueva de reglas de bonos con el número asignado en el servidor.
+-- version es la llave primaria: si dos guardados calculan el mismo max + 1, el
+-- segundo choca con unique_violation y reintenta con el siguiente número.
+CREATE OR REPLACE FUNCTION guardar_version_reglas(p_reglas JSONB, p_creado_por TEXT, p_descripcion TEXT)
+RETURNS JSONB
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_fila reglas_bonos%ROWTYPE;
+BEGIN
+    LOOP
+        BEGIN
+            INSERT INTO reglas_bonos (version, reglas, descripcion, creado_por)
+            SELECT COALESCE(max(version), 0) + 1, p_reglas, p_descripcion, p_creado_por
+              FROM reglas_bonos
+            RETURNING * INTO v_fila;
+
+            RETURN to_jsonb(v_fila);
+        EXCEPTION WHEN unique_violation THEN
+            -- Otra sesión tomó el mismo número: reintentar
+        END;
+    END LOOP;
+END;
+$$;
@@ -0,0 +1,62 @@
+import calendar
+import numpy as np
+import pandas as pd
+import pytest
+from modules.bonos import calcular_monto_bono
+from utils.motor_bonos import calcular_bonos
+from utils.reglas_bonos import CONFIG_BONOS_DEFECTO, reglas_desde_config
+
+AÑO, MES = 2024, 3
+
+def datos_sinteticos(n_empleados=300, semilla=7):
+    """Empleados y asistencias aleatorias del mes (más días sueltos fuera del mes)"""
+    rng = np.random.default_rng(semilla)
+    df_empleados = pd.DataFrame({
+        'id_empleado': [f"E{i:04d}" for i in range(n_empleados)],
+        'nombre_completo': [f"Empleado {i}" for i in range(n_empleados)],
+        'oficina': rng.choice(["Centro", "Norte", "Sur"], n_empleados)
+    })
+
+    estados = ['Presente', 'Retardo', 'Ausente', 'Permiso', 'Incapacidad']
+    dias = pd.date_range(f"{AÑO}-{MES:02d}-01", periods=calendar.monthrange(AÑO, MES)[1]).strftime("%Y-%m-%d")
+    fuera = ["2024-02-29", "2024-04-01"]
+
+    filas = []
+    for id_empleado in df_empleados['id_empleado']:
+        # Perfiles distintos para que haya empleados de ambos lados del mínimo
+        pesos = rng.dirichlet([8, 1, 1, 0.5, 0.5])
+        registrados = rng.random() < 0.95
+        for fecha in list(dias) + fuera:
+            if registrados and rng.random() < 0.9:
+                filas.append({'id_empleado': id_empleado, 'fecha': fecha, 'estado': rng.choice(estados, p=pesos)})
+
+    return df_empleados, pd.DataFrame(filas)
+
+@pytest.mark.parametrize("config", [
+    CONFIG_BONOS_DEFECTO,
+    {'bono_base': 1500, 'penalizacion_retardo': 75, 'penalizacion_ausencia': 300, 'asistencias_minimas': 18},
+])
+def test_motor_vectorizado_igual_a_formula_escalar(config):
+    df_empleados, df_asistencias = datos_sinteticos()
+
+    resultado = calcular_bonos(df_empleados, df_asistencias, reglas_desde_config(config), AÑO, MES)
+
+    # Oráculo: conteo y fórmula escalar por empleado, sin pasar por el motor
+    del_mes = df_asistencias[df_asistencias['fecha'].str.startswith(f"{AÑO}-{MES:02d}")]
+    conteos = del_mes.groupby(['id_empleado', 'estado']).size().unstack(fill_value=0)
+    esperado = {
+        id_empleado: calcular_monto_bono(
+            conteos.at[id_empleado, 'Presente'] if id_empleado in conteos.index else 0,
+            conteos.at[id_empleado, 'Retardo'] if id_empleado in conteos.index else 0,
+            conteos.at[id_empleado, 'Ausente'] if id_empleado in conteos.index else 0,
+            config
+        )
+        for id_empleado in df_empleados['id_empleado']
+    }
+
+    assert len(resultado) == len(df_empleados)
+    montos = resultado.set_index('id_empleado')['monto_bono']
+    diferencias = {e: (montos[e], m) for e, m in esperado.items() if not np.isclose(montos[e], m)}
+    assert not diferencias
+    # Los datos cubren ambos casos: con y sin bono
+    assert (montos > 0).any() and (montos == 0).any()
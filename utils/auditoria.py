@@ -0,0 +1,70 @@
+from datetime import timedelta
+
+# Registros por página del visor
+TAMAÑO_PAGINA_AUDITORIA = 50
+
+# Valores de la columna modulo que escribe la app
+MODULOS_AUDITORIA = ["autenticacion", "asistencias", "permisos", "incapacidades", "bonos", "reportes"]
+
+# El índice de trigramas solo ayuda con 3 caracteres o más
+LONGITUD_MINIMA_BUSQUEDA = 3
+
+COLUMNAS_AUDITORIA = "id, timestamp, usuario, accion, modulo, detalles, ip"
+
+def escapar_like(texto):
+    """Texto literal para un patrón LIKE/ILIKE (escapa \\, % y _)"""
+    return texto.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+def consultar_auditoria(manager, desde, hasta, usuario=None, modulo=None, accion=None, texto=None,
+                        cursor=None, limite=TAMAÑO_PAGINA_AUDITORIA):
+    """Una página del log de auditoría, de más reciente a más antiguo
+
+    Paginación keyset: cursor es (timestamp, id) del último registro de la
+    página anterior y la siguiente empieza justo después, sin OFFSET, así que
+    cualquier página cuesta lo mismo aunque la tabla crezca. Usa la función
+    SQL auditoria_pagina (sql/010_auditoria_indices.sql); si no está instalada,
+    arma la misma consulta con filtros de PostgREST. El usuario se compara sin
+    distinguir mayúsculas.
+    Retorna (filas, siguiente_cursor); siguiente_cursor es None en la última página.
+    """
+    hasta_exclusivo = str(hasta + timedelta(days=1))
+    patron = escapar_like(texto.strip()) if texto and texto.strip() else None
+
+    # Se pide un registro extra para saber si hay otra página
+    disponible, filas = manager._rpc('auditoria_pagina', {
+        'p_desde': str(desde),
+        'p_hasta': hasta_exclusivo,
+        'p_usuario': usuario or None,
+        'p_modulo': modulo or None,
+        'p_accion': accion or None,
+        'p_texto': patron,
+        'p_cursor_ts': cursor[0] if cursor else None,
+        'p_cursor_id': cursor[1] if cursor else None,
+        'p_limite': limite + 1
+    })
+
+    if not disponible:
+        query = manager.supabase.table("auditoria").select(COLUMNAS_AUDITORIA) \
+            .gte('timestamp', str(desde)) \
+            .lt('timestamp', hasta_exclusivo)
+        if usuario:
+            # ilike sin comodines: igualdad sin distinguir mayúsculas
+            query = query.ilike('usuario', escapar_like(usuario))
+        if modulo:
+            query = query.eq('modulo', modulo)
+        if accion:
+            query = query.eq('accion', accion)
+        if patron:
+            query = query.ilike('detalles', f"%{patron}%")
+        if cursor:
+            # (timestamp, id) < cursor, expandido porque PostgREST no compara tuplas
+            query = query.or_(f'timestamp.lt."{cursor[0]}",and(timestamp.eq."{cursor[0]}",id.lt.{cursor[1]})')
+
+        filas = query.order('timestamp', desc=True).order('id', desc=True).limit(limite + 1).execute().data
+
+    filas = filas or []
+    if len(filas) <= limite:
+        return filas, None
+
+    filas = filas[:limite]
+    return filas, (filas[-1]['timestamp'], filas[-1]['id'])
@@ -0,0 +1,167 @@
+import pandas as pd
+from utils.intervalos import expandir_intervalos
+
+# Estados de asistencia que implican que el empleado trabajó ese día
+ESTADOS_TRABAJADOS = ['Presente', 'Retardo']
+
+COLUMNAS_CONFLICTOS = ['tipo_conflicto', 'id_empleado', 'oficina', 'fecha_inicio', 'fecha_fin', 'dias', 'detalle',
+                       'id_permiso', 'id_incapacidad']
+
+# Identidad de un conflicto (sin el detalle, que cambia con el estado del permiso)
+CLAVE_CONFLICTO = ['tipo_conflicto', 'id_empleado', 'id_permiso', 'id_incapacidad', 'fecha_inicio', 'fecha_fin']
+
+# Columnas que usa el motor por tabla, y columnas de inicio/fin de cada registro
+COLUMNAS_VENTANA = {
+    'permisos': ("id, id_empleado, oficina, estado, fecha_inicio, fecha_fin", 'fecha_inicio', 'fecha_fin'),
+    'incapacidades': ("id, id_empleado, oficina, tipo, fecha_inicio, fecha_fin", 'fecha_inicio', 'fecha_fin'),
+    'asistencias': ("id_empleado, fecha, estado", 'fecha', 'fecha'),
+}
+
+def _filtrar_empleados(df, ids_empleado):
+    """Restringe un DataFrame a ciertos empleados (None = todos)"""
+    if ids_empleado is None or df.empty:
+        return df
+    return df[df['id_empleado'].isin(list(ids_empleado))]
+
+def _agrupar_dias(df_dias, claves, tipo, detalle):
+    """Colapsa días en conflicto a un rango por par de registros"""
+    if df_dias.empty:
+        return pd.DataFrame(columns=COLUMNAS_CONFLICTOS)
+
+    conflictos = df_dias.groupby(claves, as_index=False).agg(
+        fecha_inicio=('fecha', 'min'),
+        fecha_fin=('fecha', 'max'),
+        dias=('fecha', 'count')
+    )
+    conflictos['tipo_conflicto'] = tipo
+    conflictos['fecha_inicio'] = conflictos['fecha_inicio'].dt.strftime('%Y-%m-%d')
+    conflictos['fecha_fin'] = conflictos['fecha_fin'].dt.strftime('%Y-%m-%d')
+    conflictos['detalle'] = detalle(conflictos)
+    return conflictos.reindex(columns=COLUMNAS_CONFLICTOS)
+
+def detectar_conflictos(df_permisos, df_incapacidades, df_asistencias, ids_empleado=None):
+    """Detecta cruces entre permisos, incapacidades y asistencias
+
+    Los permisos e incapacidades se expanden a días y se cruzan por
+    (id_empleado, fecha) con joins hash, así que el costo crece con el total de
+    días de ausencia, no con el producto de registros. Conflictos detectados:
+    - Permiso (no rechazado) que se cruza con una incapacidad
+    - Asistencia Presente/Retardo en un día con permiso aprobado
+    - Asistencia Presente/Retardo en un día con incapacidad
+    """
+    df_permisos = _filtrar_empleados(df_permisos, ids_empleado)
+    df_incapacidades = _filtrar_empleados(df_incapacidades, ids_empleado)
+    df_asistencias = _filtrar_empleados(df_asistencias, ids_empleado)
+
+    if not df_permisos.empty:
+        df_permisos = df_permisos[df_permisos['estado'] != 'Rechazado']
+
+    dias_permiso = expandir_intervalos(df_permisos, columnas=['id', 'id_empleado', 'oficina', 'estado']) \
+        .rename(columns={'id': 'id_permiso'})
+    dias_incapacidad = expandir_intervalos(df_incapacidades, columnas=['id', 'id_empleado', 'oficina', 'tipo']) \
+        .rename(columns={'id': 'id_incapacidad'})
+
+    resultados = []
+
+    # Permiso vs incapacidad
+    if not dias_permiso.empty and not dias_incapacidad.empty:
+        cruce = dias_permiso.merge(
+            dias_incapacidad[['id_incapacidad', 'id_empleado', 'tipo', 'fecha']],
+            on=['id_empleado', 'fecha']
+        )
+        resultados.append(_agrupar_dias(
+            cruce,
+            ['id_permiso', 'id_incapacidad', 'id_empleado', 'oficina', 'estado', 'tipo'],
+            "Permiso / Incapacidad",
+            lambda c: "Permiso " + c['estado'].astype(str) + " #" + c['id_permiso'].astype(str)
+                      + " cruza incapacidad " + c['tipo'].astype(str) + " #" + c['id_incapacidad'].astype(str)
+        ))
+
+    # Asistencias trabajadas dentro de ausencias
+    if not df_asistencias.empty:
+        trabajadas = df_asistencias.loc[
+            df_asistencias['estado'].isin(ESTADOS_TRABAJADOS),
+            ['id_empleado', 'fecha', 'estado']
+        ].rename(columns={'estado': 'estado_asistencia'})
+        trabajadas['fecha'] = pd.to_datetime(trabajadas['fecha'], errors='coerce')
+
+        aprobados = dias_permiso[dias_permiso['estado'] == 'Aprobado'] if not dias_permiso.empty else dias_permiso
+        if not aprobados.empty and not trabajadas.empty:
+            cruce = trabajadas.merge(aprobados, on=['id_empleado', 'fecha'])
+            resultados.append(_agrupar_dias(
+                cruce,
+                ['id_permiso', 'id_empleado', 'oficina'],
+                "Asistencia en permiso",
+                lambda c: "Asistencia registrada durante permiso aprobado #" + c['id_permiso'].astype(str)
+            ))
+
+        if not dias_incapacidad.empty and not trabajadas.empty:
+            cruce = trabajadas.merge(dias_incapacidad, on=['id_empleado', 'fecha'])
+            resultados.append(_agrupar_dias(
+                cruce,
+                ['id_incapacidad', 'id_empleado', 'oficina', 'tipo'],
+                "Asistencia en incapacidad",
+                lambda c: "Asistencia registrada durante incapacidad " + c['tipo'].astype(str)
+                          + " #" + c['id_incapacidad'].astype(str)
+            ))
+
+    resultados = [r for r in resultados if not r.empty]
+    if not resultados:
+        return pd.DataFrame(columns=COLUMNAS_CONFLICTOS)
+
+    return pd.concat(resultados, ignore_index=True) \
+        .sort_values(['oficina', 'fecha_inicio'], ascending=[True, False]) \
+        .reset_index(drop=True)
+
+def resumen_por_oficina(df_conflictos):
+    """Conteo de conflictos por oficina y tipo"""
+    if df_conflictos.empty:
+        return pd.DataFrame()
+    return pd.crosstab(df_conflictos['oficina'], df_conflictos['tipo_conflicto'], margins=True, margins_name='Total')
+
+def obtener_conflictos(manager):
+    """Conflictos de todo el historial, compartidos y ligados a la versión de datos"""
+    return manager.get_derivado(
+        "conflictos",
+        ("permisos", "incapacidades", "asistencias"),
+        lambda: detectar_conflictos(*manager.get_many(["permisos", "incapacidades", "asistencias"]).values())
+    )
+
+def cargar_ventana(manager, ids_empleado, desde, hasta):
+    """Registros de esos empleados que tocan [desde, hasta] (filtrados en el servidor)"""
+    datos = {}
+    for tabla, (columnas, col_inicio, col_fin) in COLUMNAS_VENTANA.items():
+        response = manager.supabase.table(tabla).select(columnas) \
+            .in_('id_empleado', ids_empleado) \
+            .lte(col_inicio, hasta) \
+            .gte(col_fin, desde) \
+            .execute()
+        datos[tabla] = pd.DataFrame(response.data, columns=[c.strip() for c in columnas.split(',')])
+    return datos
+
+def _sin_registros(df, df_escritos, tabla):
+    """df sin los registros escritos (por id; asistencias por empleado y fecha)"""
+    claves = ['id'] if tabla != 'asistencias' else ['id_empleado', 'fecha']
+    escritos = pd.MultiIndex.from_frame(df_escritos[claves].astype(str))
+    return df[~pd.MultiIndex.from_frame(df[claves].astype(str)).isin(escritos)]
+
+def conflictos_nuevos(datos, tabla, df_escritos, df_anteriores=None):
+    """Conflictos que introducen los registros escritos en tabla
+
+    datos es la ventana ya con la escritura (ver cargar_ventana). El estado
+    previo es la misma ventana sin los registros escritos, más df_anteriores
+    cuando fueron actualizaciones (p. ej. los permisos antes de aprobarse): un
+    conflicto que ya existía no se reporta aunque cambie su detalle.
+    """
+    despues = detectar_conflictos(datos['permisos'], datos['incapacidades'], datos['asistencias'])
+
+    previos = dict(datos)
+    previos[tabla] = _sin_registros(datos[tabla], df_escritos, tabla)
+    if df_anteriores is not None and not df_anteriores.empty:
+        previos[tabla] = pd.concat(
+            [previos[tabla], df_anteriores.reindex(columns=previos[tabla].columns)], ignore_index=True
+        )
+    antes = detectar_conflictos(previos['permisos'], previos['incapacidades'], previos['asistencias'])
+
+    nuevos = despues.merge(antes[CLAVE_CONFLICTO].drop_duplicates(), on=CLAVE_CONFLICTO, how='left', indicator=True)
+    return nuevos[nuevos['_merge'] == 'left_only'].drop(columns='_merge').reset_index(drop=True)
@@ -0,0 +1,86 @@
+from datetime import date
+import streamlit as st
+from config import get_sheets_manager
+
+# Elementos por lista de "últimos N"
+LIMITE_LISTAS = 10
+
+# Tablas que lee el snapshot (su versión local forma parte de la clave de caché)
+TABLAS_SNAPSHOT = ("empleados", "asistencias", "permisos", "incapacidades")
+
+def oficina_alcance(user):
+    """Oficina a la que se limita el dashboard (None = todas)"""
+    return user.get('oficina') if user.get('rol') == 'registrador' else None
+
+def obtener_snapshot(user, hoy=None):
+    """Snapshot del dashboard para el alcance del usuario (cacheado unos segundos)"""
+    manager = get_sheets_manager()
+    hoy = hoy or date.today()
+    return _snapshot_cacheado(oficina_alcance(user), hoy.isoformat(), manager.version_datos(TABLAS_SNAPSHOT))
+
+@st.cache_data(ttl=30, show_spinner=False)
+def _snapshot_cacheado(oficina, hoy, version_datos):
+    """version_datos se incluye en la clave para refrescar tras escrituras locales"""
+    return construir_snapshot(get_sheets_manager(), oficina, hoy)
+
+def construir_snapshot(manager, oficina, hoy, limite=LIMITE_LISTAS):
+    """Contadores y listas del dashboard sin descargar tablas completas
+
+    Usa la función SQL dashboard_snapshot (sql/009_dashboard_snapshot.sql);
+    si no está instalada, la emula con consultas angostas (conteos head-only
+    y selects de pocas columnas con limit).
+    """
+    disponible, snapshot = manager._rpc('dashboard_snapshot', {
+        'p_oficina': oficina, 'p_hoy': hoy, 'p_limite': limite
+    })
+    if disponible:
+        return snapshot
+
+    supabase = manager.supabase
+
+    def alcance(query):
+        return query.eq('oficina', oficina) if oficina else query
+
+    def contar(tabla, filtro):
+        return filtro(alcance(supabase.table(tabla).select("id", count="exact", head=True))).execute().count or 0
+
+    # Empleados: solo dos columnas (crece con la plantilla, no con el historial)
+    empleados = alcance(supabase.table("empleados").select("oficina, activo")).execute().data
+
+    ultimas_asistencias = alcance(
+        supabase.table("asistencias").select("fecha, id_empleado, estado, oficina")
+    ).order('timestamp_sistema', desc=True).limit(limite).execute().data
+
+    permisos_recientes = alcance(
+        supabase.table("permisos").select("id_empleado, fecha_inicio, dias_solicitados, estado")
+    ).order('timestamp_creacion', desc=True).limit(limite).execute().data
+
+    incapacidades_activas = alcance(
+        supabase.table("incapacidades").select("id_empleado, tipo, fecha_inicio, fecha_fin, dias_totales", count="exact")
+    ).lte('fecha_inicio', hoy).gte('fecha_fin', hoy).order('fecha_inicio', desc=True).limit(limite).execute()
+
+    permisos_activos = alcance(
+        supabase.table("permisos").select("id_empleado")
+    ).eq('estado', 'Aprobado').lte('fecha_inicio', hoy).gte('fecha_fin', hoy).execute().data
+
+    # Nombres solo de los empleados que aparecen en las listas
+    ids = {f['id_empleado'] for f in ultimas_asistencias + permisos_recientes + incapacidades_activas.data}
+    nombres = {}
+    if ids:
+        response = supabase.table("empleados").select("id_empleado, nombre_completo").in_('id_empleado', list(ids)).execute()
+        nombres = {str(f['id_empleado']): f['nombre_completo'] for f in response.data}
+
+    def con_nombre(filas):
+        return [{'nombre_completo': nombres.get(str(f.pop('id_empleado'))), **f} for f in filas]
+
+    return {
+        'empleados_activos': sum(str(e['activo']).upper() == 'SI' for e in empleados),
+        'oficinas': len({e['oficina'] for e in empleados}),
+        'asistencias_hoy': contar("asistencias", lambda q: q.eq('fecha', hoy)),
+        'permisos_pendientes': contar("permisos", lambda q: q.eq('estado', 'Pendiente')),
+        'permisos_activos_hoy': len({f['id_empleado'] for f in permisos_activos}),
+        'incapacidades_activas_total': incapacidades_activas.count or 0,
+        'ultimas_asistencias': con_nombre(ultimas_asistencias),
+        'permisos_recientes': con_nombre(permisos_recientes),
+        'incapacidades_activas': con_nombre(incapacidades_activas.data)
+    }
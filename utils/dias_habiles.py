@@ -0,0 +1,104 @@
+from datetime import date, timedelta
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+
+# Lunes a viernes
+SEMANA_LABORAL = "1111100"
+
+# Años para los que se generan los festivos federales
+AÑOS_CALENDARIO = range(2000, 2051)
+
+def _n_lunes(año, mes, n):
+    """Retorna el n-ésimo lunes de un mes"""
+    primero = date(año, mes, 1)
+    desfase = (7 - primero.weekday()) % 7
+    return primero + timedelta(days=desfase + 7 * (n - 1))
+
+def festivos_federales(año):
+    """Días de descanso obligatorio en México (art. 74 LFT) para un año"""
+    festivos = [
+        (date(año, 1, 1), "Año Nuevo"),
+        (_n_lunes(año, 2, 1), "Día de la Constitución"),
+        (_n_lunes(año, 3, 3), "Natalicio de Benito Juárez"),
+        (date(año, 5, 1), "Día del Trabajo"),
+        (date(año, 9, 16), "Día de la Independencia"),
+        (_n_lunes(año, 11, 3), "Día de la Revolución"),
+        (date(año, 12, 25), "Navidad"),
+    ]
+
+    # Transmisión del Poder Ejecutivo Federal (cada 6 años desde 2024)
+    if año >= 2024 and (año - 2024) % 6 == 0:
+        festivos.append((date(año, 10, 1), "Transmisión del Poder Ejecutivo"))
+
+    return sorted(festivos)
+
+@lru_cache(maxsize=16)
+def construir_calendario(festivos_empresa=()):
+    """Construye un busdaycalendar con festivos federales + días de la empresa"""
+    festivos = [f for año in AÑOS_CALENDARIO for f, _ in festivos_federales(año)]
+    festivos.extend(festivos_empresa)
+    return np.busdaycalendar(
+        weekmask=SEMANA_LABORAL,
+        holidays=np.array(sorted(set(festivos)), dtype='datetime64[D]')
+    )
+
+def obtener_calendario(manager=None):
+    """Calendario laboral vigente (incluye la tabla dias_festivos si hay manager)"""
+    festivos_empresa = ()
+
+    if manager is not None:
+        df_festivos = manager.get_dataframe("dias_festivos")
+        if not df_festivos.empty and 'fecha' in df_festivos.columns:
+            fechas = pd.to_datetime(df_festivos['fecha'], errors='coerce').dropna()
+            festivos_empresa = tuple(sorted(set(fechas.dt.date)))
+
+    return construir_calendario(festivos_empresa)
+
+def _a_dias(fechas):
+    """Convierte fechas (escalares, listas, Series o strings) a datetime64[D]"""
+    if isinstance(fechas, (pd.Series, pd.Index)):
+        return pd.to_datetime(fechas).to_numpy().astype('datetime64[D]')
+    if isinstance(fechas, (str, date)):
+        return np.datetime64(pd.Timestamp(fechas).date(), 'D')
+    return np.asarray(pd.to_datetime(list(fechas)).date, dtype='datetime64[D]')
+
+def contar_dias_habiles(inicios, fines, calendario=None):
+    """Cuenta días hábiles entre inicio y fin (inclusive) para uno o muchos rangos
+
+    Acepta escalares o arreglos de igual longitud; los rangos invertidos cuentan 0.
+    """
+    calendario = calendario if calendario is not None else construir_calendario()
+
+    inicio = _a_dias(inicios)
+    fin = _a_dias(fines) + np.timedelta64(1, 'D')
+
+    dias = np.busday_count(inicio, fin, busdaycal=calendario)
+    return np.maximum(dias, 0)
+
+def dias_habiles_periodo(año, mes, calendario=None):
+    """Días hábiles de un mes completo (asistencias esperadas)"""
+    inicio = np.datetime64(f"{año}-{mes:02d}", 'M').astype('datetime64[D]')
+    fin = (np.datetime64(f"{año}-{mes:02d}", 'M') + 1).astype('datetime64[D]')
+    calendario = calendario if calendario is not None else construir_calendario()
+    return int(np.busday_count(inicio, fin, busdaycal=calendario))
+
+def festivos_del_año(año, manager=None):
+    """Listado de festivos (federales + empresa) de un año para mostrar"""
+    registros = [
+        {'fecha': f.strftime("%Y-%m-%d"), 'descripcion': desc, 'origen': 'Federal'}
+        for f, desc in festivos_federales(año)
+    ]
+
+    if manager is not None:
+        df_festivos = manager.get_dataframe("dias_festivos")
+        if not df_festivos.empty and 'fecha' in df_festivos.columns:
+            df_año = df_festivos[df_festivos['fecha'].astype(str).str.startswith(str(año))]
+            for _, row in df_año.iterrows():
+                registros.append({
+                    'fecha': str(row['fecha'])[:10],
+                    'descripcion': row.get('descripcion', ''),
+                    'origen': 'Empresa'
+                })
+
+    return pd.DataFrame(registros).sort_values('fecha').reset_index(drop=True)
@@ -1,5 +1,10 @@
 from datetime import datetime, date
 import pandas as pd
+import streamlit as st
+from streamlit.errors import StreamlitAPIException
+
+# Días de permiso por empleado al año
+DIAS_PERMISO_ANUALES = 9
 
 def format_date(date_obj):
     """Formatea fecha a string YYYY-MM-DD"""
@@ -49,19 +54,83 @@ def get_year_progress():
     
     return elapsed_days / total_days
 
+def calcular_ledger_permisos(df_permisos, df_empleados=None, años=None):
+    """Ledger de permisos: días usados y disponibles por empleado y año en una pasada
+    
+    Cada permiso aprobado descuenta sus dias_solicitados (lo que se descontó al
+    aprobarlo, no un recuento con el calendario de festivos actual); los de
+    fecha_inicio inválida se ignoran. Con df_empleados se incluyen todos los
+    empleados (aunque no tengan permisos) y el saldo registrado.
+    """
+    columnas = ['id_empleado', 'año', 'dias_usados', 'dias_disponibles']
+    
+    if df_permisos.empty:
+        aprobados = pd.DataFrame(columns=['id_empleado', 'año', 'dias'])
+    else:
+        aprobados = df_permisos.loc[df_permisos['estado'] == 'Aprobado', ['id_empleado', 'fecha_inicio', 'dias_solicitados']].copy()
+        aprobados['año'] = pd.to_numeric(aprobados['fecha_inicio'].astype(str).str[:4], errors='coerce')
+        aprobados = aprobados.dropna(subset=['año']).astype({'año': int})
+        aprobados['dias'] = pd.to_numeric(aprobados['dias_solicitados'], errors='coerce').fillna(0)
+    
+    if años is not None:
+        aprobados = aprobados[aprobados['año'].isin(list(años))]
+    
+    ledger = aprobados.groupby(['id_empleado', 'año'], as_index=False)['dias'].sum() \
+        .rename(columns={'dias': 'dias_usados'})
+    
+    if df_empleados is not None and not df_empleados.empty:
+        # Todos los empleados x años solicitados (sin permisos = 0 usados)
+        años_ledger = list(años) if años is not None else sorted(ledger['año'].unique().tolist()) or [get_current_year()]
+        base = df_empleados[['id_empleado', 'dias_permiso_disponibles']].merge(
+            pd.DataFrame({'año': años_ledger}), how='cross'
+        )
+        ledger = base.merge(ledger, on=['id_empleado', 'año'], how='left')
+        ledger['dias_usados'] = ledger['dias_usados'].fillna(0)
+        columnas = columnas + ['dias_permiso_disponibles', 'diferencia']
+    
+    ledger['dias_usados'] = ledger['dias_usados'].astype(int)
+    ledger['dias_disponibles'] = (DIAS_PERMISO_ANUALES - ledger['dias_usados']).clip(lower=0)
+    
+    if 'dias_permiso_disponibles' in ledger.columns:
+        ledger['diferencia'] = ledger['dias_permiso_disponibles'].fillna(0).astype(int) - ledger['dias_disponibles']
+    
+    return ledger[columnas]
+
 def calculate_permisos_disponibles(id_empleado, df_permisos):
     """Calcula días de permiso disponibles para un empleado"""
     year = get_current_year()
     
-    # Filtrar permisos aprobados del año actual
-    permisos_year = df_permisos[
-        (df_permisos['id_empleado'] == id_empleado) &
-        (df_permisos['estado'] == 'Aprobado') &
-        (pd.to_datetime(df_permisos['fecha_inicio']).dt.year == year)
-    ]
+    if df_permisos.empty:
+        return DIAS_PERMISO_ANUALES
+    
+    ledger = calcular_ledger_permisos(df_permisos, años=[year])
+    fila = ledger[ledger['id_empleado'] == id_empleado]
+    return int(fila['dias_disponibles'].iloc[0]) if not fila.empty else DIAS_PERMISO_ANUALES
+
+def reconciliar_saldos_permisos(sheets_manager, año=None, guardar=True):
+    """Job de saldos: recalcula y guarda dias_permiso_disponibles de todos los empleados
+    
+    Para el año en curso corrige saldos desviados; ejecutado al iniciar el año
+    funciona como reinicio a 9 días (menos permisos ya aprobados para ese año).
+    Con guardar=False solo calcula. Retorna el ledger y el número de empleados desviados.
+    """
+    año = año or get_current_year()
     
-    dias_usados = permisos_year['dias_solicitados'].sum() if not permisos_year.empty else 0
-    return max(0, 9 - dias_usados)
+    datos = sheets_manager.get_many(["empleados", "permisos"])
+    df_empleados, df_permisos = datos["empleados"], datos["permisos"]
+    
+    if df_empleados.empty:
+        return pd.DataFrame(), 0
+    
+    ledger = calcular_ledger_permisos(df_permisos, df_empleados, años=[año])
+    desviados = ledger[ledger['diferencia'] != 0]
+    
+    if guardar and not desviados.empty:
+        sheets_manager.actualizar_saldos_permisos(
+            dict(zip(desviados['id_empleado'].tolist(), desviados['dias_disponibles'].astype(int).tolist()))
+        )
+    
+    return ledger, len(desviados)
 
 def calculate_sabados_trabajados(id_empleado, df_asistencias, periodo=None):
     """Calcula sábados trabajados por un empleado"""
@@ -89,9 +158,10 @@ def get_employee_stats(id_empleado, sheets_manager):
     year = get_current_year()
     
     # Obtener datos
-    df_asistencias = sheets_manager.get_dataframe("asistencias")
-    df_permisos = sheets_manager.get_dataframe("permisos")
-    df_incapacidades = sheets_manager.get_dataframe("incapacidades")
+    datos = sheets_manager.get_many(["asistencias", "permisos", "incapacidades"])
+    df_asistencias = datos["asistencias"]
+    df_permisos = datos["permisos"]
+    df_incapacidades = datos["incapacidades"]
     
     # Filtrar por empleado y año actual
     asistencias_year = df_asistencias[
@@ -139,4 +209,11 @@ def get_empleados_by_oficina(oficina, sheets_manager):
         (df_empleados['oficina'] == oficina) &
         (df_empleados['activo'] == 'SI')
     ]
-    return empleados.sort_values('nombre_completo')
\ No newline at end of file
+    return empleados.sort_values('nombre_completo')
+
+def recargar_seccion():
+    """Volver a ejecutar solo el fragmento actual (st.fragment); todo el script si no hay uno"""
+    try:
+        st.rerun(scope="fragment")
+    except StreamlitAPIException:
+        st.rerun()
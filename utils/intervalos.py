@@ -0,0 +1,240 @@
+from bisect import bisect_left, bisect_right
+from datetime import date, timedelta
+import numpy as np
+import pandas as pd
+
+# Ventana de fechas que cubre el índice de ausencias activas (días antes/después de hoy)
+VENTANA_ATRAS = 400
+VENTANA_ADELANTE = 90
+
+def _ordinal(fecha):
+    """Convierte fecha (date o 'YYYY-MM-DD') a entero ordinal para comparar rápido"""
+    if isinstance(fecha, date):
+        return fecha.toordinal()
+    return pd.Timestamp(fecha).date().toordinal()
+
+def expandir_intervalos(df, col_inicio='fecha_inicio', col_fin='fecha_fin', columnas=None, desde=None, hasta=None):
+    """Expande intervalos [inicio, fin] a una fila por día, sin ciclos por registro
+
+    Opcionalmente recorta cada intervalo a [desde, hasta]. Retorna las columnas
+    pedidas más 'fecha' (datetime64).
+    """
+    columnas = list(columnas or [])
+    if df.empty:
+        return pd.DataFrame(columns=columnas + ['fecha'])
+
+    inicio = pd.to_datetime(df[col_inicio], errors='coerce').to_numpy().astype('datetime64[D]')
+    fin = pd.to_datetime(df[col_fin], errors='coerce').to_numpy().astype('datetime64[D]')
+
+    if desde is not None:
+        inicio = np.maximum(inicio, np.datetime64(pd.Timestamp(desde).date(), 'D'))
+    if hasta is not None:
+        fin = np.minimum(fin, np.datetime64(pd.Timestamp(hasta).date(), 'D'))
+
+    validos = ~(np.isnat(inicio) | np.isnat(fin)) & (fin >= inicio)
+    inicio, fin = inicio[validos], fin[validos]
+    duracion = (fin - inicio).astype(int) + 1
+
+    # Desfase de cada día dentro de su intervalo: 0, 1, ..., duracion-1
+    filas = np.repeat(np.arange(len(inicio)), duracion)
+    desfase = np.arange(duracion.sum()) - np.repeat(np.cumsum(duracion) - duracion, duracion)
+
+    expandido = df.loc[validos, columnas].iloc[filas].reset_index(drop=True)
+    expandido['fecha'] = (inicio[filas] + desfase.astype('timedelta64[D]')).astype('datetime64[ns]')
+    return expandido
+
+class IndiceIntervalos:
+    """Índice de intervalos [inicio, fin] por empleado con consultas de solapamiento O(log n)
+
+    Por empleado guarda los intervalos ordenados por inicio y el máximo acumulado
+    de los fines; un intervalo se cruza con la consulta si empieza antes de su fin
+    y el máximo acumulado hasta ahí alcanza su inicio. Una inserción arma listas
+    nuevas del empleado y reemplaza su entrada completa, así una búsqueda desde
+    otra sesión nunca ve las listas a medio actualizar.
+    """
+
+    def __init__(self):
+        self._por_empleado = {}  # id_empleado -> {'inicios', 'fines', 'max_fin', 'etiquetas'}
+
+    @classmethod
+    def desde_dataframes(cls, df_permisos, df_incapacidades):
+        """Construir índice de ausencias (permisos no rechazados + incapacidades)"""
+        indice = cls()
+        partes = []
+
+        if not df_permisos.empty:
+            df = df_permisos[df_permisos['estado'] != 'Rechazado']
+            partes.append(pd.DataFrame({
+                'id_empleado': df['id_empleado'].astype(str),
+                'inicio': pd.to_datetime(df['fecha_inicio']),
+                'fin': pd.to_datetime(df['fecha_fin']),
+                'etiqueta': "Permiso " + df['estado'].astype(str) + " (" + df['fecha_inicio'].astype(str) + " a " + df['fecha_fin'].astype(str) + ")"
+            }))
+
+        if not df_incapacidades.empty:
+            df = df_incapacidades
+            partes.append(pd.DataFrame({
+                'id_empleado': df['id_empleado'].astype(str),
+                'inicio': pd.to_datetime(df['fecha_inicio']),
+                'fin': pd.to_datetime(df['fecha_fin']),
+                'etiqueta': "Incapacidad " + df['tipo'].astype(str) + " (" + df['fecha_inicio'].astype(str) + " a " + df['fecha_fin'].astype(str) + ")"
+            }))
+
+        if not partes:
+            return indice
+
+        df_intervalos = pd.concat(partes, ignore_index=True).dropna(subset=['inicio', 'fin'])
+        # Ordinales de fecha (días desde 0001-01-01), igual que date.toordinal()
+        df_intervalos['inicio'] = df_intervalos['inicio'].map(pd.Timestamp.toordinal)
+        df_intervalos['fin'] = df_intervalos['fin'].map(pd.Timestamp.toordinal)
+        df_intervalos = df_intervalos.sort_values(['id_empleado', 'inicio'])
+
+        for id_empleado, grupo in df_intervalos.groupby('id_empleado', sort=False):
+            fines = grupo['fin'].tolist()
+            indice._por_empleado[id_empleado] = {
+                'inicios': grupo['inicio'].tolist(),
+                'fines': fines,
+                'max_fin': grupo['fin'].cummax().tolist(),
+                'etiquetas': grupo['etiqueta'].tolist()
+            }
+
+        return indice
+
+    def agregar(self, id_empleado, fecha_inicio, fecha_fin, etiqueta):
+        """Insertar un intervalo manteniendo el orden (O(n) del empleado, copia incluida)"""
+        actual = self._por_empleado.get(str(id_empleado)) or {'inicios': [], 'fines': [], 'max_fin': [], 'etiquetas': []}
+        datos = {clave: list(valores) for clave, valores in actual.items()}
+        inicio, fin = _ordinal(fecha_inicio), _ordinal(fecha_fin)
+
+        pos = bisect_right(datos['inicios'], inicio)
+        datos['inicios'].insert(pos, inicio)
+        datos['fines'].insert(pos, fin)
+        datos['etiquetas'].insert(pos, etiqueta)
+
+        # Recalcular el máximo acumulado desde la posición insertada
+        previo = datos['max_fin'][pos - 1] if pos > 0 else fin
+        datos['max_fin'][pos:] = []
+        for f in datos['fines'][pos:]:
+            previo = max(previo, f)
+            datos['max_fin'].append(previo)
+
+        self._por_empleado[str(id_empleado)] = datos
+
+    def agregar_registro(self, tabla, registro):
+        """Actualizar el índice con un registro recién insertado (ver DualManager.registrar_insercion)"""
+        if tabla == "permisos" and registro.get('estado') != 'Rechazado':
+            etiqueta = f"Permiso {registro.get('estado')} ({registro['fecha_inicio']} a {registro['fecha_fin']})"
+        elif tabla == "incapacidades":
+            etiqueta = f"Incapacidad {registro.get('tipo')} ({registro['fecha_inicio']} a {registro['fecha_fin']})"
+        else:
+            return
+        self.agregar(registro['id_empleado'], registro['fecha_inicio'], registro['fecha_fin'], etiqueta)
+
+    def buscar_solapamiento(self, id_empleado, fecha_inicio, fecha_fin):
+        """Retorna la etiqueta de un intervalo que se cruza con el rango, o None"""
+        datos = self._por_empleado.get(str(id_empleado))
+        if not datos:
+            return None
+
+        inicio, fin = _ordinal(fecha_inicio), _ordinal(fecha_fin)
+
+        # Candidatos: intervalos que empiezan a más tardar en 'fin'
+        limite = bisect_right(datos['inicios'], fin)
+        if limite == 0 or datos['max_fin'][limite - 1] < inicio:
+            return None
+
+        # Primer candidato cuyo máximo acumulado alcanza 'inicio' (su propio fin lo alcanza)
+        pos = bisect_left(datos['max_fin'], inicio, 0, limite)
+        return datos['etiquetas'][pos]
+
+class IndiceAusenciasActivas:
+    """Quién está ausente (incapacidad o permiso aprobado) por fecha y oficina
+
+    Diccionario fecha -> oficina -> {id_empleado: info}, precalculado para una
+    ventana alrededor de hoy; cada consulta es una búsqueda directa. Se comparte
+    entre sesiones: una inserción reemplaza el diccionario de cada fecha que
+    toca por una copia actualizada, nunca modifica uno ya publicado.
+    """
+
+    def __init__(self, desde, hasta):
+        self.desde = desde
+        self.hasta = hasta
+        self._por_fecha = {}
+
+    @classmethod
+    def desde_dataframes(cls, df_permisos, df_incapacidades, hoy=None):
+        """Construir índice para [hoy - VENTANA_ATRAS, hoy + VENTANA_ADELANTE]"""
+        hoy = hoy or date.today()
+        indice = cls(hoy - timedelta(days=VENTANA_ATRAS), hoy + timedelta(days=VENTANA_ADELANTE))
+
+        if not df_permisos.empty:
+            aprobados = df_permisos[df_permisos['estado'] == 'Aprobado'].assign(ausencia='Permiso', tipo='Permiso')
+            indice._agregar_dias(aprobados)
+
+        # Las incapacidades van después: prevalecen sobre un permiso el mismo día
+        if not df_incapacidades.empty:
+            indice._agregar_dias(df_incapacidades.assign(ausencia='Incapacidad'))
+
+        return indice
+
+    def _agregar_dias(self, df):
+        """Expandir registros a días dentro de la ventana y cargarlos al diccionario"""
+        columnas = ['id', 'id_empleado', 'oficina', 'ausencia', 'tipo', 'fecha_inicio', 'fecha_fin']
+        dias = expandir_intervalos(df, columnas=columnas, desde=self.desde, hasta=self.hasta)
+        if dias.empty:
+            return
+
+        dias['fecha'] = dias['fecha'].dt.date
+        for fecha, grupo in dias.groupby('fecha', sort=False):
+            por_oficina = {oficina: dict(ausentes) for oficina, ausentes in self._por_fecha.get(fecha, {}).items()}
+            for fila in grupo.itertuples(index=False):
+                por_oficina.setdefault(fila.oficina, {})[str(fila.id_empleado)] = {
+                    'id': fila.id,
+                    'ausencia': fila.ausencia,
+                    'tipo': fila.tipo,
+                    'fecha_inicio': fila.fecha_inicio,
+                    'fecha_fin': fila.fecha_fin
+                }
+            self._por_fecha[fecha] = por_oficina
+
+    def agregar_registro(self, tabla, registro):
+        """Actualizar con una incapacidad o permiso aprobado recién insertado"""
+        if tabla == "incapacidades":
+            self._agregar_dias(pd.DataFrame([registro]).assign(ausencia='Incapacidad'))
+        elif tabla == "permisos" and registro.get('estado') == 'Aprobado':
+            self._agregar_dias(pd.DataFrame([registro]).assign(ausencia='Permiso', tipo='Permiso'))
+
+    def cubre(self, fecha):
+        """¿La fecha está dentro de la ventana precalculada?"""
+        return self.desde <= fecha <= self.hasta
+
+    def en_fecha(self, fecha, oficina=None):
+        """Ausentes en una fecha ({id_empleado: info}); con oficina es O(1)"""
+        por_oficina = self._por_fecha.get(fecha, {})
+        if oficina is not None:
+            return por_oficina.get(oficina, {})
+
+        todos = {}
+        for ausentes in por_oficina.values():
+            todos.update(ausentes)
+        return todos
+
+def obtener_indice_ausencias_activas(manager):
+    """Índice de ausencias activas compartido, ligado a la versión de datos"""
+    return manager.get_derivado(
+        "ausencias_activas",
+        ("permisos", "incapacidades"),
+        lambda: IndiceAusenciasActivas.desde_dataframes(
+            *manager.get_many(["permisos", "incapacidades"]).values()
+        )
+    )
+
+def obtener_indice_ausencias(manager):
+    """Índice de ausencias compartido, construido desde los datos cacheados"""
+    return manager.get_derivado(
+        "indice_ausencias",
+        ("permisos", "incapacidades"),
+        lambda: IndiceIntervalos.desde_dataframes(
+            *manager.get_many(["permisos", "incapacidades"]).values()
+        )
+    )
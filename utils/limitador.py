@@ -0,0 +1,134 @@
+import atexit
+import json
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+
+class LimitadorIntentos:
+    """Ventana deslizante de fallos por clave con bloqueo exponencial
+
+    Tras max_fallos dentro de ventana segundos, la clave queda bloqueada
+    bloqueo_base * 2^n segundos (n = bloqueos previos, hasta bloqueo_max).
+    El estado está acotado a max_claves (se descartan las menos recientes).
+    """
+
+    def __init__(self, max_fallos=5, ventana=300, bloqueo_base=60, bloqueo_max=3600, max_claves=10000):
+        self.max_fallos = max_fallos
+        self.ventana = ventana
+        self.bloqueo_base = bloqueo_base
+        self.bloqueo_max = bloqueo_max
+        self.max_claves = max_claves
+        self._estado = OrderedDict()  # clave -> {'fallos': deque, 'bloqueado_hasta', 'bloqueos'}
+        self._lock = threading.Lock()
+
+    def _obtener(self, clave):
+        estado = self._estado.get(clave)
+        if estado is None:
+            estado = {'fallos': deque(), 'bloqueado_hasta': 0.0, 'bloqueos': 0}
+            self._estado[clave] = estado
+            while len(self._estado) > self.max_claves:
+                self._estado.popitem(last=False)
+        else:
+            self._estado.move_to_end(clave)
+        return estado
+
+    def espera(self, clave):
+        """Segundos que faltan para poder intentar (0 = permitido)"""
+        with self._lock:
+            estado = self._estado.get(clave)
+            if estado is None:
+                return 0
+            return max(0, int(estado['bloqueado_hasta'] - time.time() + 0.999))
+
+    def registrar_fallo(self, clave):
+        """Registrar un fallo; retorna los segundos de bloqueo si se activó uno (0 si no)"""
+        ahora = time.time()
+        with self._lock:
+            estado = self._obtener(clave)
+            fallos = estado['fallos']
+            fallos.append(ahora)
+            while fallos and fallos[0] <= ahora - self.ventana:
+                fallos.popleft()
+
+            if len(fallos) < self.max_fallos:
+                return 0
+
+            duracion = min(self.bloqueo_max, self.bloqueo_base * 2 ** estado['bloqueos'])
+            estado['bloqueado_hasta'] = ahora + duracion
+            estado['bloqueos'] += 1
+            fallos.clear()
+            return duracion
+
+    def registrar_exito(self, clave):
+        """Olvidar el historial de una clave tras un acceso correcto"""
+        with self._lock:
+            self._estado.pop(clave, None)
+
+class ColaAuditoria:
+    """Acumula registros de auditoría y los entrega en lotes
+
+    extraer() devuelve el lote cuando llega a tamaño registros o cuando el
+    más antiguo supera intervalo segundos (forzar=True lo entrega siempre);
+    iniciar_vaciado() hace lo mismo periódicamente desde un hilo.
+    """
+
+    def __init__(self, tamaño=20, intervalo=30, max_pendientes=1000):
+        self.tamaño = tamaño
+        self.intervalo = intervalo
+        self._pendientes = deque(maxlen=max_pendientes)
+        self._desde = None
+        self._lock = threading.Lock()
+
+    def agregar(self, registro):
+        with self._lock:
+            if not self._pendientes:
+                self._desde = time.time()
+            self._pendientes.append(registro)
+
+    def extraer(self, forzar=False):
+        with self._lock:
+            if not self._pendientes:
+                return []
+            if not forzar and len(self._pendientes) < self.tamaño and time.time() - self._desde < self.intervalo:
+                return []
+            lote = list(self._pendientes)
+            self._pendientes.clear()
+            return lote
+
+    def iniciar_vaciado(self, destino, respaldo="auditoria_pendiente.jsonl"):
+        """Entregar los lotes vencidos desde un hilo propio, aunque no lleguen más eventos
+
+        Revisa la cola cada intervalo/2 segundos y al terminar el proceso entrega
+        lo pendiente; destino(lote) recibe la lista de registros. Si la entrega
+        final falla, el lote se agrega al archivo respaldo (JSON por línea).
+        """
+        def ciclo():
+            while True:
+                time.sleep(max(1, self.intervalo / 2))
+                lote = self.extraer()
+                if lote:
+                    try:
+                        destino(lote)
+                    except Exception:
+                        pass  # La auditoría nunca debe tumbar el hilo
+
+        threading.Thread(target=ciclo, daemon=True, name="cola-auditoria").start()
+        atexit.register(self._vaciar_al_salir, destino, respaldo)
+
+    def _vaciar_al_salir(self, destino, respaldo):
+        """Última entrega al terminar el proceso; si falla, respaldar en disco"""
+        lote = self.extraer(forzar=True)
+        if not lote:
+            return
+        try:
+            destino(lote)
+        except Exception as e:
+            try:
+                with open(respaldo, 'a', encoding='utf-8') as archivo:
+                    for registro in lote:
+                        archivo.write(json.dumps(registro, ensure_ascii=False, default=str) + "\n")
+                print(f"Auditoría: no se pudieron guardar {len(lote)} eventos ({e}); respaldados en {respaldo}", file=sys.stderr)
+            except OSError as error_archivo:
+                print(f"Auditoría: se perdieron {len(lote)} eventos ({e}; {error_archivo})", file=sys.stderr)
+
@@ -0,0 +1,83 @@
+import calendar
+from datetime import datetime
+import pandas as pd
+from utils.reglas_bonos import compilar_reglas
+
+# Estado de asistencia -> columna de conteo
+COLUMNAS_ESTADO = {
+    'Presente': 'presentes',
+    'Retardo': 'retardos',
+    'Ausente': 'ausentes',
+    'Permiso': 'permisos',
+    'Incapacidad': 'incapacidades'
+}
+
+# Estados que cuentan como sábado trabajado
+ESTADOS_TRABAJADOS = ['Presente', 'Retardo']
+
+def filtrar_periodo(df_asistencias, año, mes):
+    """Asistencias de un mes (comparación de strings YYYY-MM-DD)"""
+    if df_asistencias.empty:
+        return df_asistencias
+
+    fecha_inicio = f"{año}-{mes:02d}-01"
+    fecha_fin = f"{año}-{mes:02d}-{calendar.monthrange(año, mes)[1]}"
+    return df_asistencias[
+        (df_asistencias['fecha'] >= fecha_inicio) &
+        (df_asistencias['fecha'] <= fecha_fin)
+    ]
+
+def contar_asistencias(df_asistencias):
+    """Conteo por empleado de registros totales, por estado y sábados trabajados"""
+    columnas = ['dias_trabajados'] + list(COLUMNAS_ESTADO.values()) + ['sabados']
+
+    if df_asistencias.empty:
+        return pd.DataFrame(columns=columnas, dtype=int).rename_axis('id_empleado')
+
+    conteos = pd.crosstab(df_asistencias['id_empleado'], df_asistencias['estado'])
+    conteos = conteos.reindex(columns=list(COLUMNAS_ESTADO), fill_value=0).rename(columns=COLUMNAS_ESTADO)
+    conteos.insert(0, 'dias_trabajados', df_asistencias.groupby('id_empleado').size())
+
+    sabados = df_asistencias[
+        (pd.to_datetime(df_asistencias['fecha'], errors='coerce').dt.dayofweek == 5) &
+        df_asistencias['estado'].isin(ESTADOS_TRABAJADOS)
+    ]
+    conteos['sabados'] = sabados.groupby('id_empleado').size().reindex(conteos.index, fill_value=0)
+    return conteos[columnas]
+
+def calcular_bonos(df_empleados, df_asistencias, reglas, año, mes, version_reglas=0):
+    """Bonos del periodo para todos los empleados dados (sin ciclos por empleado)
+
+    df_empleados ya filtrado (activos/oficina); df_asistencias puede ser de
+    cualquier rango, se restringe al mes aquí. reglas se compila una vez
+    (ver utils.reglas_bonos) y se evalúa sobre el vector de empleados.
+    """
+    conteos = contar_asistencias(filtrar_periodo(df_asistencias, año, mes))
+
+    df_resultados = df_empleados[['id_empleado', 'nombre_completo', 'oficina']].merge(
+        conteos, left_on='id_empleado', right_index=True, how='left'
+    )
+    columnas_conteo = list(conteos.columns)
+    df_resultados[columnas_conteo] = df_resultados[columnas_conteo].fillna(0).astype(int)
+
+    df_resultados['monto_bono'] = compilar_reglas(reglas)(df_resultados)
+    df_resultados['periodo'] = f"{año}-{mes:02d}"
+    df_resultados['año'] = año
+    df_resultados['mes'] = mes
+    df_resultados['version_reglas'] = version_reglas
+
+    return df_resultados.reset_index(drop=True)
+
+def preparar_registros_bonos(df_bonos, calculado_por):
+    """Convertir resultados del motor a filas de la tabla bonos"""
+    columnas = ['id_empleado', 'periodo', 'año', 'mes', 'dias_trabajados', 'presentes',
+                'retardos', 'ausentes', 'monto_bono', 'oficina', 'version_reglas']
+    enteros = ['año', 'mes', 'dias_trabajados', 'presentes', 'retardos', 'ausentes', 'version_reglas']
+
+    df = df_bonos[columnas].copy()
+    df[enteros] = df[enteros].astype(int)
+    df['monto_bono'] = df['monto_bono'].astype(float)
+    df['calculado_por'] = calculado_por
+    df['fecha_calculo'] = datetime.now().isoformat()
+
+    return df.to_dict('records')
@@ -0,0 +1,163 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import pandas as pd
+from utils.motor_bonos import calcular_bonos, preparar_registros_bonos
+from utils.reglas_bonos import obtener_reglas
+
+# Snapshot de solo lectura de cada proceso trabajador (se carga una vez por proceso)
+_SNAPSHOT = {}
+
+def _preparar_snapshot(df_plantilla, df_asistencias, reglas, version_reglas):
+    """Datos de solo lectura de un recálculo, con plantilla y asistencias pre-partidas por mes (YYYY-MM)"""
+    return {
+        'plantilla': {
+            periodo: grupo
+            for periodo, grupo in df_plantilla.groupby('periodo')
+        } if not df_plantilla.empty else {},
+        'reglas': reglas,
+        'version_reglas': version_reglas,
+        'asistencias': {
+            periodo: grupo
+            for periodo, grupo in df_asistencias.groupby(df_asistencias['fecha'].astype(str).str[:7])
+        } if not df_asistencias.empty else {}
+    }
+
+def _inicializar_trabajador(df_plantilla, df_asistencias, reglas, version_reglas):
+    """Cargar el snapshot en el proceso trabajador"""
+    _SNAPSHOT.update(_preparar_snapshot(df_plantilla, df_asistencias, reglas, version_reglas))
+
+def _calcular_tarea(tarea, snapshot=None):
+    """Bonos de un (año, mes, oficina) con el snapshot dado o el del proceso"""
+    snapshot = snapshot or _SNAPSHOT
+    año, mes, oficina = tarea
+    periodo = f"{año}-{mes:02d}"
+    df_empleados = snapshot['plantilla'].get(periodo)
+    if df_empleados is None:
+        return pd.DataFrame()
+    df_empleados = df_empleados[df_empleados['oficina'] == oficina]
+    df_asistencias = snapshot['asistencias'].get(periodo, pd.DataFrame(columns=['id_empleado', 'fecha', 'estado']))
+    return calcular_bonos(df_empleados, df_asistencias, snapshot['reglas'], año, mes, snapshot['version_reglas'])
+
+def plantilla_periodos(df_bonos, df_asistencias, df_empleados):
+    """Empleados y oficina de cada periodo (YYYY-MM) según los datos del propio periodo
+
+    Primero las filas de bonos ya guardadas del periodo; para quien no tenga,
+    la oficina donde registró más asistencias ese mes. Así los empleados dados
+    de baja después siguen incluidos y un cambio de oficina no reescribe meses
+    anteriores. Columnas: periodo, id_empleado, nombre_completo, oficina.
+    """
+    partes = []
+    if not df_bonos.empty:
+        partes.append(df_bonos[['periodo', 'id_empleado', 'oficina']].assign(prioridad=0))
+    if not df_asistencias.empty:
+        conteo = df_asistencias.assign(periodo=df_asistencias['fecha'].astype(str).str[:7]) \
+            .groupby(['periodo', 'id_empleado', 'oficina']).size().reset_index(name='registros') \
+            .sort_values('registros', ascending=False)
+        partes.append(conteo[['periodo', 'id_empleado', 'oficina']].assign(prioridad=1))
+
+    if not partes:
+        return pd.DataFrame(columns=['periodo', 'id_empleado', 'nombre_completo', 'oficina'])
+
+    plantilla = pd.concat(partes, ignore_index=True) \
+        .sort_values('prioridad', kind='stable') \
+        .drop_duplicates(['periodo', 'id_empleado'])
+    nombres = df_empleados[['id_empleado', 'nombre_completo']] if not df_empleados.empty \
+        else pd.DataFrame(columns=['id_empleado', 'nombre_completo'])
+    return plantilla.merge(nombres, on='id_empleado', how='left') \
+        [['periodo', 'id_empleado', 'nombre_completo', 'oficina']].reset_index(drop=True)
+
+def generar_tareas(años, meses, oficinas):
+    """Producto años x meses x oficinas"""
+    return [(int(año), int(mes), oficina) for año in años for mes in meses for oficina in oficinas]
+
+def recalcular_bonos(df_plantilla, df_asistencias, reglas, tareas, version_reglas=0, max_workers=None,
+                     al_avanzar=None, procesos=False):
+    """Calcular bonos de muchas tareas con la plantilla de cada periodo (ver plantilla_periodos)
+
+    Por defecto en el mismo proceso: cada tarea (una oficina-mes) es pequeña
+    y el servidor de Streamlit tiene hilos, donde hacer fork no es seguro.
+    procesos=True (solo la CLI) reparte las tareas en un ProcessPoolExecutor
+    con procesos spawn de max_workers.
+    al_avanzar(completadas, total) se llama al terminar cada tarea.
+    Retorna un DataFrame con los resultados de todas las tareas.
+    """
+    if not tareas:
+        return pd.DataFrame()
+
+    resultados = []
+
+    if not procesos:
+        snapshot = _preparar_snapshot(df_plantilla, df_asistencias, reglas, version_reglas)
+        for completadas, tarea in enumerate(tareas, start=1):
+            resultados.append(_calcular_tarea(tarea, snapshot))
+            if al_avanzar:
+                al_avanzar(completadas, len(tareas))
+    else:
+        with ProcessPoolExecutor(
+            max_workers=max_workers or min(len(tareas), os.cpu_count() or 1),
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_inicializar_trabajador,
+            initargs=(df_plantilla, df_asistencias, reglas, version_reglas)
+        ) as executor:
+            futuros = [executor.submit(_calcular_tarea, tarea) for tarea in tareas]
+            for completadas, futuro in enumerate(as_completed(futuros), start=1):
+                resultados.append(futuro.result())
+                if al_avanzar:
+                    al_avanzar(completadas, len(tareas))
+
+    resultados = [r for r in resultados if not r.empty]
+    return pd.concat(resultados, ignore_index=True) if resultados else pd.DataFrame()
+
+def recalcular_y_guardar(sheets_manager, años, meses, oficinas=None, version_reglas=None,
+                         calculado_por="sistema", max_workers=None, al_avanzar=None, guardar=True,
+                         procesos=False):
+    """Recalcular bonos de varios periodos/oficinas y guardarlos con el upsert masivo
+
+    version_reglas=None usa las reglas vigentes; una versión anterior permite
+    reproducir exactamente bonos ya guardados. procesos=True solo desde la CLI
+    (ver recalcular_bonos). Retorna un resumen con tareas,
+    registros, total de bonos, versión usada, tiempos y resultado del guardado.
+    """
+    inicio = time.perf_counter()
+    version_reglas, reglas = obtener_reglas(sheets_manager, version_reglas)
+
+    # Plantilla de cada periodo desde sus propios datos, no desde los empleados activos hoy
+    datos = sheets_manager.get_many({
+        'empleados': ("empleados", "id_empleado, nombre_completo", None),
+        'asistencias': ("asistencias", "id_empleado, fecha, estado, oficina", None),
+        'bonos': ("bonos", "id_empleado, periodo, oficina", None)
+    })
+    periodos = {f"{int(año)}-{int(mes):02d}" for año in años for mes in meses}
+    df_asistencias = datos["asistencias"]
+    if not df_asistencias.empty:
+        df_asistencias = df_asistencias[df_asistencias['fecha'].astype(str).str[:7].isin(periodos)]
+    df_bonos = datos["bonos"]
+    if not df_bonos.empty:
+        df_bonos = df_bonos[df_bonos['periodo'].astype(str).isin(periodos)]
+    df_plantilla = plantilla_periodos(df_bonos, df_asistencias, datos["empleados"])
+
+    oficinas = oficinas or sorted(df_plantilla['oficina'].dropna().unique().tolist())
+    tareas = generar_tareas(años, meses, oficinas)
+    carga = time.perf_counter()
+
+    df_resultados = recalcular_bonos(df_plantilla, df_asistencias, reglas, tareas, version_reglas, max_workers,
+                                     al_avanzar, procesos)
+    calculo = time.perf_counter()
+
+    guardado = {'insertados': 0, 'actualizados': 0}
+    if guardar and not df_resultados.empty:
+        guardado = sheets_manager.guardar_bonos_lote(preparar_registros_bonos(df_resultados, calculado_por))
+
+    return {
+        'tareas': len(tareas),
+        'registros': len(df_resultados),
+        'version_reglas': version_reglas,
+        'total_bonos': float(df_resultados['monto_bono'].sum()) if not df_resultados.empty else 0.0,
+        'segundos_carga': carga - inicio,
+        'segundos_calculo': calculo - carga,
+        'segundos_guardado': time.perf_counter() - calculo,
+        'guardado': guardado,
+        'resultados': df_resultados
+    }
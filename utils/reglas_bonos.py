@@ -0,0 +1,207 @@
+import json
+from datetime import datetime
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+
+# Configuración usada cuando no existe config_bonos
+CONFIG_BONOS_DEFECTO = {
+    'bono_base': 1000,
+    'penalizacion_retardo': 50,
+    'penalizacion_ausencia': 200,
+    'asistencias_minimas': 20
+}
+
+# Código de Postgres para unique_violation (reintento al guardar una versión)
+VIOLACION_UNICA = "23505"
+
+# Conteos por empleado que pueden usar las reglas (ver motor_bonos.contar_asistencias)
+CONTEOS_REGLAS = ('presentes', 'retardos', 'ausentes', 'permisos', 'incapacidades', 'sabados')
+
+def reglas_desde_config(config):
+    """Reglas equivalentes a la fórmula fija de config_bonos (versión 0)"""
+    return {
+        'bono_base': float(config.get('bono_base', CONFIG_BONOS_DEFECTO['bono_base'])),
+        'asistencias_minimas': int(config.get('asistencias_minimas', CONFIG_BONOS_DEFECTO['asistencias_minimas'])),
+        'penalizaciones': {
+            'retardos': float(config.get('penalizacion_retardo', CONFIG_BONOS_DEFECTO['penalizacion_retardo'])),
+            'ausentes': float(config.get('penalizacion_ausencia', CONFIG_BONOS_DEFECTO['penalizacion_ausencia']))
+        },
+        'niveles': [],
+        'bono_sabado': 0.0,
+        'incapacidad_cuenta_asistencia': False,
+        'tope': None
+    }
+
+REGLAS_DEFECTO = reglas_desde_config(CONFIG_BONOS_DEFECTO)
+
+def validar_reglas(reglas):
+    """Normalizar un conjunto de reglas; lanza ValueError si no es válido
+
+    Formato:
+        bono_base                     monto inicial
+        asistencias_minimas           días (presentes) para tener derecho a bono
+        penalizaciones                {conteo: descuento por unidad}
+        niveles                       [{'desde': días, 'extra': monto}], aplica el mayor alcanzado
+        bono_sabado                   extra por cada sábado trabajado
+        incapacidad_cuenta_asistencia los días de incapacidad cuentan para mínimo y niveles
+        tope                          monto máximo (None = sin tope)
+    """
+    desconocidas = set(reglas) - set(REGLAS_DEFECTO)
+    if desconocidas:
+        raise ValueError(f"Reglas desconocidas: {', '.join(sorted(desconocidas))}")
+
+    normalizadas = {**REGLAS_DEFECTO, **reglas}
+
+    penalizaciones = {k: float(v) for k, v in (normalizadas['penalizaciones'] or {}).items()}
+    invalidas = set(penalizaciones) - set(CONTEOS_REGLAS)
+    if invalidas:
+        raise ValueError(f"Penalizaciones sobre conteos inexistentes: {', '.join(sorted(invalidas))}")
+
+    niveles = sorted(
+        ({'desde': int(n['desde']), 'extra': float(n['extra'])} for n in normalizadas['niveles'] or []),
+        key=lambda n: n['desde']
+    )
+    if len({n['desde'] for n in niveles}) != len(niveles):
+        raise ValueError("Hay niveles repetidos con el mismo número de días")
+
+    normalizadas.update({
+        'bono_base': float(normalizadas['bono_base']),
+        'asistencias_minimas': int(normalizadas['asistencias_minimas']),
+        'penalizaciones': penalizaciones,
+        'niveles': niveles,
+        'bono_sabado': float(normalizadas['bono_sabado'] or 0),
+        'incapacidad_cuenta_asistencia': bool(normalizadas['incapacidad_cuenta_asistencia']),
+        'tope': float(normalizadas['tope']) if normalizadas['tope'] not in (None, '') else None
+    })
+
+    montos = [normalizadas['bono_base'], normalizadas['bono_sabado']] + list(penalizaciones.values()) + \
+             [n['extra'] for n in niveles]
+    if any(m < 0 for m in montos) or normalizadas['asistencias_minimas'] < 0:
+        raise ValueError("Los montos y días de las reglas no pueden ser negativos")
+
+    return normalizadas
+
+def compilar_reglas(reglas):
+    """Compilar reglas a una función vectorizada conteos -> montos (con caché por contenido)"""
+    return _compilar(json.dumps(validar_reglas(reglas), sort_keys=True))
+
+@lru_cache(maxsize=32)
+def _compilar(reglas_json):
+    """Traducir cada regla a un término NumPy sobre el vector de empleados"""
+    reglas = json.loads(reglas_json)
+    terminos = []
+
+    # Penalizaciones: una sola multiplicación matriz-vector
+    columnas = tuple(reglas['penalizaciones'])
+    if columnas:
+        descuentos = np.array([reglas['penalizaciones'][c] for c in columnas])
+        terminos.append(lambda c, _a: -(np.column_stack([c[col] for col in columnas]) @ descuentos))
+
+    # Niveles: searchsorted ubica el mayor umbral alcanzado por cada empleado
+    if reglas['niveles']:
+        umbrales = np.array([n['desde'] for n in reglas['niveles']])
+        extras = np.concatenate([[0.0], [n['extra'] for n in reglas['niveles']]])
+        terminos.append(lambda _c, a: extras[np.searchsorted(umbrales, a, side='right')])
+
+    if reglas['bono_sabado']:
+        bono_sabado = reglas['bono_sabado']
+        terminos.append(lambda c, _a: bono_sabado * c['sabados'])
+
+    bono_base = reglas['bono_base']
+    minimas = reglas['asistencias_minimas']
+    tope = reglas['tope']
+    cuenta_incapacidad = reglas['incapacidad_cuenta_asistencia']
+
+    def evaluar(conteos):
+        """conteos: mapeo conteo -> arreglo (DataFrame de contar_asistencias sirve)"""
+        c = {col: np.asarray(conteos[col], dtype=float) for col in CONTEOS_REGLAS if col in conteos}
+        asistencia = c['presentes'] + c['incapacidades'] if cuenta_incapacidad else c['presentes']
+
+        monto = np.full(asistencia.shape, bono_base)
+        for termino in terminos:
+            monto = monto + termino(c, asistencia)
+
+        monto = np.maximum(0, monto)
+        if tope is not None:
+            monto = np.minimum(monto, tope)
+
+        # Sin asistencias mínimas no hay bono
+        return np.where(asistencia < minimas, 0, monto)
+
+    return evaluar
+
+# ---------- Versiones guardadas ----------
+
+def _reglas_de_fila(fila):
+    reglas = fila['reglas']
+    return validar_reglas(json.loads(reglas) if isinstance(reglas, str) else reglas)
+
+def obtener_versiones_reglas(manager):
+    """Historial de versiones de reglas (más reciente primero)"""
+    df_reglas = manager.get_dataframe("reglas_bonos")
+    if df_reglas.empty:
+        return df_reglas
+    return df_reglas.sort_values('version', ascending=False).reset_index(drop=True)
+
+def obtener_reglas(manager, version=None):
+    """(versión, reglas) vigentes o de una versión específica
+
+    La versión 0 es la copia de config_bonos que guarda sql/013; solo mientras
+    esa migración no se haya aplicado se deriva de config_bonos en vivo.
+    """
+    df_reglas = obtener_versiones_reglas(manager)
+
+    if version is None and not df_reglas.empty:
+        fila = df_reglas.iloc[0]
+        return int(fila['version']), _reglas_de_fila(fila)
+
+    filas = df_reglas[df_reglas['version'] == version] if version is not None and not df_reglas.empty else df_reglas
+    if version is not None and not filas.empty:
+        return int(version), _reglas_de_fila(filas.iloc[0])
+
+    if version:
+        raise ValueError(f"No existe la versión {version} de reglas de bonos")
+
+    # Versión 0 antes de aplicar sql/013
+    df_config = manager.get_dataframe("config_bonos")
+    config = df_config.iloc[0].to_dict() if not df_config.empty else CONFIG_BONOS_DEFECTO
+    return 0, reglas_desde_config(config)
+
+def guardar_version_reglas(manager, reglas, creado_por, descripcion="", intentos=5):
+    """Guardar reglas como una versión nueva (las anteriores no se modifican)
+
+    El número de versión lo asigna sql/014_guardar_version_reglas.sql; sin esa
+    función se lee el máximo del servidor (no de la caché) y se reintenta si
+    otro guardado tomó el mismo número (version es la llave primaria).
+    """
+    from postgrest.exceptions import APIError
+
+    reglas = validar_reglas(reglas)
+    disponible, registro = manager._rpc('guardar_version_reglas', {
+        'p_reglas': reglas,
+        'p_creado_por': creado_por,
+        'p_descripcion': descripcion
+    })
+
+    if not disponible:
+        for intento in range(intentos):
+            response = manager.supabase.table("reglas_bonos").select("version") \
+                .order("version", desc=True).limit(1).execute()
+            registro = {
+                'version': int(response.data[0]['version']) + 1 if response.data else 1,
+                'reglas': reglas,
+                'descripcion': descripcion,
+                'creado_por': creado_por,
+                'fecha_creacion': datetime.now().isoformat()
+            }
+            try:
+                manager.supabase.table("reglas_bonos").insert(registro).execute()
+                break
+            except APIError as e:
+                if e.code != VIOLACION_UNICA or intento == intentos - 1:
+                    raise
+
+    manager.registrar_insercion("reglas_bonos", registro)
+
+    return int(registro['version'])
@@ -0,0 +1,411 @@
+import calendar
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+import numpy as np
+import pandas as pd
+from utils.dias_habiles import contar_dias_habiles
+from utils.motor_bonos import contar_asistencias
+
+# Filas por página (máximo por defecto de PostgREST)
+TAMAÑO_PAGINA = 1000
+
+# Límite de filas por hoja de Excel (se abre otra hoja al llenarse)
+FILAS_POR_HOJA_XLSX = 1_048_575
+
+# Formato -> (extensión, mime, módulo opcional que lo requiere)
+FORMATOS = {
+    'CSV': ('csv', 'text/csv', None),
+    'Excel (XLSX)': ('xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'openpyxl'),
+    'Parquet': ('parquet', 'application/vnd.apache.parquet', 'pyarrow'),
+}
+
+# Reporte -> tabla, columnas y columnas de inicio/fin para filtrar el rango
+# (inicio <= hasta y fin >= desde: incluye registros que se cruzan con el rango)
+REPORTES = {
+    'asistencias': {
+        'titulo': "📋 Asistencias",
+        'tabla': "asistencias",
+        'columnas': "id, id_empleado, fecha, hora_registro, estado, es_sabado, oficina, registrado_por, observaciones",
+        'rango': ('fecha', 'fecha'),
+    },
+    'permisos': {
+        'titulo': "🔖 Permisos",
+        'tabla': "permisos",
+        'columnas': "id, id_empleado, fecha_inicio, fecha_fin, dias_solicitados, motivo, estado, aprobado_por, "
+                    "fecha_aprobacion, oficina, solicitado_por",
+        'rango': ('fecha_inicio', 'fecha_fin'),
+    },
+    'incapacidades': {
+        'titulo': "🏥 Incapacidades",
+        'tabla': "incapacidades",
+        'columnas': "id, id_empleado, tipo, fecha_inicio, fecha_fin, dias_totales, motivo, folio, institucion, "
+                    "oficina, registrado_por",
+        'rango': ('fecha_inicio', 'fecha_fin'),
+    },
+    'bonos': {
+        'titulo': "💰 Bonos",
+        'tabla': "bonos",
+        'columnas': "id, id_empleado, periodo, dias_trabajados, presentes, retardos, ausentes, monto_bono, "
+                    "oficina, version_reglas, calculado_por",
+        'rango': ('periodo', 'periodo'),
+    },
+    'nomina': {
+        'titulo': "🧾 Nómina por periodo",
+        'tablas': ["asistencias", "permisos", "incapacidades", "bonos"],
+    },
+}
+
+COLUMNAS_NOMINA = ['periodo', 'id_empleado', 'nombre_completo', 'oficina', 'dias_trabajados', 'presentes',
+                   'retardos', 'ausentes', 'sabados', 'dias_permiso', 'dias_incapacidad', 'monto_bono']
+
+# Columnas numéricas de los reportes; el resto (fechas incluidas) se exporta como texto
+COLUMNAS_ENTERAS = {'id', 'dias_solicitados', 'dias_totales', 'dias_trabajados', 'presentes', 'retardos',
+                    'ausentes', 'sabados', 'dias_permiso', 'dias_incapacidad', 'version_reglas'}
+COLUMNAS_DECIMALES = {'monto_bono'}
+
+def columnas_reporte(reporte):
+    """Columnas declaradas de un reporte, en orden"""
+    if reporte == 'nomina':
+        return list(COLUMNAS_NOMINA)
+    return [columna.strip() for columna in REPORTES[reporte]['columnas'].split(',')]
+
+def _limite_rango(columna, valor):
+    """Los rangos de bonos se comparan por periodo (YYYY-MM)"""
+    return str(valor)[:7] if columna == 'periodo' else str(valor)
+
+def paginar(manager, tabla, columnas, desde, hasta, rango, oficina=None, tamaño=TAMAÑO_PAGINA):
+    """DataFrames de una consulta, página por página (keyset sobre id, sin OFFSET)
+
+    Cada página es una consulta independiente que continúa después del último
+    id leído, así que el costo por página no crece con el avance y en memoria
+    solo vive una página a la vez.
+    """
+    columna_inicio, columna_fin = rango
+    ultimo_id = None
+
+    while True:
+        query = manager.supabase.table(tabla).select(columnas) \
+            .lte(columna_inicio, _limite_rango(columna_inicio, hasta)) \
+            .gte(columna_fin, _limite_rango(columna_fin, desde))
+        if oficina:
+            query = query.eq('oficina', oficina)
+        if ultimo_id is not None:
+            query = query.gt('id', ultimo_id)
+
+        filas = query.order('id').limit(tamaño).execute().data
+        if not filas:
+            return
+
+        yield pd.DataFrame(filas)
+
+        if len(filas) < tamaño:
+            return
+        ultimo_id = filas[-1]['id']
+
+def meses_del_rango(desde, hasta):
+    """(año, mes, primer día, último día) de cada mes tocado por el rango"""
+    año, mes = desde.year, desde.month
+    while (año, mes) <= (hasta.year, hasta.month):
+        inicio = max(desde, date(año, mes, 1))
+        fin = min(hasta, date(año, mes, calendar.monthrange(año, mes)[1]))
+        yield año, mes, inicio, fin
+        año, mes = (año + 1, 1) if mes == 12 else (año, mes + 1)
+
+def _dias_en_periodo(df, inicio, fin, calendario=None):
+    """Días de cada registro (fecha_inicio/fecha_fin) que caen dentro del periodo
+
+    Con calendario cuenta días hábiles (permisos); sin él, días naturales.
+    """
+    inicios = np.maximum(pd.to_datetime(df['fecha_inicio']).to_numpy().astype('datetime64[D]'), np.datetime64(inicio))
+    fines = np.minimum(pd.to_datetime(df['fecha_fin']).to_numpy().astype('datetime64[D]'), np.datetime64(fin))
+
+    if calendario is not None:
+        return contar_dias_habiles(pd.Series(inicios), pd.Series(fines), calendario)
+    return np.maximum((fines - inicios).astype(int) + 1, 0)
+
+def paginas_nomina(manager, desde, hasta, oficina=None, calendario=None, tamaño=TAMAÑO_PAGINA):
+    """Reporte de nómina: una fila por empleado y mes, generado mes por mes
+
+    Las asistencias del mes se leen por páginas y solo se acumulan sus conteos,
+    así que la memoria depende del número de empleados, no de los años pedidos.
+    """
+    df_empleados = manager.get_many({
+        'empleados': ("empleados", "id_empleado, nombre_completo, oficina", None)
+    })['empleados']
+    if oficina and not df_empleados.empty:
+        df_empleados = df_empleados[df_empleados['oficina'] == oficina]
+
+    for año, mes, inicio, fin in meses_del_rango(desde, hasta):
+        conteos = None
+        for df in paginar(manager, "asistencias", "id, id_empleado, fecha, estado", inicio, fin,
+                          ('fecha', 'fecha'), oficina, tamaño):
+            parcial = contar_asistencias(df)
+            conteos = parcial if conteos is None else conteos.add(parcial, fill_value=0)
+
+        dias_permiso = pd.Series(dtype=int)
+        permisos = [df[df['estado'] == 'Aprobado'] for df in paginar(
+            manager, "permisos", "id, id_empleado, fecha_inicio, fecha_fin, estado", inicio, fin,
+            ('fecha_inicio', 'fecha_fin'), oficina, tamaño)]
+        if permisos:
+            df_permisos = pd.concat(permisos, ignore_index=True)
+            if not df_permisos.empty:
+                df_permisos['dias'] = _dias_en_periodo(df_permisos, inicio, fin, calendario)
+                dias_permiso = df_permisos.groupby('id_empleado')['dias'].sum()
+
+        dias_incapacidad = pd.Series(dtype=int)
+        incapacidades = list(paginar(manager, "incapacidades", "id, id_empleado, fecha_inicio, fecha_fin",
+                                     inicio, fin, ('fecha_inicio', 'fecha_fin'), oficina, tamaño))
+        if incapacidades:
+            df_incapacidades = pd.concat(incapacidades, ignore_index=True)
+            df_incapacidades['dias'] = _dias_en_periodo(df_incapacidades, inicio, fin)
+            dias_incapacidad = df_incapacidades.groupby('id_empleado')['dias'].sum()
+
+        monto_bono = pd.Series(dtype=float)
+        bonos = list(paginar(manager, "bonos", "id, id_empleado, monto_bono", inicio, fin,
+                             ('periodo', 'periodo'), oficina, tamaño))
+        if bonos:
+            monto_bono = pd.concat(bonos, ignore_index=True).groupby('id_empleado')['monto_bono'].sum()
+
+        df_mes = df_empleados.copy()
+        df_mes.insert(0, 'periodo', f"{año}-{mes:02d}")
+        if conteos is not None:
+            df_mes = df_mes.merge(conteos, left_on='id_empleado', right_index=True, how='left')
+        df_mes['dias_permiso'] = df_mes['id_empleado'].map(dias_permiso)
+        df_mes['dias_incapacidad'] = df_mes['id_empleado'].map(dias_incapacidad)
+        df_mes['monto_bono'] = df_mes['id_empleado'].map(monto_bono)
+
+        df_mes = df_mes.reindex(columns=COLUMNAS_NOMINA)
+        enteros = COLUMNAS_NOMINA[4:-1]
+        df_mes[enteros] = df_mes[enteros].fillna(0).astype(int)
+        df_mes['monto_bono'] = df_mes['monto_bono'].fillna(0).astype(float)
+
+        yield df_mes
+
+def paginas_reporte(manager, reporte, desde, hasta, oficina=None, calendario=None, tamaño=TAMAÑO_PAGINA):
+    """Páginas (DataFrames) de cualquier reporte de REPORTES"""
+    if reporte == 'nomina':
+        return paginas_nomina(manager, desde, hasta, oficina, calendario, tamaño)
+
+    definicion = REPORTES[reporte]
+    return paginar(manager, definicion['tabla'], definicion['columnas'], desde, hasta,
+                   definicion['rango'], oficina, tamaño)
+
+# ==================== ESCRITORES ====================
+
+class EscritorCSV:
+    """CSV escrito página por página (encabezado solo en la primera)"""
+
+    def __init__(self, ruta, columnas):
+        self.archivo = open(ruta, 'w', newline='', encoding='utf-8')
+        self.columnas = columnas
+        self.encabezado = True
+
+    def escribir(self, df):
+        df.reindex(columns=self.columnas).to_csv(self.archivo, index=False, header=self.encabezado)
+        self.encabezado = False
+
+    def cerrar(self):
+        self.archivo.close()
+
+class EscritorXLSX:
+    """Excel en modo write_only de openpyxl: las filas se vuelcan al disco al escribirse"""
+
+    def __init__(self, ruta, columnas):
+        from openpyxl import Workbook
+
+        self.ruta = ruta
+        self.libro = Workbook(write_only=True)
+        self.hoja = None
+        self.columnas = columnas
+        self.filas_hoja = 0
+
+    def _nueva_hoja(self):
+        self.hoja = self.libro.create_sheet(f"Datos {len(self.libro.worksheets) + 1}")
+        self.hoja.append(self.columnas)
+        self.filas_hoja = 0
+
+    def escribir(self, df):
+        if self.hoja is None:
+            self._nueva_hoja()
+
+        # Valores nativos de Python (None en lugar de NaN) para openpyxl
+        df = df.reindex(columns=self.columnas)
+        df = df.astype(object).where(df.notna(), None)
+        for fila in df.itertuples(index=False, name=None):
+            if self.filas_hoja >= FILAS_POR_HOJA_XLSX:
+                self._nueva_hoja()
+            self.hoja.append(fila)
+            self.filas_hoja += 1
+
+    def cerrar(self):
+        if self.hoja is None:
+            self._nueva_hoja()
+        self.libro.save(self.ruta)
+
+class EscritorParquet:
+    """Parquet con un row group por página y esquema tomado de las columnas declaradas
+
+    El tipo no depende de los datos de la primera página: una columna vacía al
+    inicio conserva su tipo cuando aparecen valores después.
+    """
+
+    def __init__(self, ruta, columnas):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self.pa = pa
+        self.esquema = pa.schema([(columna, self._tipo(columna)) for columna in columnas])
+        self.escritor = pq.ParquetWriter(ruta, self.esquema)
+
+    def _tipo(self, columna):
+        if columna in COLUMNAS_ENTERAS:
+            return self.pa.int64()
+        if columna in COLUMNAS_DECIMALES:
+            return self.pa.float64()
+        return self.pa.string()
+
+    def escribir(self, df):
+        df = df.reindex(columns=self.esquema.names)
+        for campo in self.esquema:
+            if self.pa.types.is_string(campo.type):
+                # Fechas y valores sueltos como texto; los nulos se conservan
+                valores = df[campo.name]
+                df[campo.name] = valores.astype(str).where(valores.notna(), None)
+            else:
+                df[campo.name] = pd.to_numeric(df[campo.name], errors='coerce')
+        self.escritor.write_table(self.pa.Table.from_pandas(df, schema=self.esquema, preserve_index=False))
+
+    def cerrar(self):
+        self.escritor.close()
+
+ESCRITORES = {'csv': EscritorCSV, 'xlsx': EscritorXLSX, 'parquet': EscritorParquet}
+
+def formatos_disponibles():
+    """Formatos cuyo módulo opcional está instalado (CSV siempre)"""
+    import importlib.util
+
+    return [
+        nombre for nombre, (_, _, modulo) in FORMATOS.items()
+        if modulo is None or importlib.util.find_spec(modulo) is not None
+    ]
+
+def exportar(paginas, ruta, extension, columnas, al_avanzar=None):
+    """Escribir páginas en ruta con el escritor del formato; retorna filas escritas
+
+    Todas las páginas se escriben con las columnas declaradas del reporte.
+
+    El archivo se escribe con otro nombre y se renombra al terminar, para que un
+    artefacto a medias nunca quede visible en el caché.
+    """
+    temporal = f"{ruta}.{os.getpid()}.{threading.get_ident()}.tmp"
+    escritor = ESCRITORES[extension](temporal, columnas)
+    filas = 0
+
+    try:
+        for df in paginas:
+            escritor.escribir(df)
+            filas += len(df)
+            if al_avanzar:
+                al_avanzar(filas)
+        escritor.cerrar()
+        os.replace(temporal, ruta)
+    except BaseException:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        raise
+
+    return filas
+
+# ==================== CACHÉ DE ARTEFACTOS ====================
+
+def clave_reporte(manager, reporte, desde, hasta, oficina, extension):
+    """Clave del artefacto: parámetros + versión de los datos que lo alimentan
+
+    La versión combina las escrituras locales del gestor con la marca de agua
+    (registros, última modificación) de cada tabla hasta la fecha final del
+    rango, que también cambia con ediciones hechas fuera de la app.
+    """
+    definicion = REPORTES[reporte]
+    tablas = definicion.get('tablas') or [definicion['tabla']]
+
+    marcas = []
+    for tabla in tablas:
+        columna_inicio = REPORTES[tabla]['rango'][0]
+        marcas.append(manager.marca_agua(tabla, columna_inicio, "0001-01-01",
+                                         _limite_rango(columna_inicio, hasta)))
+    if reporte == 'nomina':
+        # Nombres y oficinas salen del catálogo de empleados
+        marcas.append(manager.marca_agua("empleados"))
+
+    contenido = json.dumps(
+        [reporte, str(desde), str(hasta), oficina, extension, marcas, manager.version_datos(tablas)],
+        default=str
+    )
+    return hashlib.sha1(contenido.encode('utf-8')).hexdigest()
+
+class CacheArtefactos:
+    """Archivos generados en disco, indexados por clave (LRU + TTL)
+
+    Dos sesiones que piden la misma clave a la vez generan el archivo una
+    sola vez: la segunda espera el candado de la clave y reutiliza el resultado.
+    """
+
+    def __init__(self, directorio=None, max_artefactos=20, ttl=900):
+        self.directorio = directorio or os.path.join(tempfile.gettempdir(), "rh_reportes")
+        self.max_artefactos = max_artefactos
+        self.ttl = ttl
+        self._artefactos = OrderedDict()  # clave -> (ruta, filas, creado)
+        self._candados = {}
+        self._lock = threading.Lock()
+        os.makedirs(self.directorio, exist_ok=True)
+
+    def _vigente(self, clave):
+        entrada = self._artefactos.get(clave)
+        if entrada and time.time() - entrada[2] < self.ttl and os.path.exists(entrada[0]):
+            self._artefactos.move_to_end(clave)
+            return entrada
+        return None
+
+    def obtener(self, clave, extension, generar):
+        """(ruta, filas, generado) del artefacto; generar(ruta) -> filas si no existe"""
+        with self._lock:
+            entrada = self._vigente(clave)
+            if entrada:
+                return entrada[0], entrada[1], False
+            candado = self._candados.setdefault(clave, threading.Lock())
+
+        with candado:
+            with self._lock:
+                entrada = self._vigente(clave)
+                if entrada:
+                    return entrada[0], entrada[1], False
+
+            ruta = os.path.join(self.directorio, f"{clave}.{extension}")
+            filas = generar(ruta)
+
+            with self._lock:
+                self._artefactos[clave] = (ruta, filas, time.time())
+                self._candados.pop(clave, None)
+                self._podar()
+            return ruta, filas, True
+
+    def _podar(self):
+        """Eliminar los artefactos vencidos o que exceden el máximo"""
+        ahora = time.time()
+        for clave in [c for c, (_, _, creado) in self._artefactos.items() if ahora - creado >= self.ttl]:
+            self._eliminar(clave)
+        while len(self._artefactos) > self.max_artefactos:
+            self._eliminar(next(iter(self._artefactos)))
+
+    def _eliminar(self, clave):
+        ruta = self._artefactos.pop(clave)[0]
+        try:
+            os.remove(ruta)
+        except OSError:
+            pass
@@ -0,0 +1,165 @@
+import heapq
+import pandas as pd
+
+class TopN:
+    """Top-N por número de casos mantenido con un min-heap de tamaño N
+
+    Los acumulados por empleado solo crecen (inserciones), por lo que basta con
+    comparar contra la raíz del heap para decidir si alguien entra al top.
+    Cada actualización publica un heap nuevo: quien lee nunca ve uno a medias.
+    """
+
+    def __init__(self, n=10):
+        self.n = n
+        self._heap = []  # (casos, dias, id_empleado)
+
+    def actualizar(self, id_empleado, casos, dias):
+        """Registrar el nuevo acumulado de un empleado"""
+        entrada = (casos, dias, id_empleado)
+        heap = list(self._heap)  # N pequeño: copiar es O(N)
+
+        for i, (_, _, actual) in enumerate(heap):
+            if actual == id_empleado:
+                heap[i] = entrada
+                heapq.heapify(heap)
+                break
+        else:
+            if len(heap) < self.n:
+                heapq.heappush(heap, entrada)
+            elif entrada > heap[0]:
+                heapq.heapreplace(heap, entrada)
+            else:
+                return
+
+        self._heap = heap
+
+    def ordenado(self):
+        """Entradas de mayor a menor"""
+        return sorted(self._heap, reverse=True)
+
+class RollupIncapacidades:
+    """Acumulados de incapacidades por (tipo, oficina, año) y por empleado
+
+    Se construye una vez desde los datos y se actualiza con cada inserción
+    (ver DualManager.registrar_insercion); los totales por tipo, oficina o año
+    salen de sumar las celdas del cubo, que es pequeño. Lo comparten todas las
+    sesiones: una inserción arma un cubo nuevo y reemplaza la referencia
+    (copy-on-write), así las consultas recorren siempre un cubo completo sin lock.
+    """
+
+    def __init__(self, n_top=10):
+        self._cubo = {}  # (tipo, oficina, año) -> {'casos', 'dias', 'empleados'}; nunca se modifica en sitio
+        self._por_empleado = {}  # id_empleado -> [casos, dias]
+        self._nombres = {}
+        self._top = TopN(n_top)
+
+    @classmethod
+    def desde_dataframes(cls, df_incapacidades, df_empleados, n_top=10):
+        """Construir acumulados con un groupby por dimensión"""
+        rollup = cls(n_top)
+
+        if not df_empleados.empty:
+            rollup._nombres = dict(zip(df_empleados['id_empleado'].astype(str), df_empleados['nombre_completo']))
+
+        if df_incapacidades.empty:
+            return rollup
+
+        df = pd.DataFrame({
+            'tipo': df_incapacidades['tipo'],
+            'oficina': df_incapacidades['oficina'],
+            'año': df_incapacidades['fecha_inicio'].astype(str).str[:4],
+            'id_empleado': df_incapacidades['id_empleado'].astype(str),
+            'dias': pd.to_numeric(df_incapacidades['dias_totales'], errors='coerce').fillna(0).astype(int)
+        })
+
+        cubo = df.groupby(['tipo', 'oficina', 'año']).agg(
+            casos=('dias', 'size'),
+            dias=('dias', 'sum'),
+            empleados=('id_empleado', lambda ids: set(ids))
+        )
+        for clave, fila in cubo.iterrows():
+            rollup._cubo[clave] = {'casos': int(fila['casos']), 'dias': int(fila['dias']), 'empleados': fila['empleados']}
+
+        por_empleado = df.groupby('id_empleado')['dias'].agg(['size', 'sum'])
+        for id_empleado, casos, dias in zip(por_empleado.index, por_empleado['size'], por_empleado['sum']):
+            rollup._por_empleado[id_empleado] = [int(casos), int(dias)]
+            rollup._top.actualizar(id_empleado, int(casos), int(dias))
+
+        return rollup
+
+    def agregar_registro(self, tabla, registro):
+        """Sumar una incapacidad recién insertada"""
+        if tabla != "incapacidades":
+            return
+
+        id_empleado = str(registro['id_empleado'])
+        dias = int(registro.get('dias_totales') or 0)
+        clave = (registro['tipo'], registro['oficina'], str(registro['fecha_inicio'])[:4])
+
+        cubo = dict(self._cubo)
+        celda = cubo.get(clave, {'casos': 0, 'dias': 0, 'empleados': frozenset()})
+        cubo[clave] = {
+            'casos': celda['casos'] + 1,
+            'dias': celda['dias'] + dias,
+            'empleados': celda['empleados'] | {id_empleado}
+        }
+        self._cubo = cubo
+
+        acumulado = self._por_empleado.setdefault(id_empleado, [0, 0])
+        acumulado[0] += 1
+        acumulado[1] += dias
+        self._top.actualizar(id_empleado, acumulado[0], acumulado[1])
+
+    # ---------- Consultas ----------
+
+    def valores(self, dimension):
+        """Valores distintos de 'tipo', 'oficina' o 'año'"""
+        posicion = ('tipo', 'oficina', 'año').index(dimension)
+        return sorted({clave[posicion] for clave in self._cubo})
+
+    def resumen(self, tipo=None, oficina=None, año=None):
+        """Totales (casos, días, promedio, empleados) para un filtro; None = todos"""
+        casos, dias, empleados = 0, 0, set()
+        for (t, o, a), celda in self._cubo.items():
+            if (tipo is None or t == tipo) and (oficina is None or o == oficina) and (año is None or a == año):
+                casos += celda['casos']
+                dias += celda['dias']
+                empleados |= celda['empleados']
+        return {
+            'casos': casos,
+            'dias': dias,
+            'promedio': dias / casos if casos else 0,
+            'empleados': len(empleados)
+        }
+
+    def por_dimension(self, dimension):
+        """Tabla de Casos y Días Totales agrupada por 'tipo', 'oficina' o 'año'"""
+        posicion = ('tipo', 'oficina', 'año').index(dimension)
+        totales = {}
+        for clave, celda in self._cubo.items():
+            fila = totales.setdefault(clave[posicion], [0, 0])
+            fila[0] += celda['casos']
+            fila[1] += celda['dias']
+
+        return pd.DataFrame(
+            [(k, v[0], v[1]) for k, v in sorted(totales.items())],
+            columns=[dimension, 'Casos', 'Días Totales']
+        ).set_index(dimension)
+
+    def top_empleados(self):
+        """Top-N de empleados con más incapacidades (desde el heap)"""
+        return pd.DataFrame(
+            [(id_empleado, self._nombres.get(id_empleado, ''), casos, dias)
+             for casos, dias, id_empleado in self._top.ordenado()],
+            columns=['id_empleado', 'nombre_completo', 'Casos', 'Días Totales']
+        ).set_index(['id_empleado', 'nombre_completo'])
+
+def obtener_rollup_incapacidades(manager):
+    """Acumulados compartidos, ligados a la versión de datos de incapacidades/empleados"""
+    return manager.get_derivado(
+        "rollup_incapacidades",
+        ("incapacidades", "empleados"),
+        lambda: RollupIncapacidades.desde_dataframes(
+            *manager.get_many(["incapacidades", "empleados"]).values()
+        )
+    )
@@ -0,0 +1,106 @@
+import numpy as np
+import pandas as pd
+from utils.reglas_bonos import validar_reglas
+
+# Parámetros que se pueden barrer -> ubicación en las reglas
+PARAMETROS_SIMULABLES = ('bono_base', 'penalizacion_retardo', 'penalizacion_ausencia', 'asistencias_minimas')
+
+# Celdas (combinaciones x perfiles) por bloque; ~16 MB por matriz float64
+CELDAS_POR_BLOQUE = 2_000_000
+
+def generar_grid(**rangos):
+    """Producto cartesiano de valores por parámetro -> dict de arreglos planos (una entrada por combinación)"""
+    desconocidos = set(rangos) - set(PARAMETROS_SIMULABLES)
+    if desconocidos:
+        raise ValueError(f"Parámetros no simulables: {', '.join(sorted(desconocidos))}")
+
+    nombres = list(rangos)
+    mallas = np.meshgrid(*[np.asarray(rangos[n], dtype=float) for n in nombres], indexing='ij')
+    return {nombre: malla.ravel() for nombre, malla in zip(nombres, mallas)}
+
+def _perfiles(df_conteos, reglas):
+    """Reducir empleados a perfiles únicos (conteos + oficina) con su número de empleados
+
+    Los conteos mensuales son enteros pequeños, así que muchos empleados
+    comparten perfil y la simulación trabaja sobre muchos menos renglones.
+    """
+    asistencia = df_conteos['presentes'].to_numpy(dtype=float)
+    if reglas['incapacidad_cuenta_asistencia']:
+        asistencia = asistencia + df_conteos['incapacidades'].to_numpy(dtype=float)
+
+    # Términos que no dependen de los parámetros barridos
+    fijo = reglas['bono_sabado'] * df_conteos['sabados'].to_numpy(dtype=float)
+    for conteo, descuento in reglas['penalizaciones'].items():
+        if conteo not in ('retardos', 'ausentes'):
+            fijo = fijo - descuento * df_conteos[conteo].to_numpy(dtype=float)
+    if reglas['niveles']:
+        umbrales = np.array([n['desde'] for n in reglas['niveles']])
+        extras = np.concatenate([[0.0], [n['extra'] for n in reglas['niveles']]])
+        fijo = fijo + extras[np.searchsorted(umbrales, asistencia, side='right')]
+
+    oficinas, codigo_oficina = np.unique(df_conteos['oficina'].astype(str).to_numpy(), return_inverse=True)
+    matriz = np.column_stack([
+        df_conteos['retardos'].to_numpy(dtype=float),
+        df_conteos['ausentes'].to_numpy(dtype=float),
+        asistencia,
+        fijo,
+        codigo_oficina
+    ])
+    perfiles, empleados = np.unique(matriz, axis=0, return_counts=True)
+    return perfiles, empleados, oficinas
+
+def simular_bonos(df_conteos, reglas, grid, celdas_por_bloque=CELDAS_POR_BLOQUE):
+    """Evaluar todas las combinaciones del grid contra los conteos reales de un periodo
+
+    df_conteos: resultado de motor_bonos.calcular_bonos (un renglón por empleado).
+    reglas: reglas base; los parámetros que no estén en el grid se toman de aquí.
+    Retorna un DataFrame con una fila por combinación: parámetros, total_bonos,
+    empleados_con_bono y el total por oficina (una columna por oficina).
+    """
+    reglas = validar_reglas(reglas)
+    n_combinaciones = len(next(iter(grid.values()))) if grid else 1
+
+    def parametro(nombre, actual):
+        valores = grid.get(nombre)
+        return np.full(n_combinaciones, float(actual)) if valores is None else np.asarray(valores, dtype=float)
+
+    base = parametro('bono_base', reglas['bono_base'])
+    pen_retardo = parametro('penalizacion_retardo', reglas['penalizaciones'].get('retardos', 0))
+    pen_ausencia = parametro('penalizacion_ausencia', reglas['penalizaciones'].get('ausentes', 0))
+    minimas = parametro('asistencias_minimas', reglas['asistencias_minimas'])
+
+    perfiles, empleados, oficinas = _perfiles(df_conteos, reglas)
+    retardos, ausentes, asistencia, fijo, codigo_oficina = perfiles.T
+
+    # Pesos por oficina: (perfiles x oficinas) con el número de empleados de cada perfil
+    pesos_oficina = np.zeros((len(perfiles), len(oficinas)))
+    pesos_oficina[np.arange(len(perfiles)), codigo_oficina.astype(int)] = empleados
+
+    total = np.empty(n_combinaciones)
+    con_bono = np.empty(n_combinaciones)
+    por_oficina = np.empty((n_combinaciones, len(oficinas)))
+
+    bloque = max(1, celdas_por_bloque // max(1, len(perfiles)))
+    for inicio in range(0, n_combinaciones, bloque):
+        s = slice(inicio, inicio + bloque)
+
+        # (combinaciones, 1) contra (perfiles,) -> (combinaciones, perfiles)
+        monto = base[s, None] - pen_retardo[s, None] * retardos - pen_ausencia[s, None] * ausentes + fijo
+        monto = np.maximum(0, monto)
+        if reglas['tope'] is not None:
+            monto = np.minimum(monto, reglas['tope'])
+        monto = np.where(asistencia < minimas[s, None], 0, monto)
+
+        por_oficina[s] = monto @ pesos_oficina
+        total[s] = por_oficina[s].sum(axis=1)
+        con_bono[s] = (monto > 0) @ empleados
+
+    df_resultados = pd.DataFrame({
+        'bono_base': base,
+        'penalizacion_retardo': pen_retardo,
+        'penalizacion_ausencia': pen_ausencia,
+        'asistencias_minimas': minimas.astype(int),
+        'total_bonos': total,
+        'empleados_con_bono': con_bono.astype(int)
+    })
+    return pd.concat([df_resultados, pd.DataFrame(por_oficina, columns=oficinas)], axis=1)
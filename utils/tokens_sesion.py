@@ -0,0 +1,42 @@
+import base64
+import hashlib
+import hmac
+import json
+import secrets
+import time
+
+# Duración por defecto de una sesión reanudable
+DURACION_TOKEN = 8 * 3600
+
+def _b64(datos):
+    return base64.urlsafe_b64encode(datos).rstrip(b'=').decode('ascii')
+
+def _de_b64(texto):
+    return base64.urlsafe_b64decode(texto + '=' * (-len(texto) % 4))
+
+def _firma(secreto, contenido):
+    return hmac.new(secreto, contenido.encode('ascii'), hashlib.sha256).digest()
+
+def emitir_token(datos, secreto, duracion=DURACION_TOKEN):
+    """Token firmado 'payload.firma' (HMAC-SHA256) con expiración e identificador único
+
+    datos se copia al payload; se agregan iat, exp y jti.
+    """
+    ahora = int(time.time())
+    payload = {**datos, 'iat': ahora, 'exp': ahora + duracion, 'jti': secrets.token_urlsafe(12)}
+    contenido = _b64(json.dumps(payload, separators=(',', ':')).encode('utf-8'))
+    return f"{contenido}.{_b64(_firma(secreto, contenido))}"
+
+def verificar_token(token, secreto):
+    """Payload del token si la firma es válida y no ha expirado; None en otro caso"""
+    try:
+        contenido, firma = token.split('.')
+        if not hmac.compare_digest(_de_b64(firma), _firma(secreto, contenido)):
+            return None
+        payload = json.loads(_de_b64(contenido))
+    except (ValueError, TypeError):
+        return None
+
+    if payload.get('exp', 0) < time.time():
+        return None
+    return payload